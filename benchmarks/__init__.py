@@ -0,0 +1,5 @@
+"""
+Performance benchmarks for Sam AI.
+
+Run `python -m benchmarks.run --help` from the project root.
+"""
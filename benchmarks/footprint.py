@@ -0,0 +1,125 @@
+"""
+Memory and disk footprint of stored conversation turns.
+
+Compares the dict records with ISO timestamps that older versions kept, and
+wrote as one uncompressed log, against `Interaction` records in a
+`JsonlStore` with gzip cold segments. Reports bytes per turn as JSON:
+
+    python -m benchmarks.footprint --turns 10000
+"""
+
+import argparse
+import json
+import random
+import sys
+import tempfile
+import tracemalloc
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, Dict, List
+
+from src.sam_ai.storage import Interaction
+from src.sam_ai.storage.jsonl_store import JsonlStore
+
+WORDS = (
+    "the a to and of I you it is that for on was with my this be have but not "
+    "are at what so can do if about just like me how feel think today time "
+    "really would know want one day work get when there more some need help "
+    "sleep week talk maybe thanks right now again still good better plan"
+).split()
+
+
+def make_turns(count: int, user_words: int = 30, assistant_words: int = 90) -> List[Dict]:
+    """Synthetic turns in the old dict form, with ISO timestamps a minute apart."""
+    rng = random.Random(0)
+    start = datetime(2024, 1, 1)
+    return [
+        {
+            "timestamp": (start + timedelta(minutes=i)).isoformat(),
+            "user": " ".join(rng.choices(WORDS, k=user_words)),
+            "assistant": " ".join(rng.choices(WORDS, k=assistant_words)),
+        }
+        for i in range(count)
+    ]
+
+
+def _allocated(build: Callable[[], List]) -> int:
+    """Bytes still allocated by the objects `build` returns."""
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        kept = build()
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    del kept
+    return after - before
+
+
+def measure_memory(lines: List[str]) -> Dict[str, float]:
+    """Resident bytes per turn for records loaded from `lines`, text included and not."""
+    turns = len(lines)
+    text = sum(
+        sys.getsizeof(r["user"]) + sys.getsizeof(r["assistant"]) for r in map(json.loads, lines)
+    )
+    legacy = _allocated(lambda: [json.loads(line) for line in lines])
+    compact = _allocated(lambda: [Interaction.from_dict(json.loads(line)) for line in lines])
+    return {
+        "dict_bytes_per_turn": round(legacy / turns, 1),
+        "interaction_bytes_per_turn": round(compact / turns, 1),
+        "dict_overhead_per_turn": round((legacy - text) / turns, 1),
+        "interaction_overhead_per_turn": round((compact - text) / turns, 1),
+    }
+
+
+def measure_disk(turns: List[Dict], window: int, threshold: int) -> Dict[str, float]:
+    """Bytes per turn on disk for the old uncompressed log and the archiving store."""
+    legacy = sum(len((json.dumps(t) + "\n").encode("utf-8")) for t in turns)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "conversation_memory.jsonl"
+        store = JsonlStore(
+            path, max_records=window, fsync_policy="never", compaction_threshold=threshold
+        )
+        for turn in turns:
+            store.append(Interaction.from_dict(turn))
+        store.close()
+        hot = path.stat().st_size
+        cold = sum(f.stat().st_size for f in store.cold_path.glob("*.jsonl.gz"))
+
+    return {
+        "legacy_log_bytes_per_turn": round(legacy / len(turns), 1),
+        "hot_log_bytes": hot,
+        "cold_segment_bytes": cold,
+        "compact_bytes_per_turn": round((hot + cold) / len(turns), 1),
+    }
+
+
+def run_footprint(turns: int, window: int = 20, threshold: int = 100) -> Dict:
+    records = make_turns(turns)
+    lines = [json.dumps(r) for r in records]
+    return {
+        "turns": turns,
+        "memory": measure_memory(lines),
+        "disk": measure_disk(records, window, threshold),
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Measure the footprint of stored turns.")
+    parser.add_argument("--turns", type=int, default=10000, help="Synthetic turns to store")
+    parser.add_argument("--window", type=int, default=20, help="Turns kept in the hot log")
+    parser.add_argument("--threshold", type=int, default=100, help="Appends between compactions")
+    parser.add_argument("--output", type=Path, help="Write the JSON report here (default: stdout)")
+    args = parser.parse_args(argv)
+
+    text = json.dumps(run_footprint(args.turns, args.window, args.threshold), indent=2)
+    if args.output:
+        args.output.write_text(text + "\n")
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
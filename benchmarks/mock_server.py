@@ -0,0 +1,189 @@
+"""
+Deterministic stand-in for an LLM server.
+
+Speaks enough of the Ollama API (`/api/chat`, `/api/tags`, `/api/embed`) and
+the OpenAI chat-completions API (`/v1/chat/completions`) for Sam AI's
+providers. Replies are fixed word sequences produced at a configurable
+latency and token rate, so benchmark runs measure Sam AI's own overhead
+rather than a model's.
+"""
+
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Iterator
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients dropping idle keep-alive connections is expected, not an error
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class MockLLMServer:
+    """Threaded HTTP server answering chat requests with synthetic tokens."""
+
+    def __init__(
+        self,
+        latency: float = 0.02,
+        tokens_per_second: float = 500.0,
+        response_tokens: int = 32,
+        host: str = "127.0.0.1",
+        port: int = 0,
+    ):
+        """
+        Args:
+            latency: Seconds before the first token (prompt processing).
+            tokens_per_second: Generation speed after the first token.
+            response_tokens: Tokens (words) in every reply.
+            host: Interface to bind.
+            port: Port to bind; 0 picks a free one.
+        """
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.response_tokens = response_tokens
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._server = _Server((host, port), self._handler_class())
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def config(self) -> dict:
+        return {
+            "latency": self.latency,
+            "tokens_per_second": self.tokens_per_second,
+            "response_tokens": self.response_tokens,
+        }
+
+    def tokens(self) -> Iterator[str]:
+        """Yield the reply's tokens at the configured pace."""
+        time.sleep(self.latency)
+        interval = 1.0 / self.tokens_per_second if self.tokens_per_second else 0.0
+        for i in range(self.response_tokens):
+            if i and interval:
+                time.sleep(interval)
+            yield f"word{i} "
+
+    def start(self) -> "MockLLMServer":
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name="mock-llm", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "MockLLMServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # Keep-alive, like the real servers
+
+            def log_message(self, *args):
+                pass
+
+            def _json(self, payload: dict, status: int = 200) -> None:
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _start_chunked(self, content_type: str) -> None:
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+
+            def _chunk(self, data: bytes) -> None:
+                self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+                self.wfile.flush()
+
+            def do_GET(self):
+                if self.path == "/api/tags":
+                    self._json({"models": [{"name": "mock"}]})
+                elif self.path == "/v1/models":
+                    self._json({"data": [{"id": "mock"}]})
+                else:
+                    self._json({"error": "not found"}, 404)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                request = json.loads(self.rfile.read(length) or b"{}")
+                with server._lock:
+                    server.requests += 1
+
+                if self.path == "/api/chat":
+                    self._ollama_chat(request)
+                elif self.path == "/v1/chat/completions":
+                    self._openai_chat(request)
+                elif self.path == "/api/embed":
+                    inputs = request.get("input", [])
+                    inputs = [inputs] if isinstance(inputs, str) else inputs
+                    self._json({"embeddings": [[float(len(t) % 7), 1.0, 0.5] for t in inputs]})
+                else:
+                    self._json({"error": "not found"}, 404)
+
+            def _ollama_chat(self, request: dict) -> None:
+                model = request.get("model", "mock")
+                if not request.get("messages"):
+                    self._json({"model": model, "done": True, "message": {"content": ""}})
+                    return
+                if request.get("stream", True):
+                    self._start_chunked("application/x-ndjson")
+                    for token in server.tokens():
+                        line = {"model": model, "message": {"role": "assistant", "content": token}, "done": False}
+                        self._chunk(json.dumps(line).encode() + b"\n")
+                    done = {"model": model, "message": {"role": "assistant", "content": ""}, "done": True}
+                    self._chunk(json.dumps(done).encode() + b"\n")
+                    self._chunk(b"")
+                else:
+                    content = "".join(server.tokens())
+                    self._json({"model": model, "message": {"role": "assistant", "content": content}, "done": True})
+
+            def _openai_chat(self, request: dict) -> None:
+                model = request.get("model", "mock")
+                created = int(time.time())
+                if request.get("stream"):
+                    self._start_chunked("text/event-stream")
+                    for token in server.tokens():
+                        event = {
+                            "id": "chatcmpl-mock", "object": "chat.completion.chunk",
+                            "created": created, "model": model,
+                            "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}],
+                        }
+                        self._chunk(f"data: {json.dumps(event)}\n\n".encode())
+                    self._chunk(b"data: [DONE]\n\n")
+                    self._chunk(b"")
+                else:
+                    content = "".join(server.tokens())
+                    self._json({
+                        "id": "chatcmpl-mock", "object": "chat.completion",
+                        "created": created, "model": model,
+                        "choices": [{
+                            "index": 0, "finish_reason": "stop",
+                            "message": {"role": "assistant", "content": content},
+                        }],
+                        "usage": {"prompt_tokens": 0, "completion_tokens": server.response_tokens,
+                                  "total_tokens": server.response_tokens},
+                    })
+
+        return Handler
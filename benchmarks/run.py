@@ -0,0 +1,394 @@
+"""
+Benchmark harness for Sam AI.
+
+Drives the providers, `Orchestrator`, `AsyncOrchestrator` and `MemoryManager`
+against a local `MockLLMServer` at several concurrency levels, and reports
+p50/p95/p99 latency, time to first token, throughput and memory growth as
+JSON. Save a report per commit and compare them to catch regressions:
+
+    python -m benchmarks.run --output before.json
+    python -m benchmarks.run --output after.json --compare before.json
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from src.sam_ai.config import settings
+
+from .mock_server import MockLLMServer
+
+MESSAGES = [
+    {"role": "system", "content": "You are a benchmark."},
+    {"role": "user", "content": "Say something."},
+]
+
+# One measured call: (latency, time to first token or None, tokens received)
+Sample = Tuple[float, Optional[float], int]
+
+
+def _percentiles(values: List[float]) -> Optional[Dict[str, float]]:
+    """p50/p95/p99 and mean, in milliseconds (nearest-rank percentiles)."""
+    if not values:
+        return None
+    ordered = sorted(values)
+
+    def rank(p):
+        return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)] * 1000
+
+    return {
+        "p50": round(rank(50), 3),
+        "p95": round(rank(95), 3),
+        "p99": round(rank(99), 3),
+        "mean": round(sum(ordered) / len(ordered) * 1000, 3),
+    }
+
+
+def _rss_kb() -> int:
+    """Resident set size of this process, in KiB."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+    except (OSError, ValueError, AttributeError):
+        import resource  # Peak rather than current RSS outside Linux
+
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak // 1024 if sys.platform == "darwin" else peak
+
+
+@contextmanager
+def _overrides(**values):
+    """Temporarily change settings."""
+    previous = {name: getattr(settings, name) for name in values}
+    for name, value in values.items():
+        setattr(settings, name, value)
+    try:
+        yield
+    finally:
+        for name, value in previous.items():
+            setattr(settings, name, value)
+
+
+def _timed_stream(chunks) -> Sample:
+    start = time.perf_counter()
+    ttft = None
+    tokens = 0
+    for _ in chunks:
+        if ttft is None:
+            ttft = time.perf_counter() - start
+        tokens += 1
+    return time.perf_counter() - start, ttft, tokens
+
+
+def _timed_call(fn) -> Sample:
+    start = time.perf_counter()
+    reply = fn()
+    return time.perf_counter() - start, None, len(reply.split())
+
+
+def _run_threads(call: Callable[[int], Sample], requests: int, concurrency: int) -> Tuple[List[Sample], int, float]:
+    """Run `requests` calls on `concurrency` threads; return samples, errors and wall time."""
+    samples, errors = [], 0
+
+    def guarded(i):
+        try:
+            return call(i)
+        except Exception:
+            return None
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for sample in pool.map(guarded, range(requests)):
+            if sample is None:
+                errors += 1
+            else:
+                samples.append(sample)
+    return samples, errors, time.perf_counter() - start
+
+
+def _run_async(call, requests: int, concurrency: int, cleanup=None) -> Tuple[List[Sample], int, float]:
+    """
+    Async counterpart of `_run_threads`; `call(i)` is a coroutine function.
+    `cleanup` is awaited on the same event loop once every call is done.
+    """
+
+    async def main():
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def guarded(i):
+            async with semaphore:
+                try:
+                    return await call(i)
+                except Exception:
+                    return None
+
+        start = time.perf_counter()
+        results = await asyncio.gather(*(guarded(i) for i in range(requests)))
+        elapsed = time.perf_counter() - start
+        if cleanup is not None:
+            await cleanup()
+        return results, elapsed
+
+    results, elapsed = asyncio.run(main())
+    samples = [r for r in results if r is not None]
+    return samples, len(results) - len(samples), elapsed
+
+
+# --- Scenarios: each returns (samples, errors, wall time) ---
+
+def bench_ollama_chat(server, requests, concurrency):
+    from src.sam_ai.providers.ollama_provider import OllamaProvider
+
+    provider = OllamaProvider(base_url=server.url)
+    return _run_threads(
+        lambda i: _timed_call(lambda: provider.chat_completion(MESSAGES, "mock")),
+        requests, concurrency,
+    )
+
+
+def bench_ollama_stream(server, requests, concurrency):
+    from src.sam_ai.providers.ollama_provider import OllamaProvider
+
+    provider = OllamaProvider(base_url=server.url)
+    return _run_threads(
+        lambda i: _timed_stream(provider.chat_completion_stream(MESSAGES, "mock")),
+        requests, concurrency,
+    )
+
+
+def bench_ollama_async(server, requests, concurrency):
+    from src.sam_ai.providers.ollama_provider import OllamaProvider, aclose_async_clients
+
+    provider = OllamaProvider(base_url=server.url)
+
+    async def call(i):
+        start = time.perf_counter()
+        ttft, tokens = None, 0
+        async for _ in provider.achat_completion_stream(MESSAGES, "mock"):
+            if ttft is None:
+                ttft = time.perf_counter() - start
+            tokens += 1
+        return time.perf_counter() - start, ttft, tokens
+
+    return _run_async(call, requests, concurrency, cleanup=aclose_async_clients)
+
+
+def bench_openai_stream(server, requests, concurrency):
+    from src.sam_ai.providers.openai_provider import OpenAIProvider
+
+    provider = OpenAIProvider(api_key="benchmark", base_url=f"{server.url}/v1")
+    return _run_threads(
+        lambda i: _timed_stream(provider.chat_completion_stream(MESSAGES, "mock")),
+        requests, concurrency,
+    )
+
+
+def bench_orchestrator_stream(server, requests, concurrency):
+    """One conversation per thread, so memory reads and writes are included."""
+    from src.sam_ai.core.engine import Orchestrator
+
+    orchestrators = [Orchestrator(session_id=f"bench-{i}") for i in range(concurrency)]
+    return _run_threads(
+        lambda i: _timed_stream(
+            orchestrators[i % concurrency].process_message_stream(f"Message {i}")
+        ),
+        requests, concurrency,
+    )
+
+
+def bench_async_orchestrator(server, requests, concurrency):
+    from src.sam_ai.core.engine import AsyncOrchestrator
+    from src.sam_ai.providers.ollama_provider import aclose_async_clients
+
+    orchestrators = [AsyncOrchestrator(session_id=f"bench-async-{i}") for i in range(concurrency)]
+
+    async def call(i):
+        start = time.perf_counter()
+        reply = await orchestrators[i % concurrency].aprocess_message(f"Message {i}")
+        return time.perf_counter() - start, None, len(reply.split())
+
+    return _run_async(call, requests, concurrency, cleanup=aclose_async_clients)
+
+
+def bench_memory(server, requests, concurrency):
+    """add_interaction plus a budgeted get_context, without any server."""
+    from src.sam_ai.core.memory_manager import MemoryManager
+
+    managers = [MemoryManager(session_id=f"bench-memory-{i}") for i in range(concurrency)]
+
+    def call(i):
+        memory = managers[i % concurrency]
+        start = time.perf_counter()
+        memory.add_interaction(f"Message {i} " * 20, f"Reply {i} " * 40)
+        memory.get_context(f"Message {i}", token_budget=1500)
+        return time.perf_counter() - start, None, 0
+
+    return _run_threads(call, requests, concurrency)
+
+
+SCENARIOS = {
+    "ollama_chat": bench_ollama_chat,
+    "ollama_stream": bench_ollama_stream,
+    "ollama_async": bench_ollama_async,
+    "openai_stream": bench_openai_stream,
+    "orchestrator_stream": bench_orchestrator_stream,
+    "async_orchestrator": bench_async_orchestrator,
+    "memory": bench_memory,
+}
+
+
+def run_scenario(name: str, server: MockLLMServer, requests: int, concurrency: int) -> Dict:
+    bench = SCENARIOS[name]
+    bench(server, min(concurrency, requests), concurrency)  # Warm connections and caches
+
+    rss_before = _rss_kb()
+    samples, errors, elapsed = bench(server, requests, concurrency)
+    rss_after = _rss_kb()
+
+    latencies = [s[0] for s in samples]
+    ttfts = [s[1] for s in samples if s[1] is not None]
+    tokens = sum(s[2] for s in samples)
+    return {
+        "scenario": name,
+        "concurrency": concurrency,
+        "requests": requests,
+        "errors": errors,
+        "latency_ms": _percentiles(latencies),
+        "ttft_ms": _percentiles(ttfts),
+        "throughput_rps": round(len(samples) / elapsed, 3) if elapsed else None,
+        "tokens_per_s": round(tokens / elapsed, 3) if elapsed and tokens else None,
+        "rss_growth_kb": rss_after - rss_before,
+    }
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(
+    scenarios: List[str],
+    concurrency_levels: List[int],
+    requests: int,
+    server: MockLLMServer,
+) -> Dict:
+    """Run every scenario at every concurrency level against `server`."""
+    results = []
+    with tempfile.TemporaryDirectory(prefix="sam-bench-") as memory_dir, _overrides(
+        default_provider="ollama",
+        default_model="mock",
+        ollama_base_url=server.url,
+        ollama_warm_up=False,
+        memory_persistence_path=Path(memory_dir),
+        memory_backend="jsonl",
+        response_cache_enabled=False,
+        long_term_memory_enabled=False,
+        summarization_enabled=False,
+        scheduler_enabled=False,  # Measure the client path, not the wait for a slot
+    ):
+        for name in scenarios:
+            for concurrency in concurrency_levels:
+                results.append(run_scenario(name, server, requests, concurrency))
+
+    return {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "server": server.config(),
+            "requests": requests,
+        },
+        "results": results,
+    }
+
+
+def compare(report: Dict, baseline: Dict, threshold: float) -> List[str]:
+    """
+    Regressions of `report` against `baseline`: p95 latency or TTFT up, or
+    throughput down, by more than `threshold` (a fraction) for the same
+    scenario and concurrency.
+    """
+    previous = {(r["scenario"], r["concurrency"]): r for r in baseline["results"]}
+    regressions = []
+    for result in report["results"]:
+        old = previous.get((result["scenario"], result["concurrency"]))
+        if old is None:
+            continue
+        label = f"{result['scenario']} @ {result['concurrency']}"
+        for metric in ("latency_ms", "ttft_ms"):
+            if result[metric] and old[metric] and result[metric]["p95"] > old[metric]["p95"] * (1 + threshold):
+                regressions.append(
+                    f"{label}: {metric} p95 {old[metric]['p95']:.1f} -> {result[metric]['p95']:.1f}"
+                )
+        if old["throughput_rps"] and result["throughput_rps"] < old["throughput_rps"] * (1 - threshold):
+            regressions.append(
+                f"{label}: throughput {old['throughput_rps']:.1f} -> {result['throughput_rps']:.1f} req/s"
+            )
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark Sam AI against a mock LLM server.")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS),
+                        help=f"Comma-separated subset of: {', '.join(SCENARIOS)}")
+    parser.add_argument("--concurrency", default="1,8", help="Comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=100, help="Requests per scenario and level")
+    parser.add_argument("--latency", type=float, default=0.02, help="Mock server seconds to first token")
+    parser.add_argument("--tokens-per-second", type=float, default=500.0)
+    parser.add_argument("--response-tokens", type=int, default=32)
+    parser.add_argument("--output", type=Path, help="Write the JSON report here (default: stdout)")
+    parser.add_argument("--compare", type=Path, help="Baseline report to check for regressions")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="Allowed relative slowdown before --compare fails")
+    args = parser.parse_args(argv)
+
+    scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+
+    with MockLLMServer(
+        latency=args.latency,
+        tokens_per_second=args.tokens_per_second,
+        response_tokens=args.response_tokens,
+    ) as server:
+        report = run_benchmarks(
+            scenarios,
+            [int(c) for c in args.concurrency.split(",")],
+            args.requests,
+            server,
+        )
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        args.output.write_text(text + "\n")
+    else:
+        print(text)
+
+    if args.compare:
+        regressions = compare(report, json.loads(args.compare.read_text()), args.threshold)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -12,9 +12,12 @@ import streamlit as st
 # Clean imports - no sys.path modifications here
 from src.sam_ai.core.engine import Orchestrator
 from src.sam_ai.config import settings, load_config
+from src.sam_ai.providers import get_catalog
 from pathlib import Path
 
 LOGO_PATH = Path(__file__).parent.parent / "assets" / "SamAIlogo.png"
+ENV_PATH = Path(".env")  # Resolved like Settings' env_file, from the working directory
+RENDER_WINDOW = 20  # Turns rendered at first; earlier ones are loaded on request
 
 # Page configuration
 st.set_page_config(
@@ -24,24 +27,39 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# Initialize session state
-if "messages" not in st.session_state:
-    st.session_state.messages = []
-if "orchestrator" not in st.session_state:
-    st.session_state.orchestrator = Orchestrator()
-if "current_mode" not in st.session_state:
-    st.session_state.current_mode = "chat"
+def _env_signature():
+    """Identifies the current version of the .env file (None if there is none)."""
+    try:
+        stat = ENV_PATH.stat()
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
 
-def initialize_app():
-    """Initialize the application."""
+@st.cache_resource(show_spinner=False)
+def initialize_app(env_signature):
+    """
+    Load the configuration once per version of the .env file.
+
+    Streamlit reruns this script on every interaction; only a changed .env
+    rebuilds the settings.
+    """
     load_config()
-    if "orchestrator" not in st.session_state:
-        st.session_state.orchestrator = Orchestrator()
+    return env_signature
+
+initialize_app(_env_signature())
+
+# Initialize session state. Conversation memory is the only record of the
+# chat; the UI renders from it rather than keeping a copy.
+if "orchestrator" not in st.session_state:
+    st.session_state.orchestrator = Orchestrator()
+if "visible_turns" not in st.session_state:
+    st.session_state.visible_turns = RENDER_WINDOW
+memory = st.session_state.orchestrator.memory
 
 def clear_chat():
     """Clear the chat history."""
-    st.session_state.messages = []
     st.session_state.orchestrator.clear_memory()
+    st.session_state.visible_turns = RENDER_WINDOW
     st.rerun()
 
 # App title and description
@@ -66,19 +84,20 @@ with st.sidebar:
         help="Choose which AI provider to use"
     )
     
-    # Model selection
-    if provider == "ollama":
-        model = st.selectbox(
-            "Model",
-            ["phi3", "llama3:8b", "llama3:70b", "mistral", "mixtral"],
-            index=0
-        )
-    else:
-        model = st.selectbox(
-            "Model",
-            ["gpt-4o", "gpt-4-turbo", "gpt-3.5-turbo"],
-            index=0
-        )
+    # Model selection, from the provider's live catalog (kept in memory and
+    # refreshed in the background, so reruns never wait on the network)
+    catalog = get_catalog(provider)
+    catalog_state = catalog.state
+    models = list(catalog_state.models) or [settings.default_model]
+    loaded = {m["name"] for m in catalog_state.loaded}
+    model = st.selectbox(
+        "Model",
+        models,
+        index=models.index(settings.default_model) if settings.default_model in models else 0,
+        format_func=lambda name: f"{name} (loaded)" if name in loaded else name,
+    )
+    if not catalog_state.available:
+        st.warning(f"{provider} is not available; showing the last known models.")
     
     # Mode selection
     mode = st.radio(
@@ -96,9 +115,11 @@ with st.sidebar:
             type="password",
             help="Enter your OpenAI API key"
         )
-        if api_key:
+        # Only a new key rebuilds the OpenAI clients, not every rerun
+        if api_key and api_key != st.session_state.get("applied_api_key"):
             try:
                 st.session_state.orchestrator.provider.update_api_key(api_key)
+                st.session_state.applied_api_key = api_key
                 st.success("API key updated successfully")
             except Exception as e:
                 st.error(f"Error updating API key: {e}")
@@ -112,19 +133,26 @@ with st.sidebar:
     st.text(f"Provider: {provider}")
     st.text(f"Model: {model}")
     st.text(f"Mode: {mode}")
-    st.text(f"Messages: {len(st.session_state.messages)}")
+    total_turns = memory.store.count()
+    st.text(f"Messages: {total_turns * 2}")
 
-# Main chat interface
-for message in st.session_state.messages:
-    with st.chat_message(message["role"]):
-        st.markdown(message["content"])
+# Main chat interface: only the most recent turns are rendered, so reruns
+# stay fast however long the conversation gets
+turns = memory.get_history(0, st.session_state.visible_turns)  # Newest first
+if total_turns > len(turns):
+    if st.button(f"Show earlier messages ({total_turns - len(turns)} more)"):
+        st.session_state.visible_turns += RENDER_WINDOW
+        st.rerun()
+
+for turn in reversed(turns):
+    with st.chat_message("user"):
+        st.markdown(turn["user"])
+    with st.chat_message("assistant"):
+        st.markdown(turn["assistant"])
 
 # Chat input
 if prompt := st.chat_input("What would you like to talk about?"):
-    # Add user message to chat history
-    st.session_state.messages.append({"role": "user", "content": prompt})
-    
-    # Display user message
+    # Display user message; the orchestrator records the turn in memory
     with st.chat_message("user"):
         st.markdown(prompt)
     
@@ -134,18 +162,14 @@ if prompt := st.chat_input("What would you like to talk about?"):
         full_response = ""
         
         try:
-            # Get response from orchestrator
-            response = st.session_state.orchestrator.process_message(prompt, mode)
-            full_response = response
+            # Stream the response from the orchestrator, rendering each chunk
+            # as it arrives with a cursor to show generation is in progress
+            for chunk in st.session_state.orchestrator.process_message_stream(prompt, mode):
+                full_response += chunk
+                message_placeholder.markdown(full_response + "▌")
             
         except Exception as e:
             full_response = f"Error: {str(e)}\n\nPlease check your configuration and ensure Ollama is running if using local models."
         
         # Display the response
         message_placeholder.markdown(full_response)
-    
-    # Add assistant response to chat history
-    st.session_state.messages.append({"role": "assistant", "content": full_response})
-
-# Initialize the app
-initialize_app()
@@ -1,15 +1,18 @@
 """
 Configuration management for Sam AI using Pydantic settings.
 Handles loading settings from environment variables and a .env file securely.
+
+The global `settings` object is built on first use rather than at import, and
+the system keyring is only consulted when the OpenAI key is actually needed.
 """
 import os
-from typing import Literal, Optional
+import threading
+from typing import Any, Dict, List, Literal, Optional
 from pathlib import Path
 
 from pydantic import Field, validator
 from pydantic_settings import BaseSettings
 from pydantic.types import SecretStr
-import keyring
 
 # Default service name for storing secrets in the system keyring
 KEYRING_SERVICE_NAME = "sam-ai"
@@ -25,12 +28,21 @@ class Settings(BaseSettings):
     log_level: Literal["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"] = "INFO"
 
     # --- AI Provider Selection ---
-    default_provider: Literal["ollama", "openai"] = "ollama"
+    default_provider: Literal["ollama", "openai", "router"] = "ollama"
     default_model: str = "phi3"
 
     # --- Ollama Settings ---
     ollama_base_url: str = "http://localhost:11434"
-    ollama_request_timeout: int = 300  # 5 minutes for long responses
+    ollama_connect_timeout: float = 5.0  # Time allowed to open a connection
+    ollama_read_timeout: float = 300.0  # 5 minutes for long responses
+    ollama_pool_size: int = 10  # Max pooled connections kept per Ollama host
+    ollama_http_keep_alive: bool = True  # Reuse connections between requests
+    # How long Ollama keeps a model loaded after a request (e.g. "30m", "-1" for
+    # forever); None leaves the server default of 5 minutes
+    ollama_keep_alive: Optional[str] = None
+    ollama_num_ctx: Optional[int] = None  # Context window to load models with
+    ollama_options: Dict[str, Any] = {}  # Extra model options (temperature, num_thread, ...)
+    ollama_warm_up: bool = True  # Preload the default model when an Orchestrator starts
 
     # --- OpenAI Settings ---
     # These are loaded from the keyring by default for security
@@ -38,9 +50,122 @@ class Settings(BaseSettings):
     openai_base_url: str = "https://api.openai.com/v1"  # Allows for custom endpoints
     openai_default_model: str = "gpt-4o"
 
+    # --- Routing Settings (default_provider = "router") ---
+    # Backends to balance across, e.g. [{"provider": "ollama", "base_url":
+    # "http://gpu1:11434"}, {"provider": "openai", "model": "gpt-4o-mini"}];
+    # each may also set "name", "api_key" and "max_concurrency" (generations at
+    # once on that backend). Empty means the local Ollama.
+    router_backends: List[Dict[str, Any]] = []
+    router_max_retries: int = 2  # Attempts on other backends after a failure
+    router_retry_base_delay: float = 0.2  # Seconds; full jitter, doubling per retry
+    router_backoff_base: float = 2.0  # Seconds a failed backend is skipped, doubling
+    router_backoff_max: float = 60.0
+    router_hedge: bool = False  # Duplicate requests still running past p95 latency
+    router_hedge_min_samples: int = 20  # Latencies needed before hedging a backend
+
+    # --- Scheduler Settings ---
+    # Generations wait for a slot on their backend instead of piling up inside
+    # Ollama until they time out. Interactive chat goes before agent and batch
+    # work, users take turns, and a request that can't get a slot in time is
+    # answered as busy. OpenAI-compatible backends are only limited when their
+    # router_backends entry sets "max_concurrency".
+    scheduler_enabled: bool = True
+    scheduler_max_concurrency: int = 4  # Generations at once per Ollama host
+    scheduler_max_queue: int = 32  # Requests waiting per backend before new ones are turned away
+    scheduler_queue_timeout: float = 30.0  # Seconds a request may wait for a slot
+
+    # --- Model Catalog Settings ---
+    # Provider health and model lists are kept in memory and refreshed in the
+    # background, so the UI and API never wait on the provider to list them
+    model_catalog_ttl: float = 30.0  # Seconds before a listing is refreshed on read
+    model_catalog_poll_interval: float = 15.0  # Seconds between background refreshes
+
+    # --- Response Cache Settings ---
+    # Opt-in: identical requests (provider, model, messages, options) are answered
+    # from cache instead of regenerating. Disk tier lives in memory_persistence_path.
+    response_cache_enabled: bool = False
+    response_cache_max_entries: int = 256  # In-memory LRU size
+    response_cache_ttl: float = 3600.0  # Seconds; 0 means entries never expire
+    response_cache_disk: bool = False
+    response_cache_disk_max_entries: int = 10000
+
+    # --- Agent & Tool Settings ---
+    agent_max_tool_rounds: int = 5  # Model/tool round-trips before forcing an answer
+    tool_timeout: float = 30.0  # Default per-tool timeout in seconds
+    tool_max_workers: int = 4  # Threads running tool calls concurrently
+    tool_read_max_bytes: int = 65536  # Most file content one read_file call returns
+
+    # --- Batch Settings ---
+    batch_concurrency: int = 4  # Prompts in flight at once in batch runs
+
+    # --- API Server Settings (python -m src.sam_ai.server) ---
+    server_host: str = "127.0.0.1"
+    server_port: int = 8000
+    # Worker processes; more than one needs memory_backend = "sqlite" so every
+    # worker sees each conversation's turns
+    server_workers: int = 1
+    server_max_sessions: int = 1000  # Conversations kept loaded per worker (LRU)
+    server_retry_after: int = 5  # Seconds clients are told to wait when the provider is busy
+
+    # --- Instrumentation Settings ---
+    # Where per-stage timings and token/error counters go: "prometheus" (text
+    # endpoint at http://metrics_host:metrics_port/metrics), "otel" (the
+    # OpenTelemetry API) and/or "json" (log lines on the "sam_ai.metrics" logger).
+    # Empty turns instrumentation off.
+    metrics_exporters: List[Literal["prometheus", "otel", "json"]] = []
+    metrics_host: str = "127.0.0.1"
+    metrics_port: int = 9464
+
     # --- Memory & Context Settings ---
     max_chat_history: int = 20  # Number of messages to keep in immediate context
     memory_persistence_path: Path = Path.home() / ".sam_ai" / "memory"
+    # "jsonl" keeps one small log per session; "sqlite" stores every session's
+    # full history in one database (default: memory_persistence_path/memory.db)
+    memory_backend: Literal["jsonl", "sqlite"] = "jsonl"
+    memory_sqlite_path: Optional[Path] = None
+    # Durability of the append-only memory log: fsync on every turn ("always"),
+    # at most once per memory_fsync_interval seconds ("interval"), or never
+    memory_fsync_policy: Literal["always", "interval", "never"] = "interval"
+    memory_fsync_interval: float = 1.0
+    memory_compaction_threshold: int = 100  # Appends before the log is rewritten
+    # Turns compacted out of a JSON-lines log go to gzip-compressed cold
+    # segments beside it, read only when paging or exporting reaches them
+    # (False drops them instead)
+    memory_archive_history: bool = True
+
+    # --- Context Budget Settings ---
+    # Prompts are sized in estimated tokens to fit the model's context window.
+    # Ollama serves every model with a 2048-token window unless num_ctx is raised,
+    # so local models fall back to ollama_num_ctx, then default_context_window.
+    context_window_tokens: Optional[int] = None  # Overrides the per-model lookup
+    default_context_window: int = 2048
+    model_context_windows: Dict[str, int] = {
+        "gpt-4o": 128000,
+        "gpt-4-turbo": 128000,
+        "gpt-4": 8192,
+        "gpt-3.5-turbo": 16385,
+    }
+    reply_token_reserve: int = 512  # Tokens kept free for the model's reply
+    # When history no longer fits, it is cut back to this share of the budget so
+    # the next few turns reuse the same prompt prefix (and Ollama's prompt cache)
+    context_refill_ratio: float = 0.6
+
+    # --- Summarization Settings ---
+    # Turns that leave the prompt's history window are folded into a running summary
+    # in the background, which the prompt carries in their place (opt-in)
+    summarization_enabled: bool = False
+    summarize_every: int = 6  # Turns batched into one summary update
+    summary_model: Optional[str] = None  # default_model if unset
+    summary_max_words: int = 200
+
+    # --- Long-Term Memory Settings ---
+    # Semantic recall of past turns beyond the recent window (opt-in)
+    long_term_memory_enabled: bool = False
+    embedding_provider: Optional[Literal["ollama", "openai"]] = None  # default_provider if unset
+    embedding_model: str = "nomic-embed-text"
+    embedding_batch_size: int = 8  # Interactions embedded per request
+    long_term_memory_top_k: int = 3
+    long_term_memory_min_score: float = 0.3  # Minimum cosine similarity to recall
 
     class Config:
         # Look for a .env file in the project root
@@ -49,39 +174,45 @@ class Settings(BaseSettings):
         # Allow extra environment variables (like API keys from the system)
         extra = 'allow'
 
-    @validator("memory_persistence_path")
-    def ensure_memory_path_exists(cls, v: Path) -> Path:
-        """Ensure the directory for storing memory exists."""
-        v.mkdir(parents=True, exist_ok=True)
-        return v
-
     @validator("openai_api_key", pre=True, always=True)
-    def get_openai_api_key_from_keyring(cls, v, values) -> Optional[SecretStr]:
+    def coerce_openai_api_key(cls, v) -> Optional[SecretStr]:
+        """Keep an API key set via environment variable (OPENAI_API_KEY) as a SecretStr."""
+        if v is None:
+            return None
+        # If v is already a SecretStr, return it. If it's a string, convert it.
+        return v if isinstance(v, SecretStr) else SecretStr(v)
+
+    def get_openai_api_key(self) -> Optional[SecretStr]:
         """
         Priority for loading OpenAI API Key:
         1. Explicitly set via environment variable (OPENAI_API_KEY)
         2. Loaded from the system's keyring
         3. None (user will have to set it in the UI)
+
+        The keyring is only queried here, on first use, because loading its
+        backend is slow; a key found there is kept on the settings object.
         """
-        # If it was already set by the env variable, use that.
-        if v is not None:
-            # If v is already a SecretStr, return it. If it's a string, convert it.
-            return v if isinstance(v, SecretStr) else SecretStr(v)
+        if self.openai_api_key is not None:
+            return self.openai_api_key
+
+        import keyring
 
         # Try to get the key from the system keyring
         try:
             stored_key = keyring.get_password(KEYRING_SERVICE_NAME, "openai_api_key")
             if stored_key:
-                return SecretStr(stored_key)
+                self.openai_api_key = SecretStr(stored_key)
         except keyring.errors.KeyringError:
             # Keyring might not be available (e.g., in a container)
             # Silently fail and return None
             pass
 
-        return None  # No key found
+        return self.openai_api_key
 
     def save_openai_api_key_to_keyring(self, api_key: str) -> None:
         """Securely save the OpenAI API key to the system keyring."""
+        import keyring
+
         try:
             keyring.set_password(KEYRING_SERVICE_NAME, "openai_api_key", api_key)
             # Update the current settings object
@@ -91,6 +222,8 @@ class Settings(BaseSettings):
 
     def delete_openai_api_key_from_keyring(self) -> None:
         """Remove the OpenAI API key from the system keyring."""
+        import keyring
+
         try:
             keyring.delete_password(KEYRING_SERVICE_NAME, "openai_api_key")
             self.openai_api_key = None
@@ -101,14 +234,55 @@ class Settings(BaseSettings):
             raise Exception(f"Could not delete API key from keyring: {e}")
 
 
+class _LazySettings:
+    """
+    Stand-in for the global `Settings` instance, constructed on first access.
+
+    Reading the environment and .env file is deferred until a setting is
+    actually used, so importing Sam AI modules stays cheap. Attribute reads
+    and writes go to the real instance.
+    """
+
+    def __init__(self):
+        object.__setattr__(self, "_instance", None)
+        object.__setattr__(self, "_lock", threading.Lock())
+
+    def _get(self) -> Settings:
+        instance = self._instance
+        if instance is None:
+            with self._lock:
+                instance = self._instance
+                if instance is None:
+                    instance = Settings()
+                    object.__setattr__(self, "_instance", instance)
+        return instance
+
+    def _reset(self, instance: Optional[Settings] = None) -> None:
+        """Replace the wrapped instance, or drop it so the next access rebuilds it."""
+        object.__setattr__(self, "_instance", instance)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._get(), name)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        setattr(self._get(), name, value)
+
+    def __delattr__(self, name: str) -> None:
+        delattr(self._get(), name)
+
+    def __repr__(self) -> str:
+        return repr(self._get())
+
+
 # Create a global settings object that can be imported throughout the application
-settings = Settings()
+settings = _LazySettings()
 
 def load_config() -> Settings:
     """
     Helper function to load and return the configuration.
-    This is useful if you need to reload settings at runtime.
+    This is useful if you need to reload settings at runtime; every module
+    sharing `settings` sees the reloaded values.
     """
-    global settings
-    settings = Settings()
-    return settings
+    instance = Settings()
+    settings._reset(instance)
+    return instance
@@ -5,10 +5,14 @@ Core components of Sam AI - Orchestration, Memory Management, and Configuration.
 Core components of Sam AI - Orchestration, Memory Management, and Configuration.
 """
 
-from .engine import Orchestrator
+from .engine import AsyncOrchestrator, Orchestrator
+from .instrumentation import Instrumentation, get_instrumentation, set_instrumentation
 from .memory_manager import MemoryManager
 
-__all__ = ['Orchestrator', 'MemoryManager']
+__all__ = [
+    'Orchestrator', 'AsyncOrchestrator', 'MemoryManager',
+    'Instrumentation', 'get_instrumentation', 'set_instrumentation',
+]
 
 # Use absolute imports
 #from src.sam_ai.config import settings
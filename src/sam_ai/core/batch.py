@@ -0,0 +1,232 @@
+"""
+Batch generation for Sam AI.
+
+Runs many prompts from a JSON-lines file through the configured provider with
+bounded concurrency, for evaluations and bulk jobs. Conversation memory is
+never read or written. Each result is appended to the output file as soon as
+it is ready, and the output doubles as the checkpoint: re-running the same
+job skips every prompt that already has a response.
+
+Input lines look like {"id": "q1", "prompt": "..."}; instead of "prompt" a
+line may give "messages" (a full chat message list), and may override
+"model", "mode", "system" (system prompt) and "options".
+
+Usage:
+    python -m src.sam_ai.core.batch prompts.jsonl results.jsonl --concurrency 8
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional, Set, Tuple
+
+from ..config import settings
+from ..providers import BaseProvider, get_provider
+from ..providers.scheduler import BATCH, request_scope
+from ..tools import ToolExecutor
+from .engine import build_messages, run_agent
+
+logger = logging.getLogger(__name__)
+
+# Output lines between fsyncs of the results file
+FSYNC_EVERY = 100
+
+
+def read_prompts(input_path: Path) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """Yield (id, record) for each line of a prompts file, skipping malformed lines."""
+    with open(input_path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                logger.warning(f"Skipping malformed line {line_number} of {input_path}: {e}")
+                continue
+            yield str(record.get("id", f"line-{line_number}")), record
+
+
+def completed_ids(output_path: Path) -> Set[str]:
+    """Ids that already have a response in a results file (failed ones are retried)."""
+    done = set()
+    if not output_path.exists():
+        return done
+    with open(output_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # A line torn by an interruption
+            if "response" in result:
+                done.add(result["id"])
+    return done
+
+
+def _ends_with_newline(path: Path) -> bool:
+    with open(path, "rb") as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b"\n"
+
+
+class BatchRunner:
+    """Runs prompts concurrently against a provider, without conversation memory."""
+
+    def __init__(
+        self,
+        provider: Optional[BaseProvider] = None,
+        model: Optional[str] = None,
+        mode: str = "chat",
+        concurrency: Optional[int] = None,
+    ):
+        """
+        Args:
+            provider: Provider to use. Defaults to `settings.default_provider`,
+                which may be a router spreading the load over several backends.
+            model: Default model. Defaults to `settings.default_model`.
+            mode: Default mode ('chat' or 'agent').
+            concurrency: Prompts in flight at once. Defaults to `settings.batch_concurrency`.
+        """
+        self.provider = provider or get_provider(settings.default_provider)
+        self.model = model or settings.default_model
+        self.mode = mode
+        self.concurrency = concurrency or settings.batch_concurrency
+        self._tools: Optional[ToolExecutor] = None
+
+    async def _generate(self, record: Dict[str, Any]) -> str:
+        # Batch work queues behind interactive users on a shared backend
+        with request_scope(user="batch", priority=BATCH):
+            return await self._generate_response(record)
+
+    async def _generate_response(self, record: Dict[str, Any]) -> str:
+        mode = record.get("mode", self.mode)
+        model = record.get("model", self.model)
+        messages = record.get("messages") or build_messages(
+            record["prompt"], mode, system_prompt=record.get("system")
+        )
+        if mode == "agent":
+            if self._tools is None:
+                self._tools = ToolExecutor()
+            return await asyncio.to_thread(run_agent, self.provider, self._tools, messages, model)
+
+        kwargs = {"mode": mode}
+        if record.get("options"):
+            kwargs["options"] = record["options"]
+        return await self.provider.achat_completion(messages=messages, model=model, **kwargs)
+
+    async def arun(self, input_path: Path, output_path: Path, resume: bool = True) -> Dict[str, int]:
+        """
+        Run every prompt in `input_path`, appending results to `output_path`.
+
+        Each output line is {"id", "response", "model", "latency"}, or {"id",
+        "error"} for a failed prompt. Lines are written in completion order.
+
+        Args:
+            input_path: JSON-lines file of prompts.
+            output_path: JSON-lines results file, appended to.
+            resume: Skip prompts that already have a response in `output_path`.
+
+        Returns:
+            Counts of prompts "succeeded", "failed" and "skipped".
+        """
+        input_path, output_path = Path(input_path), Path(output_path)
+        done = completed_ids(output_path) if resume else set()
+        counts = {"succeeded": 0, "failed": 0, "skipped": 0}
+        # Bounded, so a huge input file is never read into memory at once
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.concurrency * 2)
+
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(output_path, "a" if resume else "w", encoding="utf-8") as out:
+            if out.tell() and not _ends_with_newline(output_path):
+                out.write("\n")  # Finish a line torn by an interruption
+
+            def write(result: Dict[str, Any]) -> None:
+                out.write(json.dumps(result, ensure_ascii=False) + "\n")
+                out.flush()
+                written = counts["succeeded"] + counts["failed"]
+                if written % FSYNC_EVERY == 0:
+                    os.fsync(out.fileno())
+
+            async def produce():
+                for prompt_id, record in read_prompts(input_path):
+                    if prompt_id in done:
+                        counts["skipped"] += 1
+                        continue
+                    await queue.put((prompt_id, record))
+                for _ in range(self.concurrency):
+                    await queue.put(None)
+
+            async def work():
+                while True:
+                    item = await queue.get()
+                    if item is None:
+                        return
+                    prompt_id, record = item
+                    start = time.monotonic()
+                    try:
+                        response = await self._generate(record)
+                    except Exception as e:
+                        counts["failed"] += 1
+                        logger.warning(f"Prompt {prompt_id} failed: {e}")
+                        write({"id": prompt_id, "error": str(e)})
+                        continue
+                    counts["succeeded"] += 1
+                    write({
+                        "id": prompt_id,
+                        "response": response,
+                        "model": record.get("model", self.model),
+                        "latency": round(time.monotonic() - start, 3),
+                    })
+
+            try:
+                await asyncio.gather(produce(), *(work() for _ in range(self.concurrency)))
+            finally:
+                out.flush()
+                os.fsync(out.fileno())
+
+        return counts
+
+    def run(self, input_path: Path, output_path: Path, resume: bool = True) -> Dict[str, int]:
+        """Blocking wrapper around `arun`."""
+        return asyncio.run(self.arun(input_path, output_path, resume=resume))
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Run prompts from a JSON-lines file through Sam AI's provider."
+    )
+    parser.add_argument("input", type=Path, help="JSON-lines file of prompts")
+    parser.add_argument("output", type=Path, help="JSON-lines results file (also the checkpoint)")
+    parser.add_argument("--concurrency", type=int, default=None, help="Prompts in flight at once")
+    parser.add_argument("--provider", default=None, help="ollama, openai or router")
+    parser.add_argument("--model", default=None, help="Model to use unless a prompt sets one")
+    parser.add_argument("--mode", choices=["chat", "agent"], default="chat")
+    parser.add_argument("--no-resume", action="store_true", help="Overwrite the output instead")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=settings.log_level, format="%(levelname)s %(message)s")
+    runner = BatchRunner(
+        provider=get_provider(args.provider) if args.provider else None,
+        model=args.model,
+        mode=args.mode,
+        concurrency=args.concurrency,
+    )
+    try:
+        counts = runner.run(args.input, args.output, resume=not args.no_resume)
+    except KeyboardInterrupt:
+        print("Interrupted; re-run the same command to resume.", file=sys.stderr)
+        return 130
+    print(
+        f"{counts['succeeded']} succeeded, {counts['failed']} failed, "
+        f"{counts['skipped']} already done",
+        file=sys.stderr,
+    )
+    return 1 if counts["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,135 @@
+"""
+Token-budgeted context assembly for Sam AI.
+
+Prompts are sized in estimated tokens rather than message counts, so history
+fills the model's context window without overflowing it. Overflowing makes
+local models slow to prefill and causes Ollama to silently truncate the prompt.
+"""
+
+import logging
+import math
+from functools import lru_cache
+from typing import Dict, Iterable, List, Tuple
+
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+# Tokens spent on role markers and separators around each chat message
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+@lru_cache(maxsize=1024)
+def estimate_tokens(text: str) -> int:
+    """
+    Estimate the number of tokens in `text` without a model-specific tokenizer.
+
+    Uses the larger of ~4 characters per token and ~1.3 tokens per word, which
+    tracks common BPE tokenizers closely enough for budgeting on English text
+    while erring high on code and non-Latin scripts.
+    """
+    if not text:
+        return 0
+    return math.ceil(max(len(text) / 4, len(text.split()) * 1.3))
+
+
+def estimate_message_tokens(message: Dict[str, str]) -> int:
+    """Estimate the tokens used by one chat message, including its overhead."""
+    return estimate_tokens(message.get("content") or "") + MESSAGE_OVERHEAD_TOKENS
+
+
+def interaction_tokens(interaction: Dict) -> int:
+    """
+    Estimated tokens for an interaction rendered as a user/assistant message pair.
+
+    The estimate is cached on the interaction under "tokens", which is persisted
+    with it, so each stored turn is only measured once.
+    """
+    tokens = interaction.get("tokens")
+    if tokens is None:
+        tokens = (
+            estimate_tokens(interaction["user"])
+            + estimate_tokens(interaction["assistant"])
+            + 2 * MESSAGE_OVERHEAD_TOKENS
+        )
+        interaction["tokens"] = tokens
+    return tokens
+
+
+def context_window_for(model: str) -> int:
+    """
+    Return the context window, in tokens, to budget prompts for `model`.
+
+    `settings.context_window_tokens` overrides everything. Otherwise the model is
+    looked up in `settings.model_context_windows`, first by its full name and
+    then without its tag (e.g. "llama3:8b" -> "llama3"). Unlisted (local)
+    models get `settings.ollama_num_ctx` if set, else the default window.
+    """
+    if settings.context_window_tokens:
+        return settings.context_window_tokens
+    windows = settings.model_context_windows
+    if model in windows:
+        return windows[model]
+    fallback = settings.ollama_num_ctx or settings.default_context_window
+    return windows.get(model.split(":")[0], fallback)
+
+
+def fit_interactions(
+    interactions: Iterable[Dict], budget: int
+) -> Tuple[List[Dict], int]:
+    """
+    Select interactions, newest first, until `budget` tokens are used up.
+
+    Args:
+        interactions: Candidate interactions ordered from newest to oldest.
+        budget: Tokens available.
+
+    Returns:
+        The selected interactions in chronological order, and the tokens they use.
+    """
+    selected = []
+    used = 0
+    for interaction in interactions:
+        tokens = interaction_tokens(interaction)
+        if used + tokens > budget:
+            break
+        selected.append(interaction)
+        used += tokens
+    selected.reverse()
+    return selected, used
+
+
+class ContextBuilder:
+    """Works out how many tokens of history fit into a model's prompt."""
+
+    def __init__(self, model: str, context_window: int = None, reply_tokens: int = None):
+        """
+        Args:
+            model: The model the prompt is built for.
+            context_window: Override for the model's context window, in tokens.
+            reply_tokens: Tokens reserved for the model's reply.
+                Defaults to `settings.reply_token_reserve`.
+        """
+        self.model = model
+        self.context_window = context_window or context_window_for(model)
+        self.reply_tokens = (
+            settings.reply_token_reserve if reply_tokens is None else reply_tokens
+        )
+
+    def history_budget(self, system_prompt: str, message: str) -> int:
+        """
+        Tokens left for conversation history once the system prompt, the current
+        message and the reply reserve are accounted for.
+        """
+        fixed = (
+            estimate_message_tokens({"content": system_prompt})
+            + estimate_message_tokens({"content": message})
+            + self.reply_tokens
+        )
+        budget = self.context_window - fixed
+        if budget < 0:
+            logger.warning(
+                f"Prompt for {self.model} needs ~{fixed} tokens, more than its "
+                f"{self.context_window}-token context window; sending without history"
+            )
+        return max(0, budget)
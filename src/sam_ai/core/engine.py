@@ -3,23 +3,154 @@ Main orchestration engine for Sam AI.
 Handles the flow between providers, memory, and tools.
 """
 
+import asyncio
+import json
 import logging
-from typing import Dict, List, Any, Optional
+import threading
+import time
+from typing import AsyncIterator, Dict, Iterator, List, Any, Optional
 
 # Clean relative imports within the same package
 from ..config import settings
-from ..providers import get_provider
+from ..providers import BaseProvider, ProviderBusy, ToolCallingNotSupported, get_provider
+from ..providers.scheduler import AGENT, INTERACTIVE, request_scope
+from ..tools import ToolExecutor
+from .context_builder import ContextBuilder, estimate_message_tokens, estimate_tokens
+from .instrumentation import Instrumentation, get_instrumentation
 from .memory_manager import MemoryManager
 
 logger = logging.getLogger(__name__)
 
+# System prompts are module constants so every request sends byte-identical
+# text; a stable prompt prefix lets Ollama reuse its cached prefill.
+CHAT_SYSTEM_PROMPT = (
+    "You are Sam, a helpful, kind, and trauma-informed AI assistant.\n"
+    "Be supportive, empathetic, and professional in your responses.\n"
+    "Focus on being helpful while maintaining appropriate boundaries."
+)
+
+AGENT_SYSTEM_PROMPT = (
+    "You are Sam in Agent Mode. You can help with multi-step tasks.\n"
+    "Think step by step and break down complex problems.\n"
+    "You have access to tools; call them whenever they help answer accurately."
+)
+
+# Reply when the provider's queue turned the request away
+BUSY_REPLY = (
+    "I'm getting a lot of requests right now and couldn't get to yours in time. "
+    "Please try again in a moment."
+)
+
+def system_prompt_for(mode: str) -> str:
+    """The system prompt for a mode ('chat' or 'agent')."""
+    return AGENT_SYSTEM_PROMPT if mode == "agent" else CHAT_SYSTEM_PROMPT
+
+
+def summary_message(summary: str) -> Dict:
+    """System message carrying the running summary of older turns."""
+    return {
+        "role": "system",
+        "content": f"Summary of the earlier conversation:\n{summary}",
+    }
+
+
+def build_messages(
+    message: str,
+    mode: str = "chat",
+    context: List[Dict] = (),
+    summary: Optional[str] = None,
+    system_prompt: Optional[str] = None,
+) -> List[Dict]:
+    """
+    Assemble the messages sent to a provider for one user message.
+
+    Args:
+        message: The user's input message
+        mode: The operation mode ('chat' or 'agent')
+        context: Earlier turns as chat messages, oldest first
+        summary: Running summary of turns older than `context`
+        system_prompt: Overrides the mode's system prompt
+    """
+    messages = [{"role": "system", "content": system_prompt or system_prompt_for(mode)}]
+    
+    # Older turns are represented by their summary instead of the raw text
+    if summary:
+        messages.append(summary_message(summary))
+    
+    messages.extend(context)
+    messages.append({"role": "user", "content": message})
+    return messages
+
+
+def run_agent(
+    provider: BaseProvider, tools: ToolExecutor, messages: List[Dict], model: str
+) -> str:
+    """
+    Let the model call tools until it produces a final answer.
+
+    Each round sends the conversation with the tool definitions; the tool
+    calls the model makes are run concurrently and their results appended
+    for the next round. After `settings.agent_max_tool_rounds` rounds the
+    model is asked to answer without tools. Providers or models without
+    native tool support get a plain completion.
+    """
+    messages = list(messages)
+    schemas = tools.tool_schemas()
+    try:
+        for _ in range(settings.agent_max_tool_rounds):
+            turn = provider.chat_with_tools(
+                messages=messages,
+                model=model,
+                tools=schemas,
+                mode="agent"
+            )
+            if not turn["tool_calls"]:
+                return turn["content"]
+
+            messages.append(turn["message"])
+            results = tools.execute(turn["tool_calls"])
+            for call, result in zip(turn["tool_calls"], results):
+                content = json.dumps(result, ensure_ascii=False, default=str)
+                # Results can hold whole file excerpts; only their size goes to INFO
+                logger.info(f"Tool {call['name']} returned {len(content)} characters")
+                logger.debug(f"Tool {call['name']}({call['arguments']}) -> {content[:200]}")
+                messages.append(provider.tool_result_message(call, content))
+    except ToolCallingNotSupported as e:
+        logger.info(f"Agent mode without tools: {e}")
+
+    return provider.chat_completion(
+        messages=messages,
+        model=model,
+        mode="agent"
+    )
+
+
 class Orchestrator:
     """Main orchestrator that manages the AI conversation flow."""
     
-    def __init__(self):
-        self.memory = MemoryManager()
-        self.provider = get_provider(settings.default_provider)
+    def __init__(
+        self,
+        user_id: str = "default",
+        session_id: str = "default",
+        instrumentation: Optional[Instrumentation] = None,
+        provider: Optional[BaseProvider] = None,
+    ):
+        """
+        Args:
+            user_id: Owner of the conversation.
+            session_id: Conversation identifier, mapped to its own memory.
+            instrumentation: Where stage timings and counters go. Defaults to
+                the process-wide one configured by `settings.metrics_exporters`.
+            provider: Provider to generate with, e.g. one shared by a server's
+                conversations. Defaults to `settings.default_provider`.
+        """
+        self.memory = MemoryManager(user_id=user_id, session_id=session_id)
+        self.provider = provider or get_provider(settings.default_provider)
         self.current_mode = "chat"  # 'chat' or 'agent'
+        self.tools = ToolExecutor()
+        self.instrumentation = instrumentation or get_instrumentation()
+        if settings.ollama_warm_up:
+            self.warm_up()
         
     def process_message(self, message: str, mode: str = "chat") -> str:
         """
@@ -34,67 +165,383 @@ class Orchestrator:
         """
         self.current_mode = mode
         
-        # Get relevant context from memory
-        context = self.memory.get_context(message)
+        # Get as much relevant context from memory as fits the model's window
+        context = self._get_context(message, mode)
         
         # Prepare messages for the AI provider
         messages = self._prepare_messages(message, context)
         
         try:
             # Get response from the provider
-            response = self.provider.chat_completion(
-                messages=messages,
-                model=settings.default_model,
-                mode=mode
-            )
+            with self._request_scope(mode):
+                if mode == "agent":
+                    response = self._run_agent(messages)
+                else:
+                    with self._provider_span("provider.chat_completion", mode):
+                        response = self.provider.chat_completion(
+                            messages=messages,
+                            model=settings.default_model,
+                            mode=mode
+                        )
+            self._count_tokens(messages, response)
             
             # Update memory with this interaction
-            self.memory.add_interaction(message, response)
+            with self.instrumentation.span("memory.add_interaction"):
+                self.memory.add_interaction(message, response)
             
             return response
             
+        except ProviderBusy as e:
+            logger.warning(f"Turned away: {e}")
+            return BUSY_REPLY
         except Exception as e:
             logger.error(f"Error processing message: {e}")
             return f"I encountered an error: {str(e)}. Please check if Ollama is running."
     
+    def process_message_stream(self, message: str, mode: str = "chat") -> Iterator[str]:
+        """
+        Process a user message and yield the AI response as it is generated.
+
+        Memory is only updated once the stream has completed, so an interrupted
+        or failed generation never leaves a partial interaction behind.
+
+        Args:
+            message: The user's input message
+            mode: The operation mode ('chat' or 'agent')
+
+        Yields:
+            Chunks of the AI's response, in order
+        """
+        self.current_mode = mode
+
+        # Get as much relevant context from memory as fits the model's window
+        context = self._get_context(message, mode)
+
+        # Prepare messages for the AI provider
+        messages = self._prepare_messages(message, context)
+
+        chunks = []
+        try:
+            with self._request_scope(mode):
+                if mode == "agent":
+                    # Tool rounds can't be streamed; the final answer arrives in one piece
+                    chunks.append(self._run_agent(messages))
+                    yield chunks[0]
+                else:
+                    # Includes the time the caller spends consuming each chunk
+                    with self._provider_span("provider.chat_completion_stream", mode) as span:
+                        start = time.perf_counter()
+                        for chunk in self.provider.chat_completion_stream(
+                            messages=messages,
+                            model=settings.default_model,
+                            mode=mode
+                        ):
+                            if not chunks:
+                                span.set(time_to_first_token=time.perf_counter() - start)
+                            chunks.append(chunk)
+                            yield chunk
+        except ProviderBusy as e:
+            logger.warning(f"Turned away: {e}")
+            yield BUSY_REPLY
+            return
+        except Exception as e:
+            logger.error(f"Error processing message: {e}")
+            yield f"I encountered an error: {str(e)}. Please check if Ollama is running."
+            return
+
+        response = "".join(chunks)
+        self._count_tokens(messages, response)
+
+        # Update memory with the complete interaction
+        with self.instrumentation.span("memory.add_interaction"):
+            self.memory.add_interaction(message, response)
+
+    def _run_agent(self, messages: List[Dict]) -> str:
+        """Run the agent tool loop with this orchestrator's provider and tools."""
+        with self._provider_span("agent.run", "agent"):
+            return run_agent(self.provider, self.tools, messages, settings.default_model)
+
+    def _get_context(self, message: str, mode: str) -> List[Dict]:
+        """Recent (and recalled) history for `message`, sized to the model's window."""
+        with self.instrumentation.span("memory.get_context") as span:
+            context = self.memory.get_context(
+                message, token_budget=self._history_budget(message, mode)
+            )
+            span.set(messages=len(context))
+        return context
+
+    def _request_scope(self, mode: str):
+        """Queue this conversation's provider requests as its user's, by mode."""
+        return request_scope(
+            user=self.memory.user_id, priority=AGENT if mode == "agent" else INTERACTIVE
+        )
+
+    def _provider_span(self, name: str, mode: str):
+        return self.instrumentation.span(
+            name,
+            provider=type(self.provider).__name__,
+            model=settings.default_model,
+            mode=mode,
+        )
+
+    def _count_tokens(self, messages: List[Dict], response: str):
+        """Count the (estimated) prompt and completion tokens of a turn."""
+        if not self.instrumentation.enabled:
+            return
+        model = settings.default_model
+        self.instrumentation.count(
+            "prompt_tokens", sum(estimate_message_tokens(m) for m in messages), model=model
+        )
+        self.instrumentation.count("completion_tokens", estimate_tokens(response), model=model)
+
+    def generate(self, message: str, mode: str = "chat", context: List[Dict] = ()) -> str:
+        """
+        Answer `message` without reading or writing conversation memory.
+
+        For one-off and batch requests, where prompts must not end up in (or
+        be influenced by) the user's conversation history. Errors propagate.
+
+        Args:
+            message: The user's input message
+            mode: The operation mode ('chat' or 'agent')
+            context: Optional earlier turns, as chat messages
+        """
+        messages = build_messages(message, mode, context)
+        with self._request_scope(mode):
+            if mode == "agent":
+                return self._run_agent(messages)
+            with self._provider_span("provider.chat_completion", mode):
+                response = self.provider.chat_completion(
+                    messages=messages,
+                    model=settings.default_model,
+                    mode=mode
+                )
+        self._count_tokens(messages, response)
+        return response
+
+    def _history_budget(self, message: str, mode: str) -> int:
+        """Tokens of history that fit next to the system prompt, summary, message and reply."""
+        builder = ContextBuilder(settings.default_model)
+        budget = builder.history_budget(self._get_system_prompt(mode), message)
+        summary_message = self._get_summary_message()
+        if summary_message:
+            budget = max(0, budget - estimate_message_tokens(summary_message))
+        return budget
+    
+    def _get_summary_message(self) -> Optional[Dict]:
+        """System message carrying the running summary of older turns, if there is one."""
+        summary = self.memory.prompt_summary
+        if not summary:
+            return None
+        return summary_message(summary)
+    
+    def _get_system_prompt(self, mode: str) -> str:
+        """Get the system prompt for the given mode."""
+        if mode == "agent":
+            return self._get_agent_system_prompt()
+        return self._get_chat_system_prompt()
+    
     def _prepare_messages(self, message: str, context: List[Dict]) -> List[Dict]:
         """Prepare the messages array for the AI provider."""
-        messages = []
-        
-        # Add system prompt based on mode
-        if self.current_mode == "agent":
-            system_prompt = self._get_agent_system_prompt()
-        else:
-            system_prompt = self._get_chat_system_prompt()
-            
-        messages.append({"role": "system", "content": system_prompt})
-        
-        # Add context from memory
-        messages.extend(context)
-        
-        # Add current message
-        messages.append({"role": "user", "content": message})
-        
-        return messages
+        with self.instrumentation.span("engine.prepare_messages"):
+            return build_messages(
+                message,
+                context=context,
+                summary=self.memory.prompt_summary,
+                system_prompt=self._get_system_prompt(self.current_mode),
+            )
     
     def _get_chat_system_prompt(self) -> str:
         """Get the system prompt for chat mode."""
-        return """You are Sam, a helpful, kind, and trauma-informed AI assistant.
-        Be supportive, empathetic, and professional in your responses.
-        Focus on being helpful while maintaining appropriate boundaries."""
+        return CHAT_SYSTEM_PROMPT
     
     def _get_agent_system_prompt(self) -> str:
         """Get the system prompt for agent mode."""
-        return """You are Sam in Agent Mode. You can help with multi-step tasks.
-        Think step by step and break down complex problems.
-        You have access to various tools - let me know if you need to use any."""
+        return AGENT_SYSTEM_PROMPT
+    
+    def warm_up(self, model: str = None):
+        """
+        Ask the provider to load `model` (default: `settings.default_model`) in
+        the background, so the first message doesn't pay for a cold model load.
+        The provider tracks what it has warmed up, so orchestrators created
+        later (one per server session) don't start a thread for it again.
+        """
+        model = model or settings.default_model
+        if not self.provider.needs_warm_up(model):
+            return
+        
+        def _warm_up():
+            try:
+                self.provider.warm_up(model)
+            except Exception as e:
+                logger.info(f"Could not warm up {model}: {e}")
+        
+        threading.Thread(target=_warm_up, name="sam-warm-up", daemon=True).start()
     
     def switch_provider(self, provider_name: str):
         """Switch to a different AI provider."""
         self.provider = get_provider(provider_name)
         logger.info(f"Switched to provider: {provider_name}")
+        if settings.ollama_warm_up:
+            self.warm_up()
     
     def clear_memory(self):
         """Clear the conversation memory."""
         self.memory.clear()
-        logger.info("Conversation memory cleared")
\ No newline at end of file
+        logger.info("Conversation memory cleared")
+
+
+class AsyncOrchestrator(Orchestrator):
+    """
+    Orchestrator for asyncio applications.
+
+    Provider calls use the providers' async API, and memory reads and writes run
+    in a worker thread so file I/O never blocks the event loop. Many
+    conversations can then be served concurrently from a single thread.
+    """
+
+    def __init__(
+        self,
+        user_id: str = "default",
+        session_id: str = "default",
+        instrumentation: Optional[Instrumentation] = None,
+        provider: Optional[BaseProvider] = None,
+    ):
+        super().__init__(
+            user_id=user_id,
+            session_id=session_id,
+            instrumentation=instrumentation,
+            provider=provider,
+        )
+        # Created lazily so it binds to the loop that first uses it
+        self._memory_lock: Optional[asyncio.Lock] = None
+
+    def _get_memory_lock(self) -> asyncio.Lock:
+        """Lock serializing memory access, since MemoryManager runs in worker threads."""
+        if self._memory_lock is None:
+            self._memory_lock = asyncio.Lock()
+        return self._memory_lock
+
+    async def _aget_context(self, message: str, mode: str) -> List[Dict]:
+        async with self._get_memory_lock():
+            return await asyncio.to_thread(self._get_context, message, mode)
+
+    async def _aadd_interaction(self, message: str, response: str):
+        async with self._get_memory_lock():
+            with self.instrumentation.span("memory.add_interaction"):
+                await asyncio.to_thread(self.memory.add_interaction, message, response)
+
+    async def aprocess_message(self, message: str, mode: str = "chat") -> str:
+        """
+        Async counterpart of `process_message`.
+
+        Args:
+            message: The user's input message
+            mode: The operation mode ('chat' or 'agent')
+
+        Returns:
+            The AI's response
+        """
+        try:
+            return await self.arespond(message, mode)
+        except ProviderBusy as e:
+            logger.warning(f"Turned away: {e}")
+            return BUSY_REPLY
+        except Exception as e:
+            logger.error(f"Error processing message: {e}")
+            return f"I encountered an error: {str(e)}. Please check if Ollama is running."
+
+    async def arespond(self, message: str, mode: str = "chat") -> str:
+        """
+        Like `aprocess_message`, but provider errors propagate instead of
+        becoming the reply, so callers such as the API server can report them.
+
+        Raises:
+            ProviderBusy: If the provider turned the request away.
+        """
+        context = await self._aget_context(message, mode)
+
+        self.current_mode = mode
+        messages = self._prepare_messages(message, context)
+
+        with self._request_scope(mode):
+            if mode == "agent":
+                # Tools run in threads anyway; keep the loop off the event loop
+                response = await asyncio.to_thread(self._run_agent, messages)
+            else:
+                with self._provider_span("provider.achat_completion", mode):
+                    response = await self.provider.achat_completion(
+                        messages=messages,
+                        model=settings.default_model,
+                        mode=mode
+                    )
+        self._count_tokens(messages, response)
+
+        await self._aadd_interaction(message, response)
+
+        return response
+
+    async def aprocess_message_stream(
+        self, message: str, mode: str = "chat"
+    ) -> AsyncIterator[str]:
+        """
+        Async counterpart of `process_message_stream`.
+
+        Memory is only updated once the stream has completed.
+        """
+        stream = self.arespond_stream(message, mode)
+        try:
+            async for chunk in stream:
+                yield chunk
+        except ProviderBusy as e:
+            logger.warning(f"Turned away: {e}")
+            yield BUSY_REPLY
+        except Exception as e:
+            logger.error(f"Error processing message: {e}")
+            yield f"I encountered an error: {str(e)}. Please check if Ollama is running."
+        finally:
+            await stream.aclose()  # Stop the generation if our caller stopped early
+
+    async def arespond_stream(
+        self, message: str, mode: str = "chat"
+    ) -> AsyncIterator[str]:
+        """
+        Like `aprocess_message_stream`, but provider errors propagate, possibly
+        after some chunks, instead of becoming the last chunk.
+
+        Raises:
+            ProviderBusy: If the provider turned the request away.
+        """
+        context = await self._aget_context(message, mode)
+
+        self.current_mode = mode
+        messages = self._prepare_messages(message, context)
+
+        chunks = []
+        with self._request_scope(mode):
+            if mode == "agent":
+                response = await asyncio.to_thread(self._run_agent, messages)
+                chunks.append(response)
+                yield response
+            else:
+                with self._provider_span("provider.achat_completion_stream", mode) as span:
+                    start = time.perf_counter()
+                    async for chunk in self.provider.achat_completion_stream(
+                        messages=messages,
+                        model=settings.default_model,
+                        mode=mode
+                    ):
+                        if not chunks:
+                            span.set(time_to_first_token=time.perf_counter() - start)
+                        chunks.append(chunk)
+                        yield chunk
+
+        response = "".join(chunks)
+        self._count_tokens(messages, response)
+        await self._aadd_interaction(message, response)
+
+    async def aclear_memory(self):
+        """Clear the conversation memory without blocking the event loop."""
+        async with self._get_memory_lock():
+            await asyncio.to_thread(self.memory.clear)
+        logger.info("Conversation memory cleared")
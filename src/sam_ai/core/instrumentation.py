@@ -0,0 +1,365 @@
+"""
+Instrumentation for Sam AI.
+
+The orchestrator wraps each stage of a turn in a span (context retrieval,
+prompt assembly, the provider call, the memory write) and counts tokens and
+errors. Spans and counters go to pluggable exporters:
+
+* `PrometheusExporter` aggregates them for a Prometheus text endpoint;
+* `OpenTelemetryExporter` forwards them to the OpenTelemetry API, for
+  whatever SDK and exporters the application has configured;
+* `JSONLogExporter` writes one JSON log line per span or counter.
+
+With no exporters, spans are a shared no-op and cost next to nothing.
+"""
+
+import asyncio
+import json
+import logging
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+# Histogram buckets for span durations, in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class Span:
+    """A timed operation. Use `Instrumentation.span` rather than creating one."""
+
+    __slots__ = ("name", "attributes", "start_time", "duration", "error", "_instrumentation", "_start")
+
+    def __init__(self, instrumentation: "Instrumentation", name: str, attributes: Dict[str, Any]):
+        self.name = name
+        self.attributes = attributes
+        self.start_time = 0  # Wall clock, in nanoseconds since the epoch
+        self.duration = 0.0  # Seconds
+        self.error: Optional[str] = None  # Exception type name, if the operation raised
+        self._instrumentation = instrumentation
+        self._start = 0.0
+
+    def set(self, **attributes) -> None:
+        """Attach attributes, e.g. sizes only known once the operation ran."""
+        self.attributes.update(attributes)
+
+    def __enter__(self) -> "Span":
+        self.start_time = time.time_ns()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        self.duration = time.perf_counter() - self._start
+        if exc_type is not None:
+            if issubclass(exc_type, (GeneratorExit, asyncio.CancelledError)):
+                self.attributes["cancelled"] = True  # The caller stopped, nothing failed
+            else:
+                self.error = exc_type.__name__
+        self._instrumentation._finish(self)
+        return False
+
+
+class _NoopSpan:
+    """Stand-in returned by `Instrumentation.span` when nothing is exported."""
+
+    __slots__ = ()
+
+    def set(self, **attributes) -> None:
+        pass
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class Exporter:
+    """Receives finished spans and counter increments. Must be thread-safe."""
+
+    def export_span(self, span: Span) -> None:
+        pass
+
+    def export_counter(self, name: str, value: float, labels: Dict[str, str]) -> None:
+        pass
+
+    def shutdown(self) -> None:
+        pass
+
+
+class Instrumentation:
+    """Creates spans and counters and hands them to the exporters."""
+
+    def __init__(self, exporters: Iterable[Exporter] = ()):
+        self.exporters: List[Exporter] = list(exporters)
+
+    @property
+    def enabled(self) -> bool:
+        """Whether anything is exported; skip computing costly attributes otherwise."""
+        return bool(self.exporters)
+
+    def add_exporter(self, exporter: Exporter) -> None:
+        self.exporters.append(exporter)
+
+    def span(self, name: str, **attributes):
+        """
+        Context manager timing the enclosed block.
+
+        An exception escaping the block marks the span as failed and
+        increments the "errors" counter, then propagates.
+        """
+        if not self.exporters:
+            return _NOOP_SPAN
+        return Span(self, name, attributes)
+
+    def count(self, name: str, value: float = 1, **labels) -> None:
+        """Increment a counter, e.g. `count("completion_tokens", 42, model="llama3")`."""
+        for exporter in self.exporters:
+            try:
+                exporter.export_counter(name, value, labels)
+            except Exception as e:
+                logger.warning(f"Metrics exporter {type(exporter).__name__} failed: {e}")
+
+    def _finish(self, span: Span) -> None:
+        for exporter in self.exporters:
+            try:
+                exporter.export_span(span)
+            except Exception as e:
+                logger.warning(f"Metrics exporter {type(exporter).__name__} failed: {e}")
+        if span.error:
+            self.count("errors", span=span.name, error=span.error)
+
+    def shutdown(self) -> None:
+        for exporter in self.exporters:
+            exporter.shutdown()
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(labels: Tuple[Tuple[str, str], ...], extra: str = "") -> str:
+    parts = [f'{key}="{_escape(value)}"' for key, value in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class PrometheusExporter(Exporter):
+    """
+    Aggregates spans into duration histograms and counters, rendered in the
+    Prometheus text format by `render()` or served over HTTP by `serve()`.
+
+    Only the span name becomes a label, so series stay few however many
+    sessions there are.
+    """
+
+    def __init__(self, namespace: str = "sam_ai", buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.namespace = namespace
+        self.buckets = tuple(sorted(buckets))
+        # (span, status) -> [per-bucket counts..., sum, count]
+        self._histograms: Dict[Tuple[str, str], List[float]] = {}
+        self._counters: Dict[str, Dict[Tuple[Tuple[str, str], ...], float]] = {}
+        self._lock = threading.Lock()
+        self._server = None
+
+    def export_span(self, span: Span) -> None:
+        key = (span.name, "error" if span.error else "ok")
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [0.0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if span.duration <= bound:
+                    histogram[i] += 1
+            histogram[-2] += span.duration
+            histogram[-1] += 1
+
+    def export_counter(self, name: str, value: float, labels: Dict[str, str]) -> None:
+        key = tuple(sorted((k, str(v)) for k, v in labels.items()))
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def render(self) -> str:
+        """The current metrics in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            if self._histograms:
+                metric = f"{self.namespace}_span_duration_seconds"
+                lines.append(f"# HELP {metric} Duration of each stage of a turn.")
+                lines.append(f"# TYPE {metric} histogram")
+                for (name, status), histogram in sorted(self._histograms.items()):
+                    labels = (("span", name), ("status", status))
+                    for bound, count in zip(self.buckets, histogram):
+                        bucket = _labels(labels, 'le="%s"' % bound)
+                        lines.append(f"{metric}_bucket{bucket} {count:g}")
+                    bucket = _labels(labels, 'le="+Inf"')
+                    lines.append(f"{metric}_bucket{bucket} {histogram[-1]:g}")
+                    lines.append(f"{metric}_sum{_labels(labels)} {histogram[-2]}")
+                    lines.append(f"{metric}_count{_labels(labels)} {histogram[-1]:g}")
+            for name, series in sorted(self._counters.items()):
+                metric = f"{self.namespace}_{name}_total"
+                lines.append(f"# TYPE {metric} counter")
+                for labels, value in sorted(series.items()):
+                    lines.append(f"{metric}{_labels(labels)} {value:g}")
+        return "\n".join(lines) + "\n"
+
+    def serve(self, host: str = "127.0.0.1", port: int = 9464):
+        """Serve `render()` at http://host:port/metrics from a daemon thread; returns the server."""
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        exporter = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = exporter.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(
+            target=self._server.serve_forever, name="sam-metrics", daemon=True
+        ).start()
+        return self._server
+
+    def shutdown(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+class OpenTelemetryExporter(Exporter):
+    """
+    Forwards spans and counters to the OpenTelemetry API.
+
+    Spans become OTel spans (with their real start and end times) and also
+    feed a "sam_ai.span.duration" histogram; counters become OTel counters
+    named "sam_ai.<name>". Where they end up is up to the SDK configured by
+    the application; without one, the API discards them.
+    """
+
+    def __init__(self, tracer=None, meter=None):
+        try:
+            from opentelemetry import metrics, trace
+            from opentelemetry.trace import Status, StatusCode
+        except ImportError as e:
+            raise ImportError(
+                "The OpenTelemetry exporter needs opentelemetry-api: "
+                "pip install 'sam-ai[telemetry]'"
+            ) from e
+        self._error_status = lambda error: Status(StatusCode.ERROR, error)
+        self._tracer = tracer or trace.get_tracer("sam_ai")
+        self._meter = meter or metrics.get_meter("sam_ai")
+        self._duration = self._meter.create_histogram(
+            "sam_ai.span.duration", unit="s", description="Duration of each stage of a turn."
+        )
+        self._counters: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def export_span(self, span: Span) -> None:
+        attributes = {
+            k: v for k, v in span.attributes.items() if isinstance(v, (str, bool, int, float))
+        }
+        otel_span = self._tracer.start_span(
+            span.name, start_time=span.start_time, attributes=attributes
+        )
+        if span.error:
+            otel_span.set_status(self._error_status(span.error))
+        otel_span.end(end_time=span.start_time + int(span.duration * 1e9))
+        self._duration.record(span.duration, {"span": span.name})
+
+    def export_counter(self, name: str, value: float, labels: Dict[str, str]) -> None:
+        counter = self._counters.get(name)
+        if counter is None:
+            with self._lock:
+                counter = self._counters.get(name)
+                if counter is None:
+                    counter = self._counters[name] = self._meter.create_counter(f"sam_ai.{name}")
+        counter.add(value, {k: str(v) for k, v in labels.items()})
+
+
+class JSONLogExporter(Exporter):
+    """Logs every span and counter increment as one line of JSON."""
+
+    def __init__(self, logger_name: str = "sam_ai.metrics", level: int = logging.INFO):
+        self.logger = logging.getLogger(logger_name)
+        self.level = level
+
+    def export_span(self, span: Span) -> None:
+        if not self.logger.isEnabledFor(self.level):
+            return
+        record = {
+            "type": "span",
+            "name": span.name,
+            "start": span.start_time / 1e9,
+            "duration_ms": round(span.duration * 1000, 3),
+            "attributes": span.attributes,
+        }
+        if span.error:
+            record["error"] = span.error
+        self.logger.log(self.level, json.dumps(record, default=str))
+
+    def export_counter(self, name: str, value: float, labels: Dict[str, str]) -> None:
+        if self.logger.isEnabledFor(self.level):
+            self.logger.log(self.level, json.dumps(
+                {"type": "counter", "name": name, "value": value, "labels": labels}, default=str
+            ))
+
+
+_instrumentation: Optional[Instrumentation] = None
+_instrumentation_lock = threading.Lock()
+
+
+def _build_instrumentation() -> Instrumentation:
+    instrumentation = Instrumentation()
+    for name in settings.metrics_exporters:
+        try:
+            if name == "prometheus":
+                exporter = PrometheusExporter()
+                exporter.serve(settings.metrics_host, settings.metrics_port)
+            elif name == "otel":
+                exporter = OpenTelemetryExporter()
+            else:
+                exporter = JSONLogExporter()
+        except (ImportError, OSError) as e:
+            logger.warning(f"Metrics exporter '{name}' disabled: {e}")
+            continue
+        instrumentation.add_exporter(exporter)
+    return instrumentation
+
+
+def get_instrumentation() -> Instrumentation:
+    """The process-wide instrumentation, built from `settings.metrics_exporters` on first use."""
+    global _instrumentation
+    if _instrumentation is None:
+        with _instrumentation_lock:
+            if _instrumentation is None:
+                _instrumentation = _build_instrumentation()
+    return _instrumentation
+
+
+def set_instrumentation(instrumentation: Optional[Instrumentation]) -> None:
+    """Replace the process-wide instrumentation; None rebuilds it from settings on next use."""
+    global _instrumentation
+    with _instrumentation_lock:
+        if _instrumentation is not None and _instrumentation is not instrumentation:
+            _instrumentation.shutdown()
+        _instrumentation = instrumentation
@@ -0,0 +1,360 @@
+"""
+Long-term semantic memory for Sam AI.
+
+Past interactions are embedded through the provider layer (e.g. Ollama's
+embedding endpoint, so it works offline) and kept in a local vector index.
+`MemoryManager.get_context` queries it for the turns most relevant to the
+current message, beyond the recent window.
+"""
+
+import json
+import logging
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from ..config import settings
+from ..providers import BaseProvider
+from ..storage import Interaction
+
+logger = logging.getLogger(__name__)
+
+
+class VectorIndex:
+    """
+    In-memory cosine-similarity index over unit-normalized float32 vectors.
+
+    Small indexes are searched exactly with a single matrix-vector product.
+    Once the index grows past `exact_search_limit` vectors, an inverted-file
+    (IVF) index is trained with k-means: each vector is assigned to its nearest
+    centroid, and a query only scores the vectors of its `nprobe` closest
+    clusters. This keeps searches over 100k+ vectors in the low milliseconds.
+    """
+
+    def __init__(self, dim: int, exact_search_limit: int = 20000, nprobe: int = 8):
+        self.dim = dim
+        self.exact_search_limit = exact_search_limit
+        self.nprobe = nprobe
+        self._vectors = np.empty((1024, dim), dtype=np.float32)
+        self._size = 0
+        # IVF state, built lazily once the index is large enough
+        self._centroids: Optional[np.ndarray] = None
+        self._lists: List[np.ndarray] = []
+        self._trained_size = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self._size
+
+    @staticmethod
+    def normalize(vectors: np.ndarray) -> np.ndarray:
+        """Scale vectors to unit length so dot products are cosine similarities."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def add(self, vectors: np.ndarray) -> None:
+        """Append a batch of vectors; their ids continue from the current size."""
+        vectors = self.normalize(np.atleast_2d(vectors))
+        with self._lock:
+            needed = self._size + len(vectors)
+            if needed > len(self._vectors):
+                capacity = max(needed, 2 * len(self._vectors))
+                grown = np.empty((capacity, self.dim), dtype=np.float32)
+                grown[: self._size] = self._vectors[: self._size]
+                self._vectors = grown
+            self._vectors[self._size : needed] = vectors
+            start, self._size = self._size, needed
+
+            if self._centroids is not None:
+                self._assign(start, needed)
+
+        # Retrain when the index first outgrows exact search and whenever it
+        # has doubled since the last training, so clusters stay balanced
+        if self._size > self.exact_search_limit and self._size >= 2 * max(
+            self._trained_size, self.exact_search_limit // 2
+        ):
+            self.train()
+
+    def train(self, iterations: int = 8, sample_size: int = 10000) -> None:
+        """
+        Train IVF centroids with k-means on a sample and rebuild the inverted lists.
+
+        k-means runs on a snapshot without holding the lock, so searches keep
+        using the previous layout until the new one is swapped in.
+        """
+        with self._lock:
+            size = self._size
+            vectors = self._vectors[:size]
+
+        nlist = max(1, int(np.sqrt(size)))
+        rng = np.random.default_rng(0)
+        sample = vectors[rng.choice(size, min(sample_size, size), replace=False)]
+        centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+
+        for _ in range(iterations):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            for c in range(nlist):
+                members = sample[labels == c]
+                if len(members):
+                    centroids[c] = members.mean(axis=0)
+            centroids = self.normalize(centroids)
+
+        labels = np.argmax(vectors @ centroids.T, axis=1)
+        order = np.argsort(labels, kind="stable")
+        bounds = np.searchsorted(labels[order], np.arange(nlist + 1))
+        lists = [order[bounds[c] : bounds[c + 1]] for c in range(nlist)]
+
+        with self._lock:
+            self._centroids = centroids
+            self._lists = lists
+            self._trained_size = size
+            # Vectors added while training was running
+            if self._size > size:
+                self._assign(size, self._size)
+
+    def _assign(self, start: int, end: int) -> None:
+        """Add vectors [start, end) to their nearest centroid's list. Caller holds the lock."""
+        labels = np.argmax(self._vectors[start:end] @ self._centroids.T, axis=1)
+        for offset, c in enumerate(labels):
+            self._lists[c] = np.append(self._lists[c], start + offset)
+
+    def search(self, query: np.ndarray, k: int) -> List[Tuple[int, float]]:
+        """Return up to `k` (id, similarity) pairs, most similar first."""
+        if self._size == 0 or k <= 0:
+            return []
+        query = self.normalize(query).reshape(-1)
+
+        with self._lock:
+            if self._centroids is None:
+                candidates = None
+                scores = self._vectors[: self._size] @ query
+            else:
+                nprobe = min(self.nprobe, len(self._centroids))
+                nearest = np.argpartition(-(self._centroids @ query), nprobe - 1)[:nprobe]
+                candidates = np.concatenate([self._lists[c] for c in nearest])
+                scores = self._vectors[candidates] @ query
+
+        k = min(k, len(scores))
+        if k == 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        ids = top if candidates is None else candidates[top]
+        return [(int(i), float(scores[j])) for i, j in zip(ids, top)]
+
+
+class LongTermMemory:
+    """
+    Embedding-backed store of past interactions for one user.
+
+    New interactions are queued and embedded in batches on a background thread,
+    so writes never wait on the embedding model. Vectors are appended to a raw
+    float32 file and records to a JSON-lines file, both loaded at startup.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        provider: BaseProvider,
+        model: str = None,
+        batch_size: int = None,
+    ):
+        """
+        Args:
+            path: Directory holding this user's index files.
+            provider: Provider used to compute embeddings.
+            model: Embedding model name. Defaults to `settings.embedding_model`.
+            batch_size: Interactions embedded per request.
+                Defaults to `settings.embedding_batch_size`.
+        """
+        self.path = Path(path)
+        self.provider = provider
+        self.model = model or settings.embedding_model
+        self.batch_size = batch_size or settings.embedding_batch_size
+
+        self.records: List[Interaction] = []
+        self.index: Optional[VectorIndex] = None
+        self._pending: List[Interaction] = []
+        self._pending_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sam-embed")
+        self._last_flush: Optional[Future] = None
+
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._load()
+
+    @property
+    def _records_file(self) -> Path:
+        return self.path / "records.jsonl"
+
+    @property
+    def _vectors_file(self) -> Path:
+        return self.path / "vectors.f32"
+
+    @property
+    def _meta_file(self) -> Path:
+        return self.path / "meta.json"
+
+    def _load(self) -> None:
+        """
+        Load persisted records and vectors, repairing the files after a crash.
+
+        Unreadable record lines (e.g. a torn write) are skipped. If the files
+        disagree, because a crash fell between the two appends of a batch,
+        both are cut back to the records that have a vector, so later batches
+        keep `records[i]` aligned with `vectors[i]`.
+        """
+        if not self._meta_file.exists():
+            return
+        try:
+            dim = json.loads(self._meta_file.read_text())["dim"]
+            records, corrupt_lines = self._read_records()
+            vectors = (
+                np.fromfile(self._vectors_file, dtype=np.float32)
+                if self._vectors_file.exists()
+                else np.empty(0, dtype=np.float32)
+            )
+        except (OSError, json.JSONDecodeError, KeyError) as e:
+            logger.warning(f"Could not load long-term memory from {self.path}: {e}")
+            return
+
+        count = min(len(records), len(vectors) // dim)
+        if corrupt_lines or count != len(records) or count * dim != len(vectors):
+            logger.warning(
+                f"Repairing long-term memory in {self.path}: {corrupt_lines} unreadable "
+                f"line(s), {len(records)} records, {len(vectors) // dim} vectors"
+            )
+            try:
+                self._truncate(records[:count], count * dim)
+            except OSError as e:
+                logger.warning(f"Could not repair long-term memory in {self.path}: {e}")
+                return
+
+        self.records = records[:count]
+        self.index = VectorIndex(dim)
+        if count:
+            self.index.add(vectors[: count * dim].reshape(count, dim))
+
+    def _read_records(self) -> Tuple[List[Interaction], int]:
+        """Records in the records file, and the number of lines that could not be read."""
+        records = []
+        corrupt_lines = 0
+        if not self._records_file.exists():
+            return records, corrupt_lines
+        with open(self._records_file, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    records.append(Interaction.from_dict(json.loads(line)))
+                except (json.JSONDecodeError, AttributeError):
+                    corrupt_lines += 1
+        return records, corrupt_lines
+
+    def _truncate(self, records: List[Interaction], floats: int) -> None:
+        """Rewrite the records file to `records` and cut the vectors file to `floats` values."""
+        tmp_path = self._records_file.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record.to_dict(), ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self._records_file)
+        with open(self._vectors_file, "ab") as f:
+            f.truncate(floats * np.dtype(np.float32).itemsize)
+
+    @staticmethod
+    def _text(record: Interaction) -> str:
+        return f"User: {record.user}\nAssistant: {record.assistant}"
+
+    def add(self, record: Interaction) -> None:
+        """Queue an interaction; a full batch is embedded in the background."""
+        with self._pending_lock:
+            self._pending.append(record)
+            if len(self._pending) < self.batch_size:
+                return
+            batch, self._pending = self._pending, []
+        self._last_flush = self._executor.submit(self._embed_batch, batch)
+
+    def flush(self, wait: bool = True) -> None:
+        """Embed any queued interactions now."""
+        with self._pending_lock:
+            batch, self._pending = self._pending, []
+        if batch:
+            self._last_flush = self._executor.submit(self._embed_batch, batch)
+        if wait and self._last_flush is not None:
+            self._last_flush.result()
+
+    def _embed_batch(self, batch: List[Interaction]) -> None:
+        try:
+            vectors = np.asarray(
+                self.provider.embed([self._text(r) for r in batch], model=self.model),
+                dtype=np.float32,
+            )
+        except Exception as e:
+            logger.error(f"Could not embed {len(batch)} interactions: {e}")
+            return
+
+        if self.index is None:
+            self.index = VectorIndex(vectors.shape[1])
+            self._meta_file.write_text(json.dumps({"dim": vectors.shape[1], "model": self.model}))
+
+        with open(self._records_file, "a", encoding="utf-8") as f:
+            for record in batch:
+                f.write(json.dumps(record.to_dict(), ensure_ascii=False) + "\n")
+        with open(self._vectors_file, "ab") as f:
+            VectorIndex.normalize(vectors).tofile(f)
+
+        # Records are published before the index so ids always resolve
+        self.records.extend(batch)
+        self.index.add(vectors)
+
+    def search(self, query: str, k: int = None, min_score: float = None) -> List[Interaction]:
+        """
+        Return up to `k` stored interactions most relevant to `query`, best first.
+
+        Args:
+            query: Text to match, typically the current user message.
+            k: Number of results. Defaults to `settings.long_term_memory_top_k`.
+            min_score: Minimum cosine similarity.
+                Defaults to `settings.long_term_memory_min_score`.
+        """
+        k = settings.long_term_memory_top_k if k is None else k
+        min_score = settings.long_term_memory_min_score if min_score is None else min_score
+        if self.index is None or not len(self.index):
+            return []
+
+        query_vector = np.asarray(self.provider.embed([query], model=self.model)[0])
+        return [
+            self.records[i]
+            for i, score in self.index.search(query_vector, k)
+            if score >= min_score
+        ]
+
+    def close(self) -> None:
+        """Embed anything still queued and stop the background worker."""
+        self.flush(wait=True)
+        self._executor.shutdown(wait=True)
+        with _instances_lock:
+            if _instances.get(self.path) is self:
+                del _instances[self.path]
+
+
+# One instance per user directory, shared by every MemoryManager in the process
+_instances: Dict[Path, LongTermMemory] = {}
+_instances_lock = threading.Lock()
+
+
+def get_long_term_memory(path: Path, provider: BaseProvider) -> LongTermMemory:
+    """Return the shared long-term memory stored at `path`, creating it on first use."""
+    with _instances_lock:
+        memory = _instances.get(path)
+        if memory is None:
+            memory = _instances[path] = LongTermMemory(path, provider)
+        return memory
@@ -4,90 +4,522 @@ Handles conversation history and context management.
 """
 
 import json
+import logging
+import sqlite3
+import threading
+import weakref
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import Deque, List, Dict, Any, Optional, Tuple
 from ..config import settings
+from ..providers import BaseProvider, get_provider
+from ..storage import BaseStore, Interaction, get_store, safe_name
+from .context_builder import fit_interactions, interaction_tokens
+from .summarizer import ConversationSummarizer
+
+logger = logging.getLogger(__name__)
+
+# One background worker runs summary updates for every session in the process
+_summary_executor: Optional[ThreadPoolExecutor] = None
+_summary_executor_lock = threading.Lock()
+
+
+def _get_summary_executor() -> ThreadPoolExecutor:
+    global _summary_executor
+    with _summary_executor_lock:
+        if _summary_executor is None:
+            _summary_executor = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix="sam-summary"
+            )
+        return _summary_executor
+
+
+class _Session:
+    """State shared by every MemoryManager of one conversation in this process."""
+
+    __slots__ = (
+        "lock", "store", "history", "loaded",
+        "summary", "pending", "queued_to", "summary_lock", "update_lock", "summary_future",
+        "summary_loaded",
+        "__weakref__",
+    )
+
+    def __init__(self, store: BaseStore, max_history: int):
+        self.lock = threading.RLock()
+        self.store = store
+        # Copy-on-write: replaced, never mutated, once published
+        self.history: Deque[Interaction] = deque(maxlen=max_history)
+        self.loaded = False
+
+        # Running summary of the turns that have left the prompt window, the
+        # turns waiting to be folded into it and the newest turn handed over.
+        # `summary_lock` guards the state; `update_lock` lets one summary
+        # update run at a time, so no turn is folded in twice.
+        self.summary = ""
+        self.pending: List[Interaction] = []
+        self.queued_to: Optional[Interaction] = None
+        self.summary_lock = threading.Lock()
+        self.update_lock = threading.Lock()
+        self.summary_future: Optional[Future] = None
+        self.summary_loaded = False
+
+
+# Managers of the same conversation share its history, summary, lock and
+# store, so their writes are serialized, each older turn is summarized once
+# and a compaction never drops another manager's turns. Entries go away with
+# the last manager using them.
+_sessions: "weakref.WeakValueDictionary[Tuple, _Session]" = weakref.WeakValueDictionary()
+_sessions_lock = threading.Lock()
+
+
+def _get_session(user_id: str, session_id: str) -> _Session:
+    key = (
+        settings.memory_backend,
+        str(settings.memory_persistence_path),
+        str(settings.memory_sqlite_path),
+        user_id,
+        session_id,
+    )
+    with _sessions_lock:
+        session = _sessions.get(key)
+        if session is None:
+            session = _sessions[key] = _Session(
+                get_store(user_id=user_id, session_id=session_id), settings.max_chat_history
+            )
+        return session
+
 
 class MemoryManager:
-    """Manages conversation memory and context."""
+    """
+    Manages conversation memory and context.
+
+    Safe to share between threads. Managers of the same session in one
+    process share its history and summary. Writes are serialized by the
+    session's lock, and each write publishes a fresh copy of the history
+    instead of changing it in place, so `get_context` and other readers never
+    take the lock and never see a half-updated window.
+    """
     
-    def __init__(self):
-        self.conversation_history: List[Dict] = []
-        self.memory_file = settings.memory_persistence_path / "conversation_memory.json"
+    def __init__(
+        self,
+        user_id: str = "default",
+        session_id: str = "default",
+        store: Optional[BaseStore] = None,
+        embedding_provider: Optional[BaseProvider] = None,
+        summary_provider: Optional[BaseProvider] = None,
+    ):
+        """
+        Args:
+            user_id: Owner of the conversation.
+            session_id: Conversation identifier; each session has its own history.
+            store: Storage backend to use. Defaults to `settings.memory_backend`.
+            embedding_provider: Provider for long-term memory embeddings. Defaults
+                to `settings.embedding_provider`, then `settings.default_provider`.
+            summary_provider: Provider for rolling summaries. Defaults to
+                `settings.default_provider`.
+        """
+        self.user_id = user_id
+        self.session_id = session_id
         self._ensure_memory_directory()
+        if store is None:
+            self._session = _get_session(user_id, session_id)
+        else:
+            self._session = _Session(store, settings.max_chat_history)
+        self.store = self._session.store
+        self._lock = self._session.lock
         self._load_memory()
+        
+        # Semantic long-term memory is shared by all sessions of the same user
+        self.long_term = None
+        if settings.long_term_memory_enabled:
+            from .long_term_memory import get_long_term_memory
+            
+            provider = embedding_provider or get_provider(
+                settings.embedding_provider or settings.default_provider
+            )
+            self.long_term = get_long_term_memory(
+                settings.memory_persistence_path / "long_term" / safe_name(user_id),
+                provider,
+            )
+        
+        # First turn of the prompt's history window, kept fixed between turns,
+        # and the summary pinned with it; replaced together as one tuple
+        self._window: Tuple[Optional[Interaction], Optional[str]] = (None, None)
+        
+        self._summarizer = None
+        if settings.summarization_enabled:
+            self._summarizer = ConversationSummarizer(
+                summary_provider or get_provider(settings.default_provider)
+            )
+            self._load_summary()
+    
+    @property
+    def conversation_history(self) -> Deque[Interaction]:
+        """The session's recent window. Never changed in place; each write replaces it."""
+        return self._session.history
+    
+    @conversation_history.setter
+    def conversation_history(self, history: Deque[Interaction]):
+        self._session.history = history
+    
+    @property
+    def summary(self) -> str:
+        """Running summary of the session's turns that have left the recent window."""
+        return self._session.summary
+    
+    @summary.setter
+    def summary(self, summary: str):
+        self._session.summary = summary
     
     def _ensure_memory_directory(self):
         """Ensure the memory directory exists."""
         settings.memory_persistence_path.mkdir(parents=True, exist_ok=True)
     
     def _load_memory(self):
-        """Load conversation memory from file."""
+        """Load the most recent interactions of this session, once per session."""
+        session = self._session
         try:
-            if self.memory_file.exists():
-                with open(self.memory_file, 'r') as f:
-                    self.conversation_history = json.load(f)
-        except (json.JSONDecodeError, FileNotFoundError):
-            self.conversation_history = []
-    
-    def _save_memory(self):
-        """Save conversation memory to file."""
+            with self._lock:
+                if not session.loaded:
+                    session.history = deque(
+                        self.store.load_recent(settings.max_chat_history),
+                        maxlen=session.history.maxlen,
+                    )
+                    session.loaded = True
+        except (OSError, sqlite3.Error) as e:
+            print(f"Error loading memory: {e}")
+    
+    def _load_summary(self):
+        """Restore the running summary and any turns still waiting to be folded in."""
+        session = self._session
+        with session.summary_lock:
+            if session.summary_loaded:
+                return
+            try:
+                state = self.store.load_summary() or {}
+            except (OSError, sqlite3.Error) as e:
+                logger.warning(f"Error loading memory summary: {e}")
+                return
+            session.summary = state.get("summary", "")
+            session.pending = [Interaction.from_dict(r) for r in state.get("pending", [])]
+            if state.get("queued_to"):
+                session.queued_to = Interaction.from_dict(state["queued_to"])
+            elif session.pending:
+                session.queued_to = session.pending[-1]
+            session.summary_loaded = True
+    
+    def _save_summary(self):
+        """
+        Persist the summary state. Caller holds the session's `summary_lock`.
+        
+        Called when a batch is submitted or folded in, not for every queued
+        turn. After a crash, turns queued since are queued again from the
+        recent history, unless they have already dropped out of it.
+        """
+        session = self._session
         try:
-            with open(self.memory_file, 'w') as f:
-                json.dump(self.conversation_history, f, indent=2)
-        except IOError as e:
+            with self._lock:
+                self.store.save_summary({
+                    "summary": session.summary,
+                    "pending": [i.to_dict() for i in session.pending],
+                    "queued_to": session.queued_to.to_dict() if session.queued_to else None,
+                    "updated": datetime.now().isoformat(),
+                })
+        except (OSError, sqlite3.Error) as e:
+            logger.warning(f"Error saving memory summary: {e}")
+    
+    def _save_interaction(self, interaction: Interaction):
+        """Persist one interaction to the store. Caller holds `_lock`."""
+        try:
+            self.store.append(interaction)
+        except (OSError, sqlite3.Error) as e:
             print(f"Error saving memory: {e}")
     
     def add_interaction(self, user_message: str, ai_response: str):
         """Add a new interaction to memory."""
-        interaction = {
-            "timestamp": datetime.now().isoformat(),
-            "user": user_message,
-            "assistant": ai_response
-        }
+        interaction = Interaction(user_message, ai_response)
+        interaction_tokens(interaction)  # Cache the token estimate with the record
+        
+        with self._lock:
+            history = self.conversation_history
+            evicted = len(history) == history.maxlen
+            
+            # Publish a new window; readers holding the old one are unaffected.
+            # The deque's maxlen keeps only the most recent messages.
+            updated = deque(history, maxlen=history.maxlen)
+            updated.append(interaction)
+            self.conversation_history = updated
+            
+            self._save_interaction(interaction)
+        
+        # Outside the lock: both do their own locking, and summary updates
+        # take the session's summary_lock before _lock
+        if self.long_term is not None:
+            self.long_term.add(interaction)
+        
+        # A turn still in the prompt window when it drops out of the recent
+        # history leaves the prompt now
+        if evicted and self._summarizer is not None:
+            self._leave_window(list(history), 1)
+    
+    def _queued_count(self, history: List[Interaction]) -> int:
+        """How many of the oldest turns in `history` were already handed to the summarizer."""
+        queued_to = self._session.queued_to
+        if queued_to is None:
+            return 0
+        for i, interaction in enumerate(history):
+            if interaction is queued_to or interaction == queued_to:
+                return i + 1
+        # Not in `history`: older than all of it, or newer than a stale copy
+        return len(history) if history and queued_to.timestamp > history[-1].timestamp else 0
+    
+    def _leave_window(self, history: List[Interaction], start: int) -> Tuple[int, str]:
+        """
+        Queue the turns before `history[start]` for the summary, as they leave the prompt.
         
-        self.conversation_history.append(interaction)
+        Queued turns are held until a batch is ready, then summarized off the
+        request path.
         
-        # Keep only the most recent messages
-        if len(self.conversation_history) > settings.max_chat_history:
-            self.conversation_history = self.conversation_history[-settings.max_chat_history:]
+        Returns:
+            The index of the first turn the summary doesn't cover yet (at most
+            `start`), which the prompt should still include, and the summary.
+        """
+        if self._summarizer is None:
+            return start, self.summary
         
-        self._save_memory()
+        session = self._session
+        with session.summary_lock:
+            leaving = history[self._queued_count(history):start]
+            if leaving:
+                session.pending.extend(leaving)
+                session.queued_to = leaving[-1]
+                running = session.summary_future is not None and not session.summary_future.done()
+                # A running update leaves these for the next batch
+                if len(session.pending) >= settings.summarize_every and not running:
+                    self._save_summary()
+                    session.summary_future = _get_summary_executor().submit(self._update_summary)
+            keep = next(
+                (i for i, interaction in enumerate(history[:start]) if interaction in session.pending),
+                start,
+            )
+            return keep, session.summary
     
-    def get_context(self, current_message: str) -> List[Dict]:
+    def _update_summary(self):
+        """Fold the pending turns into the running summary. Runs on the summary worker."""
+        session = self._session
+        with session.update_lock:
+            with session.summary_lock:
+                batch = list(session.pending)
+                summary = session.summary
+            if not batch:
+                return
+            try:
+                summary = self._summarizer.summarize(summary, batch)
+            except Exception as e:
+                # Keep the turns pending so a later batch retries them
+                logger.warning(f"Conversation summarization failed: {e}")
+                return
+            
+            with session.summary_lock:
+                session.summary = summary
+                del session.pending[: len(batch)]
+                self._save_summary()
+    
+    def flush_summary(self):
+        """Summarize any pending turns now and wait until the summary is up to date."""
+        if self._summarizer is None:
+            return
+        future = self._session.summary_future
+        if future is not None:
+            future.result()
+        self._update_summary()
+    
+    @property
+    def prompt_summary(self) -> str:
+        """
+        The summary to put in the prompt.
+        
+        With token budgeting this is pinned when the history window is
+        re-anchored, so a background summary update does not change the prompt
+        prefix (and invalidate the model's prompt cache) on every turn.
+        """
+        prompt_summary = self._window[1]
+        if prompt_summary is None:
+            return self.summary
+        return prompt_summary
+    
+    def get_context(self, current_message: str, token_budget: Optional[int] = None) -> List[Dict]:
         """
         Get relevant context for the current message.
         
+        Without a budget this is the last 5 interactions. With `token_budget`,
+        the history window keeps a fixed starting turn for as long as it fits,
+        so consecutive prompts share a byte-identical prefix that Ollama can
+        reuse from its prompt cache. When it no longer fits, the start moves
+        forward so that only `settings.context_refill_ratio` of the budget is
+        used, leaving room for several more turns before it moves again.
+        
+        With summarization, turns leaving the window are queued for the
+        running summary, and turns it doesn't cover yet are kept in the window
+        (within the budget), so no turn drops out of both.
+        
+        When long-term memory is enabled, older interactions most semantically
+        similar to `current_message` are appended as a final system note
+        (within whatever budget remains), after the stable part of the prompt.
+        
         Args:
             current_message: The current user message
+            token_budget: Maximum estimated tokens of history to return
             
         Returns:
             List of message dictionaries for context
         """
-        # Simple implementation: return recent history
-        # This could be enhanced with semantic search later
+        if token_budget is None:
+            history = list(self.conversation_history)
+            start = max(0, len(history) - 5)  # Last 5 interactions
+            keep, _ = self._leave_window(history, start)
+            recent = history[keep:]  # With any older turns the summary doesn't cover yet
+            recalled = self._recall(current_message, recent)
+        else:
+            recent, used = self._stable_window(token_budget)
+            recalled = self._recall(current_message, recent)
+            recalled, _ = fit_interactions(reversed(recalled), token_budget - used)
+        
         context_messages = []
+        for interaction in recent:
+            context_messages.append({"role": "user", "content": interaction.user})
+            context_messages.append({"role": "assistant", "content": interaction.assistant})
         
-        for interaction in self.conversation_history[-5:]:  # Last 5 interactions
-            context_messages.append({"role": "user", "content": interaction["user"]})
-            context_messages.append({"role": "assistant", "content": interaction["assistant"]})
+        if recalled:
+            context_messages.append({
+                "role": "system",
+                "content": "Earlier exchanges that may be relevant:\n\n" + "\n\n".join(
+                    f"User: {i.user}\nSam: {i.assistant}" for i in recalled
+                ),
+            })
         
         return context_messages
     
+    def _stable_window(self, token_budget: int):
+        """Select history from the pinned start turn, re-anchoring when it overflows."""
+        history = list(self.conversation_history)
+        
+        # Turns older than what a re-anchored window keeps go to the summarizer
+        # now, so the summary usually has them by the time the anchor moves past
+        refill, refill_used = fit_interactions(
+            reversed(history), int(token_budget * settings.context_refill_ratio)
+        )
+        keep, summary = self._leave_window(history, len(history) - len(refill))
+        
+        anchor = self._window[0]
+        if anchor is None:
+            # First prompt of this manager: fill the budget
+            window, used = fit_interactions(reversed(history), token_budget)
+        else:
+            start = next(
+                (i for i, x in enumerate(history) if x is anchor or x == anchor), None
+            )
+            if start is not None:
+                window = history[start:]
+                used = sum(interaction_tokens(i) for i in window)
+                if used <= token_budget:
+                    return window, used
+            window, used = refill, refill_used
+        start = len(history) - len(window)
+        
+        # Turns the pinned summary doesn't cover yet stay in the prompt, budget permitting
+        unsummarized, extra = fit_interactions(reversed(history[keep:start]), token_budget - used)
+        window = unsummarized + window
+        self._window = (window[0] if window else None, summary)
+        return window, used + extra
+    
+    def _recall(self, current_message: str, recent: List[Interaction]) -> List[Interaction]:
+        """Relevant past interactions not already in `recent`, oldest first."""
+        if self.long_term is None:
+            return []
+        
+        try:
+            matches = self.long_term.search(current_message)
+        except Exception as e:
+            # Recall is best-effort; the recent window still gives usable context
+            logger.warning(f"Long-term memory search failed: {e}")
+            return []
+        
+        seen = {(i.timestamp, i.user) for i in recent}
+        recalled = [m for m in matches if (m.timestamp, m.user) not in seen]
+        return sorted(recalled, key=lambda i: i.timestamp)
+    
+    def reload(self):
+        """
+        Re-read the recent history from the store.
+        
+        For conversations that other processes also write to, such as API
+        server workers sharing one SQLite database.
+        """
+        try:
+            with self._lock:
+                records = self.store.load_recent(settings.max_chat_history)
+                self.conversation_history = deque(
+                    records, maxlen=self.conversation_history.maxlen
+                )
+        except (OSError, sqlite3.Error) as e:
+            logger.warning(f"Error reloading memory: {e}")
+    
+    def get_history(self, offset: int = 0, limit: int = 50) -> List[Interaction]:
+        """
+        Read a page of this session's stored history, newest first.
+        
+        Unlike `conversation_history`, this reaches past the in-memory window
+        for backends that keep the full history.
+        """
+        return self.store.page(offset, limit)
+    
     def clear(self):
         """Clear all conversation memory."""
-        self.conversation_history = []
-        try:
-            if self.memory_file.exists():
-                self.memory_file.unlink()
-        except OSError:
-            pass
+        session = self._session
+        if session.summary_future is not None:
+            session.summary_future.result()
+        with session.update_lock:
+            with session.summary_lock:
+                session.summary = ""
+                session.pending = []
+                session.queued_to = None
+            with self._lock:
+                session.history = deque(maxlen=session.history.maxlen)
+                self._window = (None, None)
+                self.store.clear()
     
-    def export_memory(self, file_path: Path):
-        """Export memory to a specified file."""
+    def export_memory(self, file_path: Path, batch_size: int = 500):
+        """
+        Export this session's stored history to a specified file.
+        
+        Records are streamed from the store in batches rather than loaded at
+        once. A `.jsonl` path gets one record per line, anything else a JSON array.
+        """
+        file_path = Path(file_path)
         try:
-            with open(file_path, 'w') as f:
-                json.dump(self.conversation_history, f, indent=2)
-        except IOError as e:
-            print(f"Error exporting memory: {e}")
\ No newline at end of file
+            with open(file_path, 'w', encoding='utf-8') as f:
+                if file_path.suffix == ".jsonl":
+                    for record in self.store.iter_records(batch_size):
+                        f.write(json.dumps(record.to_dict(), ensure_ascii=False) + "\n")
+                    return
+                f.write("[")
+                for i, record in enumerate(self.store.iter_records(batch_size)):
+                    f.write(",\n  " if i else "\n  ")
+                    f.write(json.dumps(record.to_dict(), ensure_ascii=False))
+                f.write("\n]\n")
+        except (IOError, sqlite3.Error) as e:
+            print(f"Error exporting memory: {e}")
+    
+    def close(self):
+        """Wait for a running summary update, save the summary state, then close the store."""
+        session = self._session
+        if session.summary_future is not None:
+            session.summary_future.result()
+        if self._summarizer is not None and session.summary_loaded:
+            with session.summary_lock:
+                self._save_summary()
+        with self._lock:
+            self.store.close()
\ No newline at end of file
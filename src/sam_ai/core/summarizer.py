@@ -0,0 +1,60 @@
+"""
+Rolling conversation summarization for Sam AI.
+
+Interactions that drop out of the recent window are folded into a running
+summary by the configured provider, so long sessions keep their gist while the
+prompt (and therefore prefill time on local models) stays roughly constant.
+"""
+
+from typing import Dict, List
+
+from ..config import settings
+from ..providers import BaseProvider
+
+SUMMARY_SYSTEM_PROMPT = (
+    "You maintain a running summary of a conversation between a user and Sam, "
+    "a supportive AI assistant. Merge the new turns into the current summary. "
+    "Keep facts, names, preferences, goals, open tasks and anything emotionally "
+    "significant the user shared; drop small talk. Write in the third person, "
+    "in at most {max_words} words. Reply with the updated summary only."
+)
+
+
+class ConversationSummarizer:
+    """Folds batches of interactions into a running summary using a provider."""
+
+    def __init__(self, provider: BaseProvider, model: str = None, max_words: int = None):
+        """
+        Args:
+            provider: Provider used to generate summaries.
+            model: Model to summarize with. Defaults to `settings.summary_model`,
+                then `settings.default_model`.
+            max_words: Length limit given to the model.
+                Defaults to `settings.summary_max_words`.
+        """
+        self.provider = provider
+        self.model = model or settings.summary_model or settings.default_model
+        self.max_words = max_words or settings.summary_max_words
+
+    def summarize(self, summary: str, interactions: List[Dict]) -> str:
+        """
+        Return `summary` updated with `interactions`.
+
+        Args:
+            summary: The current running summary (may be empty).
+            interactions: Interactions to fold in, oldest first.
+        """
+        turns = "\n".join(
+            f"User: {i['user']}\nSam: {i['assistant']}" for i in interactions
+        )
+        messages = [
+            {
+                "role": "system",
+                "content": SUMMARY_SYSTEM_PROMPT.format(max_words=self.max_words),
+            },
+            {
+                "role": "user",
+                "content": f"Current summary:\n{summary or '(none)'}\n\nNew turns:\n{turns}",
+            },
+        ]
+        return self.provider.chat_completion(messages, self.model).strip()
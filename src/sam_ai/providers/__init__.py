@@ -1,22 +1,73 @@
 """
 AI Provider abstractions for Sam AI.
+
+Provider modules pull in heavy client libraries (`openai`, `requests`,
+`httpx`), so they are imported on first use rather than with this package.
 """
 
-from .base_provider import BaseProvider
-from .ollama_provider import OllamaProvider
-from .openai_provider import OpenAIProvider
+import importlib
+
+from .base_provider import BaseProvider, ProviderBusy, ToolCallingNotSupported
+from ..config import settings
+
+# Public names imported from their submodule on first access
+_LAZY_ATTRIBUTES = {
+    'OllamaProvider': 'ollama_provider',
+    'OpenAIProvider': 'openai_provider',
+    'CachedProvider': 'cached_provider',
+    'ResponseCache': 'cached_provider',
+    'get_response_cache': 'cached_provider',
+    'Backend': 'router_provider',
+    'RouterProvider': 'router_provider',
+    'get_router': 'router_provider',
+    'ModelCatalog': 'catalog',
+    'get_catalog': 'catalog',
+    'Scheduler': 'scheduler',
+    'SchedulingProvider': 'scheduler',
+    'get_scheduler': 'scheduler',
+    'request_scope': 'scheduler',
+}
 
-__all__ = ['BaseProvider', 'OllamaProvider', 'OpenAIProvider']
+
+def __getattr__(name):
+    if name in _LAZY_ATTRIBUTES:
+        module = importlib.import_module(f"{__name__}.{_LAZY_ATTRIBUTES[name]}")
+        return getattr(module, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+__all__ = [
+    'BaseProvider',
+    'ToolCallingNotSupported',
+    'ProviderBusy',
+    'OllamaProvider',
+    'OpenAIProvider',
+    'CachedProvider',
+    'ResponseCache',
+    'get_response_cache',
+    'Backend',
+    'RouterProvider',
+    'get_router',
+    'ModelCatalog',
+    'get_catalog',
+    'Scheduler',
+    'SchedulingProvider',
+    'get_scheduler',
+    'request_scope',
+]
 
 def get_provider(provider_name: str) -> BaseProvider:
     """
     Factory function to get the appropriate provider.
     
     Args:
-        provider_name: Name of the provider ('ollama' or 'openai')
+        provider_name: Name of the provider ('ollama', 'openai', or 'router'
+            for the process-wide router over `settings.router_backends`)
         
     Returns:
-        An instance of the requested provider
+        An instance of the requested provider. Ollama backends are limited to
+        `settings.scheduler_max_concurrency` generations at once by a
+        SchedulingProvider, and the result is wrapped in a CachedProvider
+        when `settings.response_cache_enabled` is set
         
     Raises:
         ValueError: If the provider name is not recognized
@@ -24,8 +75,19 @@ def get_provider(provider_name: str) -> BaseProvider:
     provider_name = provider_name.lower()
     
     if provider_name == 'ollama':
-        return OllamaProvider()
+        from .ollama_provider import OllamaProvider
+        from .scheduler import scheduled
+        provider = scheduled(OllamaProvider(), settings.scheduler_max_concurrency)
     elif provider_name == 'openai':
-        return OpenAIProvider()
+        from .openai_provider import OpenAIProvider
+        provider = OpenAIProvider()
+    elif provider_name == 'router':
+        from .router_provider import get_router
+        provider = get_router()  # Shared by the process; schedules each backend itself
     else:
-        raise ValueError(f"Unknown provider: {provider_name}")
\ No newline at end of file
+        raise ValueError(f"Unknown provider: {provider_name}")
+
+    if settings.response_cache_enabled:
+        from .cached_provider import CachedProvider
+        return CachedProvider(provider)
+    return provider
\ No newline at end of file
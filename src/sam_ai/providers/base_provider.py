@@ -2,8 +2,17 @@
 Abstract base class for all AI providers.
 """
 
+import asyncio
 from abc import ABC, abstractmethod
-from typing import List, Dict, Any
+from typing import Any, AsyncIterator, Dict, Iterator, List
+
+class ToolCallingNotSupported(Exception):
+    """Raised when a provider or model cannot use native function calling."""
+
+
+class ProviderBusy(Exception):
+    """Raised when a request is turned away because its backend is saturated."""
+
 
 class BaseProvider(ABC):
     """Abstract base class for all AI providers."""
@@ -23,6 +32,85 @@ class BaseProvider(ABC):
         """
         pass
 
+    def chat_completion_stream(
+        self, messages: List[Dict[str, str]], model: str, **kwargs
+    ) -> Iterator[str]:
+        """
+        Send a list of messages to the provider and yield the response incrementally.
+
+        Providers that support token streaming should override this. The default
+        implementation yields the full response from `chat_completion` as a
+        single chunk, so every provider can be used by streaming callers.
+
+        Args:
+            messages: List of dicts with 'role' and 'content'.
+            model: The model identifier to use.
+            **kwargs: Additional provider-specific arguments.
+
+        Yields:
+            Text deltas, in order. Joining them gives the full response.
+        """
+        yield self.chat_completion(messages, model, **kwargs)
+
+    def chat_with_tools(
+        self,
+        messages: List[Dict[str, Any]],
+        model: str,
+        tools: List[Dict[str, Any]],
+        **kwargs
+    ) -> Dict[str, Any]:
+        """
+        Send messages together with tool definitions, using native function calling.
+
+        Args:
+            messages: Conversation so far, including earlier tool results.
+            model: The model identifier to use.
+            tools: Tool definitions in OpenAI function-calling format.
+            **kwargs: Additional provider-specific arguments.
+
+        Returns:
+            A dict with "content" (the text reply), "tool_calls" (a list of
+            {"id", "name", "arguments"} dicts, empty for a final answer) and
+            "message" (the assistant message to append to `messages` before
+            the tool results).
+
+        Raises:
+            ToolCallingNotSupported: If the provider or model has no tool support.
+        """
+        raise ToolCallingNotSupported(f"{type(self).__name__} does not support tools")
+
+    def tool_result_message(self, tool_call: Dict[str, Any], content: str) -> Dict[str, Any]:
+        """Build the message that returns a tool's result to the model."""
+        return {"role": "tool", "tool_call_id": tool_call["id"], "content": content}
+
+    def embed(self, texts: List[str], model: str) -> List[List[float]]:
+        """
+        Compute embedding vectors for a batch of texts.
+
+        Args:
+            texts: The texts to embed.
+            model: The embedding model identifier to use.
+
+        Returns:
+            One vector per input text, in order.
+
+        Raises:
+            NotImplementedError: If the provider does not support embeddings.
+        """
+        raise NotImplementedError(f"{type(self).__name__} does not support embeddings")
+
+    def warm_up(self, model: str) -> None:
+        """
+        Load `model` ahead of the first request, for providers where that matters.
+
+        The default does nothing; remote APIs have no cold start to avoid.
+        """
+        pass
+
+    def needs_warm_up(self, model: str) -> bool:
+        """Whether `warm_up(model)` would still do anything in this process."""
+        return False
+
     @abstractmethod
     def list_models(self) -> List[str]:
         """Return a list of available model names for this provider."""
@@ -31,4 +119,36 @@ class BaseProvider(ABC):
     @abstractmethod
     def is_available(self) -> bool:
         """Check if the provider is available and configured properly."""
-        pass
\ No newline at end of file
+        pass
+
+    def running_models(self) -> List[Dict[str, Any]]:
+        """
+        Models currently loaded in memory, as dicts with at least a "name".
+
+        The default is empty, for providers that don't report it.
+        """
+        return []
+
+    # --- Async API ---
+    # The defaults run the blocking methods in a worker thread so every provider
+    # can be awaited. Providers with a native async client should override them.
+
+    async def achat_completion(
+        self, messages: List[Dict[str, str]], model: str, **kwargs
+    ) -> str:
+        """Async counterpart of `chat_completion`."""
+        return await asyncio.to_thread(self.chat_completion, messages, model, **kwargs)
+
+    async def achat_completion_stream(
+        self, messages: List[Dict[str, str]], model: str, **kwargs
+    ) -> AsyncIterator[str]:
+        """Async counterpart of `chat_completion_stream`."""
+        yield await self.achat_completion(messages, model, **kwargs)
+
+    async def alist_models(self) -> List[str]:
+        """Async counterpart of `list_models`."""
+        return await asyncio.to_thread(self.list_models)
+
+    async def ais_available(self) -> bool:
+        """Async counterpart of `is_available`."""
+        return await asyncio.to_thread(self.is_available)
@@ -0,0 +1,324 @@
+"""
+Response cache for AI providers.
+
+Wraps any provider so that identical requests (same provider, model, messages
+and options) are answered from a cache instead of regenerating. The cache has
+an in-memory LRU tier and an optional SQLite tier on disk that survives
+restarts. Cached replies are returned verbatim, so only enable it where
+repeating an earlier answer is acceptable (evaluations, retries, tests).
+The async methods read and write the disk tier in a worker thread, so a
+cache lookup never blocks the event loop.
+"""
+
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+from .base_provider import BaseProvider
+from ..config import settings
+
+
+class ResponseCache:
+    """Two-tier (memory LRU + optional SQLite) cache with TTL and size eviction."""
+
+    def __init__(
+        self,
+        max_entries: int = 256,
+        ttl: float = 3600.0,
+        disk_path: Optional[Path] = None,
+        disk_max_entries: int = 10000,
+    ):
+        """
+        Args:
+            max_entries: Maximum responses kept in memory.
+            ttl: Seconds a response stays valid; 0 disables expiry.
+            disk_path: SQLite file for the on-disk tier, or None for memory only.
+            disk_max_entries: Maximum responses kept on disk.
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.disk_path = disk_path
+        self.disk_max_entries = disk_max_entries
+
+        self._memory: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()  # Memory tier and counters; never held during I/O
+        self._disk_lock = threading.Lock()
+        self._disk: Optional[sqlite3.Connection] = None
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+
+        if disk_path is not None:
+            Path(disk_path).parent.mkdir(parents=True, exist_ok=True)
+            self._disk = sqlite3.connect(str(disk_path), check_same_thread=False)
+            self._disk.execute("PRAGMA journal_mode=WAL")
+            self._disk.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, response TEXT NOT NULL, created REAL NOT NULL)"
+            )
+            self._disk.execute(
+                "CREATE INDEX IF NOT EXISTS idx_responses_created ON responses (created)"
+            )
+            self._disk.commit()
+
+    @staticmethod
+    def make_key(provider: str, model: str, messages: List[Dict], options: Dict) -> str:
+        """Stable hash of everything that determines a response."""
+        payload = json.dumps(
+            {"provider": provider, "model": model, "messages": messages, "options": options},
+            sort_keys=True,
+            ensure_ascii=False,
+            default=str,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _expired(self, created: float) -> bool:
+        return self.ttl > 0 and time.time() - created > self.ttl
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached response for `key`, or None on a miss."""
+        response = self._get_memory(key)
+        if response is not None:
+            return response
+        return self._get_disk(key)
+
+    async def aget(self, key: str) -> Optional[str]:
+        """Async counterpart of `get`; a disk lookup runs in a worker thread."""
+        response = self._get_memory(key)
+        if response is not None or self._disk is None:
+            return response if response is not None else self._get_disk(key)
+        return await asyncio.to_thread(self._get_disk, key)
+
+    def _get_memory(self, key: str) -> Optional[str]:
+        """Look `key` up in the memory tier, counting a hit."""
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if not self._expired(entry[1]):
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    return entry[0]
+                del self._memory[key]
+        return None
+
+    def _get_disk(self, key: str) -> Optional[str]:
+        """Look `key` up on disk after a memory miss, counting the hit or miss."""
+        row = None
+        if self._disk is not None:
+            with self._disk_lock:
+                row = self._disk.execute(
+                    "SELECT response, created FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+
+        with self._lock:
+            if row is not None and not self._expired(row[1]):
+                self._remember(key, row[0], row[1])
+                self.hits += 1
+                self.disk_hits += 1
+                return row[0]
+            self.misses += 1
+            return None
+
+    def put(self, key: str, response: str) -> None:
+        """Store a response in every tier."""
+        created = time.time()
+        with self._lock:
+            self._remember(key, response, created)
+        if self._disk is not None:
+            self._put_disk(key, response, created)
+
+    async def aput(self, key: str, response: str) -> None:
+        """Async counterpart of `put`; the disk write runs in a worker thread."""
+        created = time.time()
+        with self._lock:
+            self._remember(key, response, created)
+        if self._disk is not None:
+            await asyncio.to_thread(self._put_disk, key, response, created)
+
+    def _put_disk(self, key: str, response: str, created: float) -> None:
+        with self._disk_lock:
+            with self._disk:
+                self._disk.execute(
+                    "INSERT OR REPLACE INTO responses (key, response, created) "
+                    "VALUES (?, ?, ?)",
+                    (key, response, created),
+                )
+                self._evict_disk()
+
+    def _remember(self, key: str, response: str, created: float) -> None:
+        """Insert into the memory tier, evicting least recently used entries."""
+        self._memory[key] = (response, created)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _evict_disk(self) -> None:
+        """Drop expired entries, then the oldest ones beyond `disk_max_entries`."""
+        if self.ttl > 0:
+            self._disk.execute(
+                "DELETE FROM responses WHERE created < ?", (time.time() - self.ttl,)
+            )
+        self._disk.execute(
+            "DELETE FROM responses WHERE key IN (SELECT key FROM responses "
+            "ORDER BY created DESC LIMIT -1 OFFSET ?)",
+            (self.disk_max_entries,),
+        )
+
+    def clear(self) -> None:
+        """Remove every cached response and reset the counters."""
+        with self._lock:
+            self._memory.clear()
+            self.hits = self.misses = self.disk_hits = 0
+        if self._disk is not None:
+            with self._disk_lock, self._disk:
+                self._disk.execute("DELETE FROM responses")
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and current size of the memory tier."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "disk_hits": self.disk_hits,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "memory_entries": len(self._memory),
+            }
+
+
+_response_cache: Optional[ResponseCache] = None
+_response_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> ResponseCache:
+    """Return the process-wide response cache configured from settings."""
+    global _response_cache
+    with _response_cache_lock:
+        if _response_cache is None:
+            _response_cache = ResponseCache(
+                max_entries=settings.response_cache_max_entries,
+                ttl=settings.response_cache_ttl,
+                disk_path=(
+                    settings.memory_persistence_path / "response_cache.db"
+                    if settings.response_cache_disk
+                    else None
+                ),
+                disk_max_entries=settings.response_cache_disk_max_entries,
+            )
+        return _response_cache
+
+
+class CachedProvider(BaseProvider):
+    """Provider wrapper that answers repeated identical requests from a cache."""
+
+    def __init__(self, provider: BaseProvider, cache: ResponseCache = None):
+        self.provider = provider
+        self.cache = cache or get_response_cache()
+
+    def __getattr__(self, name):
+        # Anything not wrapped (e.g. update_api_key) goes to the real provider
+        if name == "provider":
+            raise AttributeError(name)
+        return getattr(self.provider, name)
+
+    def _key(self, messages: List[Dict[str, str]], model: str, kwargs: Dict) -> str:
+        provider_id = "{}:{}".format(
+            type(self.provider).__name__, getattr(self.provider, "base_url", "")
+        )
+        return self.cache.make_key(provider_id, model, messages, kwargs)
+
+    def chat_completion(self, messages: List[Dict[str, str]], model: str, **kwargs) -> str:
+        key = self._key(messages, model, kwargs)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+
+        response = self.provider.chat_completion(messages, model, **kwargs)
+        self.cache.put(key, response)
+        return response
+
+    def chat_completion_stream(
+        self, messages: List[Dict[str, str]], model: str, **kwargs
+    ) -> Iterator[str]:
+        key = self._key(messages, model, kwargs)
+        cached = self.cache.get(key)
+        if cached is not None:
+            yield cached
+            return
+
+        chunks = []
+        for chunk in self.provider.chat_completion_stream(messages, model, **kwargs):
+            chunks.append(chunk)
+            yield chunk
+        # Only complete streams are cached
+        self.cache.put(key, "".join(chunks))
+
+    async def achat_completion(
+        self, messages: List[Dict[str, str]], model: str, **kwargs
+    ) -> str:
+        key = self._key(messages, model, kwargs)
+        cached = await self.cache.aget(key)
+        if cached is not None:
+            return cached
+
+        response = await self.provider.achat_completion(messages, model, **kwargs)
+        await self.cache.aput(key, response)
+        return response
+
+    async def achat_completion_stream(
+        self, messages: List[Dict[str, str]], model: str, **kwargs
+    ) -> AsyncIterator[str]:
+        key = self._key(messages, model, kwargs)
+        cached = await self.cache.aget(key)
+        if cached is not None:
+            yield cached
+            return
+
+        chunks = []
+        async for chunk in self.provider.achat_completion_stream(messages, model, **kwargs):
+            chunks.append(chunk)
+            yield chunk
+        await self.cache.aput(key, "".join(chunks))
+
+    def embed(self, texts: List[str], model: str) -> List[List[float]]:
+        return self.provider.embed(texts, model)
+
+    def chat_with_tools(
+        self,
+        messages: List[Dict[str, Any]],
+        model: str,
+        tools: List[Dict[str, Any]],
+        **kwargs
+    ) -> Dict[str, Any]:
+        # Tool calls have side effects and depend on live results; never cached
+        return self.provider.chat_with_tools(messages, model, tools, **kwargs)
+
+    def tool_result_message(self, tool_call: Dict[str, Any], content: str) -> Dict[str, Any]:
+        return self.provider.tool_result_message(tool_call, content)
+
+    def warm_up(self, model: str) -> None:
+        self.provider.warm_up(model)
+
+    def needs_warm_up(self, model: str) -> bool:
+        return self.provider.needs_warm_up(model)
+
+    def list_models(self) -> List[str]:
+        return self.provider.list_models()
+
+    def is_available(self) -> bool:
+        return self.provider.is_available()
+
+    def running_models(self) -> List[Dict[str, Any]]:
+        return self.provider.running_models()
+
+    async def alist_models(self) -> List[str]:
+        return await self.provider.alist_models()
+
+    async def ais_available(self) -> bool:
+        return await self.provider.ais_available()
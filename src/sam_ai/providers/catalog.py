@@ -0,0 +1,148 @@
+"""
+Model catalog for Sam AI's providers.
+
+Asking a provider whether it is up and which models it has costs a network
+round trip (for Ollama, `/api/tags` and `/api/ps`). A `ModelCatalog` keeps
+the answers in memory and refreshes them from a background thread, so the
+UI and API can show live, current models without waiting on the provider.
+"""
+
+import logging
+import threading
+import time
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from ..config import settings
+from .base_provider import BaseProvider
+
+logger = logging.getLogger(__name__)
+
+
+class CatalogState(NamedTuple):
+    """One consistent view of a provider, replaced as a whole on every refresh."""
+
+    available: bool
+    models: Tuple[str, ...]
+    loaded: Tuple[Dict[str, Any], ...]  # Models in memory now (Ollama's /api/ps)
+    updated: float  # time.time() of the refresh; 0 if never refreshed
+    error: Optional[str] = None
+
+
+_EMPTY = CatalogState(available=False, models=(), loaded=(), updated=0.0)
+
+
+class ModelCatalog:
+    """
+    Cached health and model lists of a provider.
+
+    Reads never block on the network once the catalog has been filled: a
+    listing older than `ttl` is still returned, and a refresh is started in
+    the background. `start()` additionally polls every `poll_interval`.
+    """
+
+    def __init__(
+        self,
+        provider: BaseProvider,
+        ttl: Optional[float] = None,
+        poll_interval: Optional[float] = None,
+    ):
+        """
+        Args:
+            provider: The provider to describe.
+            ttl: Seconds a listing counts as fresh. Defaults to `settings.model_catalog_ttl`.
+            poll_interval: Seconds between background refreshes once started.
+                Defaults to `settings.model_catalog_poll_interval`.
+        """
+        self.provider = provider
+        self.ttl = settings.model_catalog_ttl if ttl is None else ttl
+        self.poll_interval = (
+            settings.model_catalog_poll_interval if poll_interval is None else poll_interval
+        )
+        self._state = _EMPTY
+        self._refresh_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._poller: Optional[threading.Thread] = None
+
+    @property
+    def state(self) -> CatalogState:
+        """
+        The latest listing. Only the very first read waits for the provider;
+        later stale reads trigger a background refresh and return at once.
+        """
+        state = self._state
+        if state.updated == 0.0:
+            return self.refresh()
+        if time.time() - state.updated > self.ttl:
+            self._refresh_in_background()
+        return state
+
+    def models(self) -> List[str]:
+        return list(self.state.models)
+
+    def loaded_models(self) -> List[Dict[str, Any]]:
+        return list(self.state.loaded)
+
+    def is_available(self) -> bool:
+        return self.state.available
+
+    def refresh(self) -> CatalogState:
+        """Query the provider now and publish the result."""
+        with self._refresh_lock:
+            try:
+                available = self.provider.is_available()
+                models = tuple(self.provider.list_models()) if available else ()
+                loaded = tuple(self.provider.running_models()) if available else ()
+                state = CatalogState(available, models, loaded, time.time())
+            except Exception as e:
+                logger.warning(f"Could not refresh the model catalog: {e}")
+                state = CatalogState(False, (), (), time.time(), error=str(e))
+            if not state.available:
+                # Keep the last known models so a brief outage doesn't empty the UI
+                state = state._replace(models=self._state.models)
+            self._state = state
+            return state
+
+    def _refresh_in_background(self) -> None:
+        if self._refresh_lock.locked():
+            return  # A refresh is already running
+        threading.Thread(target=self.refresh, name="sam-catalog-refresh", daemon=True).start()
+
+    def start(self) -> "ModelCatalog":
+        """Refresh every `poll_interval` seconds from a daemon thread."""
+        if self._poller is None or not self._poller.is_alive():
+            self._stop.clear()
+            self._poller = threading.Thread(target=self._poll, name="sam-catalog", daemon=True)
+            self._poller.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._poller is not None:
+            self._poller.join(timeout=5)
+            self._poller = None
+
+    def _poll(self) -> None:
+        # The first read fills the catalog, so the poller only keeps it current
+        while not self._stop.wait(self.poll_interval):
+            self.refresh()
+
+
+_catalogs: Dict[str, ModelCatalog] = {}
+_catalogs_lock = threading.Lock()
+
+
+def get_catalog(provider_name: Optional[str] = None) -> ModelCatalog:
+    """
+    The process-wide, polling catalog of a provider.
+
+    Args:
+        provider_name: 'ollama', 'openai' or 'router'. Defaults to `settings.default_provider`.
+    """
+    provider_name = (provider_name or settings.default_provider).lower()
+    with _catalogs_lock:
+        catalog = _catalogs.get(provider_name)
+        if catalog is None:
+            from . import get_provider
+
+            catalog = _catalogs[provider_name] = ModelCatalog(get_provider(provider_name)).start()
+        return catalog
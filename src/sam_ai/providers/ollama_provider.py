@@ -2,29 +2,173 @@
 Ollama provider implementation for local AI models.
 """
 
+import asyncio
+import json
+import threading
+import weakref
+import httpx
 import requests
-from typing import List, Dict, Any
-from .base_provider import BaseProvider
+from requests.adapters import HTTPAdapter
+from typing import List, Dict, Any, AsyncIterator, Iterator
+from .base_provider import BaseProvider, ToolCallingNotSupported
 from ..config import settings
 
+# Pooled HTTP sessions, one per Ollama base URL, shared by all provider instances
+_sessions: Dict[str, requests.Session] = {}
+_sessions_lock = threading.Lock()
+
+
+def get_session(base_url: str) -> requests.Session:
+    """
+    Return the shared HTTP session for an Ollama host, creating it on first use.
+
+    Sessions keep a pool of up to `settings.ollama_pool_size` connections so
+    repeated chat, probe and model-listing calls reuse open TCP connections
+    instead of paying a new handshake each time.
+    """
+    key = base_url.rstrip("/")
+    with _sessions_lock:
+        session = _sessions.get(key)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(
+                pool_connections=1,
+                pool_maxsize=settings.ollama_pool_size,
+            )
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            if not settings.ollama_http_keep_alive:
+                session.headers["Connection"] = "close"
+            _sessions[key] = session
+        return session
+
+
+def close_sessions() -> None:
+    """Close all pooled Ollama sessions (e.g. at shutdown or after a config change)."""
+    with _sessions_lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
+
+
+# Async clients are bound to the event loop they were created on, so the pool
+# is kept per loop and per base URL. Entries go away with their loop.
+_async_clients: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+
+
+def get_async_client(base_url: str) -> httpx.AsyncClient:
+    """
+    Return the shared async HTTP client for an Ollama host on the running loop.
+
+    Uses the same pool size, keep-alive and timeout settings as `get_session`.
+    """
+    key = base_url.rstrip("/")
+    clients = _async_clients.setdefault(asyncio.get_running_loop(), {})
+    client = clients.get(key)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            timeout=httpx.Timeout(
+                settings.ollama_read_timeout, connect=settings.ollama_connect_timeout
+            ),
+            limits=httpx.Limits(
+                max_connections=settings.ollama_pool_size,
+                max_keepalive_connections=(
+                    settings.ollama_pool_size if settings.ollama_http_keep_alive else 0
+                ),
+            ),
+        )
+        clients[key] = client
+    return client
+
+
+async def aclose_async_clients() -> None:
+    """Close the async Ollama clients belonging to the running event loop."""
+    clients = _async_clients.pop(asyncio.get_running_loop(), {})
+    for client in clients.values():
+        await client.aclose()
+
+# (base_url, model) pairs already preloaded by warm_up in this process
+_warmed_up = set()
+_warmed_up_lock = threading.Lock()
+
+
+def _parse_keep_alive(value):
+    """Pass bare numbers (e.g. "-1", "300") as seconds; Ollama reads strings as durations."""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return value
+
+
 class OllamaProvider(BaseProvider):
     """Provider for local Ollama models."""
 
     def __init__(self, base_url: str = None):
-        self.base_url = base_url or settings.ollama_base_url
-        self.timeout = settings.ollama_request_timeout
+        self.base_url = (base_url or settings.ollama_base_url).rstrip("/")
+        self.connect_timeout = settings.ollama_connect_timeout
+        # (connect, read) timeout tuple as understood by requests
+        self.timeout = (self.connect_timeout, settings.ollama_read_timeout)
+        self.session = get_session(self.base_url)
+
+    def _chat_payload(
+        self, messages: List[Dict[str, str]], model: str, stream: bool, **kwargs
+    ) -> Dict[str, Any]:
+        """
+        Build the request body for Ollama's /api/chat endpoint.
+
+        Model options start from `settings.ollama_options` and `ollama_num_ctx`,
+        overridden per call by `options`. Keeping them identical between calls
+        matters: Ollama reloads the model when num_ctx changes.
+        """
+        options = dict(settings.ollama_options)
+        if settings.ollama_num_ctx:
+            options["num_ctx"] = settings.ollama_num_ctx
+        options.update(kwargs.get("options") or {})
 
-    def chat_completion(self, messages: List[Dict[str, str]], model: str, **kwargs) -> str:
-        url = f"{self.base_url}/api/chat"
         payload = {
             "model": model,
             "messages": messages,
-            "stream": False,
-            "options": kwargs.get("options", {})
+            "stream": stream,
+            "options": options
         }
+        keep_alive = kwargs.get("keep_alive", settings.ollama_keep_alive)
+        if keep_alive is not None:
+            payload["keep_alive"] = _parse_keep_alive(keep_alive)
+        return payload
+
+    def warm_up(self, model: str) -> None:
+        """
+        Load `model` into memory with an empty chat request (once per process).
+
+        Uses the same options and keep_alive as real requests, so the loaded
+        instance is the one later requests are served by.
+        """
+        key = (self.base_url, model)
+        with _warmed_up_lock:
+            if key in _warmed_up:
+                return
+            _warmed_up.add(key)
 
+        url = f"{self.base_url}/api/chat"
+        payload = self._chat_payload([], model, stream=False)
         try:
-            response = requests.post(url, json=payload, timeout=self.timeout)
+            response = self.session.post(url, json=payload, timeout=self.timeout)
+            response.raise_for_status()
+        except requests.exceptions.RequestException as e:
+            with _warmed_up_lock:
+                _warmed_up.discard(key)  # Retry on the next warm-up
+            raise ConnectionError(f"Could not warm up {model} on Ollama: {e}")
+
+    def needs_warm_up(self, model: str) -> bool:
+        with _warmed_up_lock:
+            return (self.base_url, model) not in _warmed_up
+
+    def chat_completion(self, messages: List[Dict[str, str]], model: str, **kwargs) -> str:
+        url = f"{self.base_url}/api/chat"
+        payload = self._chat_payload(messages, model, stream=False, **kwargs)
+
+        try:
+            response = self.session.post(url, json=payload, timeout=self.timeout)
             response.raise_for_status()
             return response.json()["message"]["content"]
         except requests.exceptions.ConnectionError:
@@ -32,19 +176,203 @@ class OllamaProvider(BaseProvider):
         except requests.exceptions.RequestException as e:
             raise Exception(f"Ollama API request failed: {e}")
 
+    def chat_with_tools(
+        self,
+        messages: List[Dict[str, Any]],
+        model: str,
+        tools: List[Dict[str, Any]],
+        **kwargs
+    ) -> Dict[str, Any]:
+        url = f"{self.base_url}/api/chat"
+        payload = self._chat_payload(messages, model, stream=False, **kwargs)
+        payload["tools"] = tools
+
+        try:
+            response = self.session.post(url, json=payload, timeout=self.timeout)
+            if response.status_code == 400 and "does not support tools" in response.text:
+                raise ToolCallingNotSupported(f"{model} does not support tools in Ollama")
+            response.raise_for_status()
+            message = response.json()["message"]
+        except requests.exceptions.ConnectionError:
+            raise ConnectionError("Could not connect to Ollama. Is it running?")
+        except requests.exceptions.RequestException as e:
+            raise Exception(f"Ollama API request failed: {e}")
+
+        # Ollama does not id its tool calls; results are matched by position and name
+        tool_calls = [
+            {
+                "id": f"call_{i}",
+                "name": call["function"]["name"],
+                "arguments": call["function"].get("arguments") or {},
+            }
+            for i, call in enumerate(message.get("tool_calls") or [])
+        ]
+        return {
+            "content": message.get("content", ""),
+            "tool_calls": tool_calls,
+            "message": message,
+        }
+
+    def tool_result_message(self, tool_call: Dict[str, Any], content: str) -> Dict[str, Any]:
+        return {"role": "tool", "tool_name": tool_call["name"], "content": content}
+
+    def chat_completion_stream(
+        self, messages: List[Dict[str, str]], model: str, **kwargs
+    ) -> Iterator[str]:
+        url = f"{self.base_url}/api/chat"
+        payload = self._chat_payload(messages, model, stream=True, **kwargs)
+
+        try:
+            with self.session.post(
+                url, json=payload, timeout=self.timeout, stream=True
+            ) as response:
+                response.raise_for_status()
+                # Ollama streams newline-delimited JSON objects, one per chunk
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    content, done = self._parse_stream_line(line)
+                    if content:
+                        yield content
+                    if done:
+                        break
+        except requests.exceptions.ConnectionError:
+            raise ConnectionError("Could not connect to Ollama. Is it running?")
+        except requests.exceptions.RequestException as e:
+            raise Exception(f"Ollama API request failed: {e}")
+
+    @staticmethod
+    def _parse_stream_line(line) -> tuple:
+        """Parse one NDJSON line of a streamed chat response into (content, done)."""
+        chunk = json.loads(line)
+        if "error" in chunk:
+            raise Exception(f"Ollama API request failed: {chunk['error']}")
+        return chunk.get("message", {}).get("content", ""), chunk.get("done", False)
+
+    def embed(self, texts: List[str], model: str) -> List[List[float]]:
+        try:
+            response = self.session.post(
+                f"{self.base_url}/api/embed",
+                json={"model": model, "input": texts},
+                timeout=self.timeout,
+            )
+            if response.status_code == 404:
+                # Ollama before 0.3 only has the single-prompt endpoint
+                return [self._embed_one(text, model) for text in texts]
+            response.raise_for_status()
+            return response.json()["embeddings"]
+        except requests.exceptions.ConnectionError:
+            raise ConnectionError("Could not connect to Ollama. Is it running?")
+        except requests.exceptions.RequestException as e:
+            raise Exception(f"Ollama API request failed: {e}")
+
+    def _embed_one(self, text: str, model: str) -> List[float]:
+        response = self.session.post(
+            f"{self.base_url}/api/embeddings",
+            json={"model": model, "prompt": text},
+            timeout=self.timeout,
+        )
+        response.raise_for_status()
+        return response.json()["embedding"]
+
     def list_models(self) -> List[str]:
         try:
-            response = requests.get(f"{self.base_url}/api/tags", timeout=10)
+            response = self.session.get(
+                f"{self.base_url}/api/tags", timeout=(self.connect_timeout, 10)
+            )
             response.raise_for_status()
             models_data = response.json().get("models", [])
             return [model["name"] for model in models_data]
         except requests.exceptions.RequestException:
             return []  # Return empty list if Ollama isn't running
 
+    def running_models(self) -> List[Dict[str, Any]]:
+        """Models Ollama has loaded, with their VRAM use and unload time (`/api/ps`)."""
+        try:
+            response = self.session.get(
+                f"{self.base_url}/api/ps", timeout=(self.connect_timeout, 5)
+            )
+            response.raise_for_status()
+        except requests.exceptions.RequestException:
+            return []
+        return [
+            {
+                "name": model["name"],
+                "size_vram": model.get("size_vram"),
+                "expires_at": model.get("expires_at"),
+            }
+            for model in response.json().get("models", [])
+        ]
+
     def is_available(self) -> bool:
         """Check if Ollama is running and accessible."""
         try:
-            response = requests.get(f"{self.base_url}/api/tags", timeout=5)
+            response = self.session.get(
+                f"{self.base_url}/api/tags", timeout=(self.connect_timeout, 5)
+            )
             return response.status_code == 200
         except requests.exceptions.RequestException:
-            return False
\ No newline at end of file
+            return False
+
+    # --- Async API ---
+
+    async def achat_completion(
+        self, messages: List[Dict[str, str]], model: str, **kwargs
+    ) -> str:
+        url = f"{self.base_url}/api/chat"
+        payload = self._chat_payload(messages, model, stream=False, **kwargs)
+
+        try:
+            response = await get_async_client(self.base_url).post(url, json=payload)
+            response.raise_for_status()
+            return response.json()["message"]["content"]
+        except httpx.ConnectError:
+            raise ConnectionError("Could not connect to Ollama. Is it running?")
+        except httpx.HTTPError as e:
+            raise Exception(f"Ollama API request failed: {e}")
+
+    async def achat_completion_stream(
+        self, messages: List[Dict[str, str]], model: str, **kwargs
+    ) -> AsyncIterator[str]:
+        url = f"{self.base_url}/api/chat"
+        payload = self._chat_payload(messages, model, stream=True, **kwargs)
+
+        try:
+            client = get_async_client(self.base_url)
+            async with client.stream("POST", url, json=payload) as response:
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    if not line:
+                        continue
+                    content, done = self._parse_stream_line(line)
+                    if content:
+                        yield content
+                    if done:
+                        break
+        except httpx.ConnectError:
+            raise ConnectionError("Could not connect to Ollama. Is it running?")
+        except httpx.HTTPError as e:
+            raise Exception(f"Ollama API request failed: {e}")
+
+    async def alist_models(self) -> List[str]:
+        try:
+            response = await get_async_client(self.base_url).get(
+                f"{self.base_url}/api/tags",
+                timeout=httpx.Timeout(10, connect=self.connect_timeout),
+            )
+            response.raise_for_status()
+            models_data = response.json().get("models", [])
+            return [model["name"] for model in models_data]
+        except httpx.HTTPError:
+            return []  # Return empty list if Ollama isn't running
+
+    async def ais_available(self) -> bool:
+        """Check if Ollama is running and accessible without blocking the event loop."""
+        try:
+            response = await get_async_client(self.base_url).get(
+                f"{self.base_url}/api/tags",
+                timeout=httpx.Timeout(5, connect=self.connect_timeout),
+            )
+            return response.status_code == 200
+        except httpx.HTTPError:
+            return False
@@ -2,29 +2,50 @@
 OpenAI provider implementation for cloud-based AI models.
 """
 
+import json
 import openai
-from typing import List, Dict, Any
+from typing import List, Dict, Any, AsyncIterator, Iterable, Iterator
+from urllib.parse import urlparse
 from .base_provider import BaseProvider
 from ..config import settings
 
+OPENAI_API_HOST = "api.openai.com"
+# Offered when the official API's live model list is unavailable
+DEFAULT_MODELS = ("gpt-4o", "gpt-4-turbo", "gpt-4", "gpt-3.5-turbo")
+# The live list also has embedding, audio and image models; keep chat models
+CHAT_MODEL_PREFIXES = ("gpt-", "chatgpt-", "o1", "o3", "o4")
+NON_CHAT_MODEL_WORDS = ("audio", "realtime", "transcribe", "tts", "image", "search")
+
 class OpenAIProvider(BaseProvider):
     """Provider for OpenAI API models."""
 
     def __init__(self, api_key: str = None, base_url: str = None):
-        self.api_key = api_key or (settings.openai_api_key.get_secret_value() 
-                                  if settings.openai_api_key else None)
+        if api_key is None:
+            stored_key = settings.get_openai_api_key()
+            api_key = stored_key.get_secret_value() if stored_key else None
+        self.api_key = api_key
         self.base_url = base_url or settings.openai_base_url
         self.client = None
+        self.async_client = None
         
         if self.api_key:
             self._initialize_client()
 
     def _initialize_client(self):
-        """Initialize the OpenAI client."""
+        """Initialize the OpenAI sync and async clients."""
         self.client = openai.OpenAI(
             api_key=self.api_key,
             base_url=self.base_url
         )
+        self.async_client = openai.AsyncOpenAI(
+            api_key=self.api_key,
+            base_url=self.base_url
+        )
+
+    @staticmethod
+    def _request_kwargs(kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        """Drop Sam-specific arguments (e.g. 'mode') the OpenAI API would reject."""
+        return {k: v for k, v in kwargs.items() if k not in ("mode", "options")}
 
     def chat_completion(self, messages: List[Dict[str, str]], model: str, **kwargs) -> str:
         if not self.client:
@@ -34,7 +55,7 @@ class OpenAIProvider(BaseProvider):
             response = self.client.chat.completions.create(
                 model=model,
                 messages=messages,
-                **kwargs
+                **self._request_kwargs(kwargs)
             )
             return response.choices[0].message.content
         except openai.APIConnectionError as e:
@@ -44,14 +65,134 @@ class OpenAIProvider(BaseProvider):
         except openai.AuthenticationError as e:
             raise ValueError(f"OpenAI API authentication failed: {e}")
 
+    def chat_with_tools(
+        self,
+        messages: List[Dict[str, Any]],
+        model: str,
+        tools: List[Dict[str, Any]],
+        **kwargs
+    ) -> Dict[str, Any]:
+        if not self.client:
+            raise ValueError("OpenAI client not initialized. Please provide an API key.")
+
+        try:
+            response = self.client.chat.completions.create(
+                model=model,
+                messages=messages,
+                tools=tools,
+                **self._request_kwargs(kwargs)
+            )
+        except openai.APIConnectionError as e:
+            raise ConnectionError(f"Failed to connect to OpenAI API: {e}")
+        except openai.APIError as e:
+            raise Exception(f"OpenAI API returned an error: {e}")
+
+        message = response.choices[0].message
+        tool_calls = []
+        for call in message.tool_calls or []:
+            try:
+                arguments = json.loads(call.function.arguments or "{}")
+            except json.JSONDecodeError:
+                arguments = {}
+            tool_calls.append(
+                {"id": call.id, "name": call.function.name, "arguments": arguments}
+            )
+
+        assistant_message = {"role": "assistant", "content": message.content}
+        if message.tool_calls:
+            assistant_message["tool_calls"] = [
+                {
+                    "id": call.id,
+                    "type": "function",
+                    "function": {
+                        "name": call.function.name,
+                        "arguments": call.function.arguments,
+                    },
+                }
+                for call in message.tool_calls
+            ]
+        return {
+            "content": message.content or "",
+            "tool_calls": tool_calls,
+            "message": assistant_message,
+        }
+
+    def chat_completion_stream(
+        self, messages: List[Dict[str, str]], model: str, **kwargs
+    ) -> Iterator[str]:
+        if not self.client:
+            raise ValueError("OpenAI client not initialized. Please provide an API key.")
+
+        try:
+            stream = self.client.chat.completions.create(
+                model=model,
+                messages=messages,
+                stream=True,
+                **self._request_kwargs(kwargs)
+            )
+            for chunk in stream:
+                if not chunk.choices:
+                    continue
+                content = chunk.choices[0].delta.content
+                if content:
+                    yield content
+        except openai.APIConnectionError as e:
+            raise ConnectionError(f"Failed to connect to OpenAI API: {e}")
+        except openai.APIError as e:
+            raise Exception(f"OpenAI API returned an error: {e}")
+        except openai.AuthenticationError as e:
+            raise ValueError(f"OpenAI API authentication failed: {e}")
+
+    def embed(self, texts: List[str], model: str) -> List[List[float]]:
+        if not self.client:
+            raise ValueError("OpenAI client not initialized. Please provide an API key.")
+
+        try:
+            response = self.client.embeddings.create(model=model, input=texts)
+            return [item.embedding for item in sorted(response.data, key=lambda d: d.index)]
+        except openai.APIConnectionError as e:
+            raise ConnectionError(f"Failed to connect to OpenAI API: {e}")
+        except openai.APIError as e:
+            raise Exception(f"OpenAI API returned an error: {e}")
+
     def list_models(self) -> List[str]:
-        # For OpenAI, we return some common models since listing all requires special permissions
-        return [
-            "gpt-4o",
-            "gpt-4-turbo",
-            "gpt-4",
-            "gpt-3.5-turbo",
-        ]
+        """
+        Chat models offered to this API key, falling back to common ones when
+        the list can't be fetched (no key, no network, or no permission).
+
+        OpenAI-compatible endpoints (a custom `base_url`, e.g. vLLM) list
+        every model they serve, and nothing when the list can't be fetched.
+        """
+        if self.client:
+            try:
+                return self._chat_models(model.id for model in self.client.models.list())
+            except openai.OpenAIError:
+                pass
+        return self._fallback_models()
+
+    @property
+    def _is_openai_api(self) -> bool:
+        """Whether `base_url` is the official API, rather than a compatible server."""
+        return urlparse(self.base_url).hostname == OPENAI_API_HOST
+
+    def _fallback_models(self) -> List[str]:
+        return list(DEFAULT_MODELS) if self._is_openai_api else []
+
+    def _chat_models(self, ids: Iterable[str]) -> List[str]:
+        """
+        The chat models among `ids`, sorted, or the defaults if there are none.
+
+        Only the official API's IDs are filtered by name; other servers'
+        models are returned as served.
+        """
+        if not self._is_openai_api:
+            return sorted(ids)
+        names = sorted(
+            name for name in ids
+            if name.startswith(CHAT_MODEL_PREFIXES)
+            and not any(word in name for word in NON_CHAT_MODEL_WORDS)
+        )
+        return names or list(DEFAULT_MODELS)
 
     def is_available(self) -> bool:
         """Check if OpenAI is configured properly."""
@@ -60,4 +201,65 @@ class OpenAIProvider(BaseProvider):
     def update_api_key(self, api_key: str):
         """Update the API key and reinitialize the client."""
         self.api_key = api_key
-        self._initialize_client()
\ No newline at end of file
+        self._initialize_client()
+
+    # --- Async API ---
+
+    async def achat_completion(
+        self, messages: List[Dict[str, str]], model: str, **kwargs
+    ) -> str:
+        if not self.async_client:
+            raise ValueError("OpenAI client not initialized. Please provide an API key.")
+
+        try:
+            response = await self.async_client.chat.completions.create(
+                model=model,
+                messages=messages,
+                **self._request_kwargs(kwargs)
+            )
+            return response.choices[0].message.content
+        except openai.APIConnectionError as e:
+            raise ConnectionError(f"Failed to connect to OpenAI API: {e}")
+        except openai.APIError as e:
+            raise Exception(f"OpenAI API returned an error: {e}")
+        except openai.AuthenticationError as e:
+            raise ValueError(f"OpenAI API authentication failed: {e}")
+
+    async def achat_completion_stream(
+        self, messages: List[Dict[str, str]], model: str, **kwargs
+    ) -> AsyncIterator[str]:
+        if not self.async_client:
+            raise ValueError("OpenAI client not initialized. Please provide an API key.")
+
+        try:
+            stream = await self.async_client.chat.completions.create(
+                model=model,
+                messages=messages,
+                stream=True,
+                **self._request_kwargs(kwargs)
+            )
+            async for chunk in stream:
+                if not chunk.choices:
+                    continue
+                content = chunk.choices[0].delta.content
+                if content:
+                    yield content
+        except openai.APIConnectionError as e:
+            raise ConnectionError(f"Failed to connect to OpenAI API: {e}")
+        except openai.APIError as e:
+            raise Exception(f"OpenAI API returned an error: {e}")
+        except openai.AuthenticationError as e:
+            raise ValueError(f"OpenAI API authentication failed: {e}")
+
+    async def alist_models(self) -> List[str]:
+        if self.async_client:
+            try:
+                return self._chat_models(
+                    [model.id async for model in self.async_client.models.list()]
+                )
+            except openai.OpenAIError:
+                pass
+        return self._fallback_models()
+
+    async def ais_available(self) -> bool:
+        return self.is_available()
@@ -0,0 +1,595 @@
+"""
+Routing provider for Sam AI.
+
+Spreads requests over several backends (e.g. Ollama on a few GPU machines and
+an OpenAI-compatible endpoint) behind the `BaseProvider` interface:
+
+* Health is tracked from real requests. A backend that fails is skipped for
+  an exponentially growing, jittered backoff period instead of being probed
+  on every message.
+* Each request goes to the healthy backend with the lowest expected wait:
+  its latency average multiplied by the requests it already has in flight.
+* Failed requests are retried on another backend after a jittered delay.
+* Optionally, a request that is still running once its backend's p95 latency
+  has passed is hedged: a duplicate is sent to a second backend and whichever
+  answers first wins.
+* Each backend has its own concurrency limit and wait queue (see
+  `scheduler`); a backend whose queue turns a request away is not marked
+  unhealthy, and the request fails as busy.
+"""
+
+import asyncio
+import contextvars
+import logging
+import random
+import statistics
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Sequence
+
+from .base_provider import BaseProvider, ProviderBusy, ToolCallingNotSupported
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+# Threads for hedged requests, shared by every router in the process
+_hedge_pool: Optional[ThreadPoolExecutor] = None
+_hedge_pool_lock = threading.Lock()
+
+
+def _get_hedge_pool() -> ThreadPoolExecutor:
+    global _hedge_pool
+    with _hedge_pool_lock:
+        if _hedge_pool is None:
+            _hedge_pool = ThreadPoolExecutor(max_workers=16, thread_name_prefix="sam-hedge")
+        return _hedge_pool
+
+
+class Backend:
+    """One provider behind a router, with its health and latency statistics."""
+
+    def __init__(self, provider: BaseProvider, model: Optional[str] = None, name: Optional[str] = None):
+        """
+        Args:
+            provider: The wrapped provider.
+            model: Model to use on this backend instead of the requested one.
+            name: Label used in logs and `RouterProvider.stats()`.
+        """
+        self.provider = provider
+        self.model = model
+        self.name = name or "{}({})".format(
+            type(provider).__name__, getattr(provider, "base_url", "")
+        )
+        self.in_flight = 0
+        self.latency: Optional[float] = None  # Exponentially weighted average, seconds
+        self.samples: deque = deque(maxlen=200)  # Recent non-streaming latencies
+        self.failures = 0
+        self.retry_at = 0.0  # time.monotonic() before which the backend is skipped
+
+    def available(self, now: float) -> bool:
+        return now >= self.retry_at
+
+    def score(self) -> float:
+        """Expected wait for a new request: average latency times queue depth."""
+        # Unmeasured backends score lowest, so every backend gets tried
+        return (self.latency or 0.0) * (self.in_flight + 1)
+
+    def p95(self) -> Optional[float]:
+        if len(self.samples) < settings.router_hedge_min_samples:
+            return None
+        return statistics.quantiles(self.samples, n=20)[-1]
+
+
+class RouterProvider(BaseProvider):
+    """Provider that load-balances, retries and hedges across several backends."""
+
+    def __init__(
+        self,
+        backends: Sequence[Any],
+        max_retries: int = None,
+        hedge: bool = None,
+    ):
+        """
+        Args:
+            backends: `Backend`s or bare providers, in order of preference
+                (used to break ties and to pick the embedding backend).
+            max_retries: Extra attempts on other backends after a failure.
+                Defaults to `settings.router_max_retries`.
+            hedge: Send a duplicate request once the p95 latency has passed.
+                Defaults to `settings.router_hedge`.
+        """
+        if not backends:
+            raise ValueError("RouterProvider needs at least one backend")
+        self.backends = [b if isinstance(b, Backend) else Backend(b) for b in backends]
+        self.max_retries = settings.router_max_retries if max_retries is None else max_retries
+        self.hedge = settings.router_hedge if hedge is None else hedge
+        self._lock = threading.Lock()
+        # Agent tool rounds must return to the backend that issued the tool
+        # calls, since message formats differ. Keyed by id(); the object is
+        # kept alive alongside so the id can't be reused while pinned.
+        self._pinned: "OrderedDict[int, tuple]" = OrderedDict()
+
+    # --- Health and selection ---
+
+    def _select(self, exclude: Sequence[Backend] = ()) -> Optional[Backend]:
+        """The available backend with the lowest score, or the one recovering soonest."""
+        now = time.monotonic()
+        with self._lock:
+            candidates = [b for b in self.backends if b not in exclude]
+            if not candidates:
+                return None
+            ready = [b for b in candidates if b.available(now)]
+            if not ready:
+                # Everything is backing off: try whichever recovers first
+                return min(candidates, key=lambda b: b.retry_at)
+            return min(ready, key=Backend.score)
+
+    def _record_success(self, backend: Backend, latency: float, sample: bool = True) -> None:
+        with self._lock:
+            backend.failures = 0
+            backend.retry_at = 0.0
+            backend.latency = latency if backend.latency is None else (
+                0.8 * backend.latency + 0.2 * latency
+            )
+            if sample:
+                backend.samples.append(latency)
+
+    def _record_failure(self, backend: Backend, error: Exception) -> None:
+        with self._lock:
+            backend.failures += 1
+            backoff = min(
+                settings.router_backoff_max,
+                settings.router_backoff_base * 2 ** (backend.failures - 1),
+            )
+            # Jitter keeps many clients from re-probing a recovering host at once
+            backend.retry_at = time.monotonic() + backoff * random.uniform(0.5, 1.0)
+        logger.warning(
+            f"Backend {backend.name} failed ({error}); skipping it for up to {backoff:.0f}s"
+        )
+
+    def _retry_delay(self, attempt: int) -> float:
+        """Full-jitter exponential delay before retry number `attempt`."""
+        return random.uniform(0, settings.router_retry_base_delay * 2 ** attempt)
+
+    def _model(self, backend: Backend, model: str) -> str:
+        return backend.model or model
+
+    def _pin(self, obj: Any, backend: Backend) -> None:
+        with self._lock:
+            self._pinned[id(obj)] = (obj, backend)
+            while len(self._pinned) > 1024:
+                self._pinned.popitem(last=False)
+
+    def _pinned_backend(self, objects: Sequence[Any]) -> Optional[Backend]:
+        with self._lock:
+            for obj in reversed(objects):
+                entry = self._pinned.get(id(obj))
+                if entry is not None and entry[0] is obj:
+                    return entry[1]
+        return None
+
+    # --- Request execution ---
+
+    def _call(self, backend: Backend, fn: Callable[[Backend], Any], sample: bool = True) -> Any:
+        with self._lock:
+            backend.in_flight += 1
+        start = time.monotonic()
+        try:
+            result = fn(backend)
+        except (ToolCallingNotSupported, ProviderBusy):
+            raise  # A capability gap or a full queue, not a health problem
+        except Exception as e:
+            self._record_failure(backend, e)
+            raise
+        finally:
+            with self._lock:
+                backend.in_flight -= 1
+        self._record_success(backend, time.monotonic() - start, sample)
+        return result
+
+    @staticmethod
+    def _give_up(busy: Optional[ProviderBusy], last_error: Optional[Exception]) -> Exception:
+        """The error to raise once no backend is left to try."""
+        if busy is not None:
+            return busy  # Retryable: some backend is up but has no free slot
+        return ConnectionError(f"All backends failed; last error: {last_error}")
+
+    def _route(self, fn: Callable[[Backend], Any], first: Optional[Backend] = None) -> Any:
+        """
+        Run `fn` on the best backend, retrying on others after failures.
+
+        A backend whose queue is full is passed over for the next one at once,
+        without a backoff delay and without counting as a retry: the score
+        doesn't track free slots, so another backend may still have one.
+        """
+        tried: List[Backend] = []
+        busy: Optional[ProviderBusy] = None
+        last_error: Optional[Exception] = None
+        failures = 0
+        after_failure = False
+        while failures <= self.max_retries:
+            backend = first if not tried and first is not None else self._select(tried)
+            if backend is None:
+                break
+            if after_failure:
+                time.sleep(self._retry_delay(failures - 1))
+            tried.append(backend)
+            try:
+                if self.hedge and len(tried) == 1:
+                    return self._hedged(backend, fn)
+                return self._call(backend, fn)
+            except ToolCallingNotSupported:
+                raise
+            except ProviderBusy as e:
+                busy, after_failure = e, False
+            except Exception as e:
+                last_error, after_failure = e, True
+                failures += 1
+        raise self._give_up(busy, last_error)
+
+    def _hedged(self, primary: Backend, fn: Callable[[Backend], Any]) -> Any:
+        """Run `fn` on `primary`, duplicating it on a second backend past the p95 latency."""
+        delay = primary.p95()
+        if delay is None:
+            return self._call(primary, fn)
+
+        pool = _get_hedge_pool()
+        # Pool threads run in a copy of this context, so the request keeps its scheduling scope
+        futures = {pool.submit(contextvars.copy_context().run, self._call, primary, fn): primary}
+        done, _ = wait(futures, timeout=delay)
+        if not done:
+            secondary = self._select(exclude=[primary])
+            if secondary is not None and secondary.available(time.monotonic()):
+                logger.info(f"Hedging slow request on {primary.name} to {secondary.name}")
+                futures[pool.submit(
+                    contextvars.copy_context().run, self._call, secondary, fn
+                )] = secondary
+
+        errors = []
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    return future.result()  # The loser finishes in the background
+                except Exception as e:
+                    errors.append(e)
+        raise errors[-1]
+
+    async def _acall(self, backend: Backend, fn: Callable[[Backend], Any]) -> Any:
+        with self._lock:
+            backend.in_flight += 1
+        start = time.monotonic()
+        try:
+            result = await fn(backend)
+        except (ToolCallingNotSupported, ProviderBusy, asyncio.CancelledError):
+            raise
+        except Exception as e:
+            self._record_failure(backend, e)
+            raise
+        finally:
+            with self._lock:
+                backend.in_flight -= 1
+        self._record_success(backend, time.monotonic() - start)
+        return result
+
+    async def _aroute(self, fn: Callable[[Backend], Any]) -> Any:
+        """Async `_route`; a losing hedged request is cancelled."""
+        tried: List[Backend] = []
+        busy: Optional[ProviderBusy] = None
+        last_error: Optional[Exception] = None
+        failures = 0
+        after_failure = False
+        while failures <= self.max_retries:
+            backend = self._select(tried)
+            if backend is None:
+                break
+            if after_failure:
+                await asyncio.sleep(self._retry_delay(failures - 1))
+            tried.append(backend)
+            try:
+                delay = backend.p95() if self.hedge and len(tried) == 1 else None
+                if delay is None:
+                    return await self._acall(backend, fn)
+                return await self._ahedged(backend, fn, delay)
+            except ToolCallingNotSupported:
+                raise
+            except ProviderBusy as e:
+                busy, after_failure = e, False
+            except Exception as e:
+                last_error, after_failure = e, True
+                failures += 1
+        raise self._give_up(busy, last_error)
+
+    async def _ahedged(self, primary: Backend, fn: Callable[[Backend], Any], delay: float) -> Any:
+        tasks = {asyncio.ensure_future(self._acall(primary, fn))}
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        if not done:
+            secondary = self._select(exclude=[primary])
+            if secondary is not None and secondary.available(time.monotonic()):
+                logger.info(f"Hedging slow request on {primary.name} to {secondary.name}")
+                tasks.add(asyncio.ensure_future(self._acall(secondary, fn)))
+
+        error: Optional[Exception] = None
+        pending = tasks
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def _stream(self, open_stream: Callable[[Backend], Iterator[str]]) -> Iterator[str]:
+        """
+        Stream from the best backend. Failures and full queues before the
+        first chunk are retried elsewhere, as in `_route`; after that the
+        error propagates, since the caller has already shown part of the reply.
+        """
+        tried: List[Backend] = []
+        busy: Optional[ProviderBusy] = None
+        last_error: Optional[Exception] = None
+        failures = 0
+        after_failure = False
+        while failures <= self.max_retries:
+            backend = self._select(tried)
+            if backend is None:
+                break
+            if after_failure:
+                time.sleep(self._retry_delay(failures - 1))
+            tried.append(backend)
+
+            with self._lock:
+                backend.in_flight += 1
+            start = time.monotonic()
+            started = False
+            try:
+                for chunk in open_stream(backend):
+                    if not started:
+                        started = True
+                        # Time to first chunk stands in for latency
+                        self._record_success(backend, time.monotonic() - start, sample=False)
+                    yield chunk
+                return
+            except ProviderBusy as e:
+                if started:
+                    raise
+                busy, after_failure = e, False
+            except Exception as e:
+                self._record_failure(backend, e)
+                if started:
+                    raise
+                last_error, after_failure = e, True
+                failures += 1
+            finally:
+                with self._lock:
+                    backend.in_flight -= 1
+        raise self._give_up(busy, last_error)
+
+    # --- BaseProvider API ---
+
+    def chat_completion(self, messages: List[Dict[str, str]], model: str, **kwargs) -> str:
+        return self._route(
+            lambda b: b.provider.chat_completion(messages, self._model(b, model), **kwargs)
+        )
+
+    def chat_completion_stream(
+        self, messages: List[Dict[str, str]], model: str, **kwargs
+    ) -> Iterator[str]:
+        return self._stream(
+            lambda b: b.provider.chat_completion_stream(messages, self._model(b, model), **kwargs)
+        )
+
+    def chat_with_tools(
+        self,
+        messages: List[Dict[str, Any]],
+        model: str,
+        tools: List[Dict[str, Any]],
+        **kwargs
+    ) -> Dict[str, Any]:
+        def call(backend: Backend) -> Dict[str, Any]:
+            turn = backend.provider.chat_with_tools(
+                messages, self._model(backend, model), tools, **kwargs
+            )
+            self._pin(turn["message"], backend)
+            for tool_call in turn["tool_calls"]:
+                self._pin(tool_call, backend)
+            return turn
+
+        pinned = self._pinned_backend(messages)
+        if pinned is not None:
+            # Later rounds of a tool loop carry backend-specific messages
+            return self._call(pinned, call)
+        return self._route(call)
+
+    def tool_result_message(self, tool_call: Dict[str, Any], content: str) -> Dict[str, Any]:
+        backend = self._pinned_backend([tool_call]) or self.backends[0]
+        return backend.provider.tool_result_message(tool_call, content)
+
+    def embed(self, texts: List[str], model: str) -> List[List[float]]:
+        # Vectors from different models aren't comparable, so embeddings always
+        # come from the first available backend in preference order
+        return self._route(
+            lambda b: b.provider.embed(texts, self._model(b, model)),
+            first=next(
+                (b for b in self.backends if b.available(time.monotonic())), None
+            ),
+        )
+
+    def warm_up(self, model: str) -> None:
+        for backend in self.backends:
+            try:
+                backend.provider.warm_up(self._model(backend, model))
+            except Exception as e:
+                logger.info(f"Could not warm up {backend.name}: {e}")
+
+    def needs_warm_up(self, model: str) -> bool:
+        return any(b.provider.needs_warm_up(self._model(b, model)) for b in self.backends)
+
+    def list_models(self) -> List[str]:
+        models = []
+        now = time.monotonic()
+        for backend in self.backends:
+            if not backend.available(now):
+                continue
+            try:
+                models.extend(m for m in backend.provider.list_models() if m not in models)
+            except Exception as e:
+                self._record_failure(backend, e)
+        return models
+
+    def running_models(self) -> List[Dict[str, Any]]:
+        """Loaded models of every available backend, each tagged with its "backend"."""
+        models = []
+        now = time.monotonic()
+        for backend in self.backends:
+            if not backend.available(now):
+                continue
+            try:
+                models.extend(
+                    dict(model, backend=backend.name) for model in backend.provider.running_models()
+                )
+            except Exception as e:
+                self._record_failure(backend, e)
+        return models
+
+    def is_available(self) -> bool:
+        """
+        True if any backend is usable.
+
+        Uses the cached health state; only backends whose backoff has expired
+        and that have never succeeded are probed.
+        """
+        now = time.monotonic()
+        for backend in self.backends:
+            if not backend.available(now):
+                continue
+            if backend.latency is not None:
+                return True
+            if backend.provider.is_available():
+                return True
+            self._record_failure(backend, ConnectionError("health check failed"))
+        return False
+
+    async def achat_completion(
+        self, messages: List[Dict[str, str]], model: str, **kwargs
+    ) -> str:
+        return await self._aroute(
+            lambda b: b.provider.achat_completion(messages, self._model(b, model), **kwargs)
+        )
+
+    async def achat_completion_stream(
+        self, messages: List[Dict[str, str]], model: str, **kwargs
+    ) -> AsyncIterator[str]:
+        tried: List[Backend] = []
+        busy: Optional[ProviderBusy] = None
+        last_error: Optional[Exception] = None
+        failures = 0
+        after_failure = False
+        while failures <= self.max_retries:
+            backend = self._select(tried)
+            if backend is None:
+                break
+            if after_failure:
+                await asyncio.sleep(self._retry_delay(failures - 1))
+            tried.append(backend)
+
+            with self._lock:
+                backend.in_flight += 1
+            start = time.monotonic()
+            started = False
+            try:
+                async for chunk in backend.provider.achat_completion_stream(
+                    messages, self._model(backend, model), **kwargs
+                ):
+                    if not started:
+                        started = True
+                        self._record_success(backend, time.monotonic() - start, sample=False)
+                    yield chunk
+                return
+            except ProviderBusy as e:
+                if started:
+                    raise
+                busy, after_failure = e, False
+            except Exception as e:
+                self._record_failure(backend, e)
+                if started:
+                    raise
+                last_error, after_failure = e, True
+                failures += 1
+            finally:
+                with self._lock:
+                    backend.in_flight -= 1
+        raise self._give_up(busy, last_error)
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """Health and load of each backend, for diagnostics."""
+        now = time.monotonic()
+        with self._lock:
+            return [
+                {
+                    "name": b.name,
+                    "available": b.available(now),
+                    "in_flight": b.in_flight,
+                    "latency": b.latency,
+                    "p95": b.p95(),
+                    "failures": b.failures,
+                }
+                for b in self.backends
+            ]
+
+
+def build_router() -> RouterProvider:
+    """Build a router from `settings.router_backends`, each backend behind the scheduler."""
+    from .ollama_provider import OllamaProvider
+    from .scheduler import scheduled
+
+    backends = []
+    for spec in settings.router_backends:
+        kind = spec.get("provider", "ollama").lower()
+        if kind == "ollama":
+            provider = OllamaProvider(base_url=spec.get("base_url"))
+        elif kind == "openai":
+            from .openai_provider import OpenAIProvider
+
+            provider = OpenAIProvider(api_key=spec.get("api_key"), base_url=spec.get("base_url"))
+        else:
+            raise ValueError(f"Unknown provider in router_backends: {kind}")
+        backend = Backend(provider, model=spec.get("model"), name=spec.get("name"))
+        limit = spec.get(
+            "max_concurrency", settings.scheduler_max_concurrency if kind == "ollama" else None
+        )
+        backend.provider = scheduled(provider, limit, name=backend.name)
+        backends.append(backend)
+
+    if not backends:
+        backend = Backend(OllamaProvider())
+        backend.provider = scheduled(
+            backend.provider, settings.scheduler_max_concurrency, name=backend.name
+        )
+        backends.append(backend)
+    return RouterProvider(backends)
+
+
+_router: Optional[RouterProvider] = None
+_router_lock = threading.Lock()
+
+
+def get_router() -> RouterProvider:
+    """
+    The process-wide router built from settings.
+
+    Shared by every orchestrator, so backend health, backoff and load are
+    tracked across all conversations rather than per session.
+    """
+    global _router
+    with _router_lock:
+        if _router is None:
+            _router = build_router()
+        return _router
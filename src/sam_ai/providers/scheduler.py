@@ -0,0 +1,494 @@
+"""
+Admission control for Sam AI's providers.
+
+A single Ollama host only runs a few generations at once; requests beyond
+that queue inside Ollama, invisible to us, until they hit the read timeout.
+A `SchedulingProvider` wraps a backend and lets at most `limit` generations
+through at a time. Everything else waits in a bounded queue in front of it:
+
+* Priorities: interactive chat is served before agent work, and both before
+  batch and background jobs (summaries).
+* Fairness: within a priority, users take turns, so one user's burst can't
+  starve everyone else.
+* Deadlines: a request that can't get a slot within the queue timeout, or
+  that the queue is already too long to serve in time, is turned away with
+  `ProviderBusy` at once instead of hanging.
+* Shedding: when the queue is full, a new request may take the place of a
+  lower-priority one, which is turned away instead.
+
+Who is asking, and how urgently, is set by the caller with `request_scope`;
+it travels with the thread or asyncio task down to the provider call.
+"""
+
+import asyncio
+import contextvars
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, NamedTuple, Optional
+
+from .base_provider import BaseProvider, ProviderBusy
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+# Priorities, most urgent first
+INTERACTIVE = 0
+AGENT = 1
+BATCH = 2
+PRIORITY_NAMES = ("interactive", "agent", "batch")
+
+
+class RequestScope(NamedTuple):
+    """Who a provider request is for, and how long it may wait for a slot."""
+
+    user: str
+    priority: int
+    timeout: float  # Seconds
+
+
+_scope: "contextvars.ContextVar[Optional[RequestScope]]" = contextvars.ContextVar(
+    "sam_request_scope", default=None
+)
+
+
+@contextmanager
+def request_scope(
+    user: Optional[str] = None, priority: int = BATCH, timeout: Optional[float] = None
+) -> Iterator[RequestScope]:
+    """
+    Attribute the provider requests made inside the block.
+
+    Requests made outside any scope (e.g. background summaries) are
+    anonymous batch work.
+
+    Args:
+        user: Requester, for fair turns between users.
+        priority: INTERACTIVE, AGENT or BATCH.
+        timeout: Seconds a request may wait for a slot.
+            Defaults to `settings.scheduler_queue_timeout`.
+    """
+    scope = RequestScope(
+        user or "",
+        priority,
+        settings.scheduler_queue_timeout if timeout is None else timeout,
+    )
+    previous = _scope.get()
+    _scope.set(scope)
+    try:
+        yield scope
+    finally:
+        # set() rather than reset(): a generator may be closed from another context
+        _scope.set(previous)
+
+
+def current_scope() -> RequestScope:
+    """The scope of the running request, or the anonymous batch default."""
+    scope = _scope.get()
+    if scope is None:
+        return RequestScope("", BATCH, settings.scheduler_queue_timeout)
+    return scope
+
+
+class _Waiter:
+    """A request waiting for a slot."""
+
+    __slots__ = ("user", "priority", "wake", "granted", "rejected")
+
+    def __init__(self, user: str, priority: int, wake: Callable[[], None]):
+        self.user = user
+        self.priority = priority
+        self.wake = wake  # Called (under the scheduler lock) once granted or shed
+        self.granted = False
+        self.rejected = False
+
+
+class _Lane:
+    """The slots and queue of one backend. Guarded by the scheduler's lock."""
+
+    def __init__(self, name: str, limit: int, max_queue: int):
+        self.name = name
+        self.limit = limit
+        self.max_queue = max_queue
+        self.active = 0
+        self.queued = 0
+        # One queue per priority; each maps user -> their waiters, in turn order
+        self.queues: List["OrderedDict[str, deque]"] = [OrderedDict() for _ in PRIORITY_NAMES]
+        self.hold_time: Optional[float] = None  # Average seconds a slot is held
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    def push(self, waiter: _Waiter) -> None:
+        queue = self.queues[waiter.priority]
+        queue.setdefault(waiter.user, deque()).append(waiter)
+        self.queued += 1
+
+    def pop(self) -> Optional[_Waiter]:
+        """The next waiter: most urgent priority first, then the next user's turn."""
+        for queue in self.queues:
+            if not queue:
+                continue
+            user, waiters = next(iter(queue.items()))
+            waiter = waiters.popleft()
+            if waiters:
+                queue.move_to_end(user)
+            else:
+                del queue[user]
+            self.queued -= 1
+            return waiter
+        return None
+
+    def remove(self, waiter: _Waiter) -> None:
+        queue = self.queues[waiter.priority]
+        waiters = queue.get(waiter.user)
+        if waiters is None or waiter not in waiters:
+            return
+        waiters.remove(waiter)
+        if not waiters:
+            del queue[waiter.user]
+        self.queued -= 1
+
+    def victim(self, priority: int) -> Optional[_Waiter]:
+        """
+        The waiter to shed for a request of `priority`: from the least urgent
+        priority below it, the newest request of the user with the most queued.
+        """
+        for queue in reversed(self.queues[priority + 1:]):
+            if queue:
+                waiters = max(queue.values(), key=len)
+                return waiters[-1]
+        return None
+
+    def expected_wait(self, priority: int) -> Optional[float]:
+        """Rough seconds until a new request of `priority` would get a slot."""
+        if self.hold_time is None:
+            return None
+        ahead = sum(
+            len(waiters) for queue in self.queues[:priority + 1] for waiters in queue.values()
+        )
+        return (ahead + 1) * self.hold_time / self.limit
+
+    def depth(self) -> Dict[str, int]:
+        return {
+            name: sum(len(waiters) for waiters in queue.values())
+            for name, queue in zip(PRIORITY_NAMES, self.queues)
+        }
+
+
+class Scheduler:
+    """
+    Per-backend concurrency limits with a prioritized, fair wait queue.
+
+    Usable from threads (`slot`) and from asyncio code (`aslot`) at the same
+    time; both share the same slots.
+    """
+
+    def __init__(self, max_queue: Optional[int] = None, instrumentation=None):
+        """
+        Args:
+            max_queue: Requests waiting per backend before new ones are turned
+                away. Defaults to `settings.scheduler_max_queue`.
+            instrumentation: Receives wait spans and admission counters.
+                Defaults to the process-wide instrumentation.
+        """
+        self.max_queue = settings.scheduler_max_queue if max_queue is None else max_queue
+        self._instrumentation = instrumentation
+        self._lanes: Dict[str, _Lane] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def instrumentation(self):
+        if self._instrumentation is not None:
+            return self._instrumentation
+        from ..core.instrumentation import get_instrumentation
+
+        return get_instrumentation()
+
+    def add_backend(self, name: str, limit: int) -> None:
+        """Allow `limit` concurrent requests on backend `name` (replacing an earlier limit)."""
+        if limit < 1:
+            raise ValueError("A backend needs at least one slot")
+        with self._lock:
+            lane = self._lanes.get(name)
+            if lane is None:
+                self._lanes[name] = _Lane(name, limit, self.max_queue)
+                return
+            lane.limit = limit
+            while lane.active < lane.limit and lane.queued:
+                # Extra slots go to whoever is waiting
+                lane.active += 1
+                self._release(lane, None)
+
+    # --- Admission ---
+
+    def _admit(self, lane: _Lane, scope: RequestScope, wake: Callable[[], None]) -> Optional[_Waiter]:
+        """
+        Take a slot now (returns None) or queue for one (returns the waiter).
+        Must hold the lock.
+
+        Raises:
+            ProviderBusy: If the request can't be served in time.
+        """
+        if lane.active < lane.limit and not lane.queued:
+            lane.active += 1
+            lane.admitted += 1
+            return None
+
+        expected = lane.expected_wait(scope.priority)
+        if expected is not None and expected > scope.timeout:
+            raise self._reject(lane, scope.priority, "deadline")
+
+        if lane.queued >= lane.max_queue:
+            victim = lane.victim(scope.priority)
+            if victim is None:
+                raise self._reject(lane, scope.priority, "queue_full")
+            lane.remove(victim)
+            victim.rejected = True
+            victim.wake()
+
+        waiter = _Waiter(scope.user, scope.priority, wake)
+        lane.push(waiter)
+        return waiter
+
+    def _reject(self, lane: _Lane, priority: int, reason: str) -> ProviderBusy:
+        lane.rejected += 1
+        logger.info(f"Turned away a {PRIORITY_NAMES[priority]} request for {lane.name}: {reason}")
+        self.instrumentation.count(
+            "scheduler_rejected", backend=lane.name, priority=PRIORITY_NAMES[priority], reason=reason
+        )
+        return ProviderBusy(f"{lane.name} is busy ({reason.replace('_', ' ')}); try again shortly")
+
+    def _settle(self, lane: _Lane, waiter: _Waiter) -> None:
+        """After waiting: keep the granted slot, or leave the queue. Must hold the lock."""
+        if waiter.granted:
+            lane.admitted += 1
+            return
+        if waiter.rejected:
+            raise self._reject(lane, waiter.priority, "shed")
+        lane.remove(waiter)
+        lane.timed_out += 1
+        raise self._reject(lane, waiter.priority, "timeout")
+
+    def _release(self, lane: _Lane, held: Optional[float]) -> None:
+        """Hand the slot to the next waiter, or free it. Must hold the lock."""
+        if held is not None:
+            lane.hold_time = held if lane.hold_time is None else 0.8 * lane.hold_time + 0.2 * held
+        waiter = lane.pop()
+        if waiter is None:
+            lane.active -= 1
+        else:
+            waiter.granted = True
+            waiter.wake()
+
+    def _abandon(self, lane: _Lane, waiter: _Waiter) -> None:
+        """A waiter's caller went away (e.g. cancelled). Must hold the lock."""
+        if waiter.granted:
+            self._release(lane, None)
+        else:
+            lane.remove(waiter)
+
+    def _wait_span(self, lane: _Lane, scope: RequestScope):
+        return self.instrumentation.span(
+            "scheduler.wait",
+            backend=lane.name,
+            priority=PRIORITY_NAMES[scope.priority],
+            queued=lane.queued,
+        )
+
+    @contextmanager
+    def slot(self, name: str) -> Iterator[None]:
+        """
+        Hold a slot on backend `name` for the duration of the block.
+
+        Raises:
+            ProviderBusy: If no slot could be had within the request's timeout.
+        """
+        lane = self._lanes[name]
+        scope = current_scope()
+        event = threading.Event()
+        with self._lock:
+            waiter = self._admit(lane, scope, event.set)
+        if waiter is not None:
+            with self._wait_span(lane, scope):
+                event.wait(scope.timeout)
+                with self._lock:
+                    self._settle(lane, waiter)
+
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._release(lane, time.monotonic() - start)
+
+    @asynccontextmanager
+    async def aslot(self, name: str) -> AsyncIterator[None]:
+        """Async `slot`: waits without blocking the event loop."""
+        lane = self._lanes[name]
+        scope = current_scope()
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def wake():
+            loop.call_soon_threadsafe(lambda: future.done() or future.set_result(None))
+
+        with self._lock:
+            waiter = self._admit(lane, scope, wake)
+        if waiter is not None:
+            with self._wait_span(lane, scope):
+                try:
+                    await asyncio.wait_for(asyncio.shield(future), scope.timeout)
+                except asyncio.TimeoutError:
+                    pass
+                except BaseException:
+                    with self._lock:
+                        self._abandon(lane, waiter)
+                    raise
+                with self._lock:
+                    self._settle(lane, waiter)
+
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._release(lane, time.monotonic() - start)
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """Load, queue depth and admission counts of each backend."""
+        with self._lock:
+            return [
+                {
+                    "name": lane.name,
+                    "limit": lane.limit,
+                    "active": lane.active,
+                    "queued": lane.queued,
+                    "queued_by_priority": lane.depth(),
+                    "hold_time": lane.hold_time,
+                    "admitted": lane.admitted,
+                    "rejected": lane.rejected,
+                    "timed_out": lane.timed_out,
+                }
+                for lane in self._lanes.values()
+            ]
+
+
+_scheduler: Optional[Scheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> Scheduler:
+    """The process-wide scheduler, shared by every provider pointing at the same backend."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = Scheduler()
+        return _scheduler
+
+
+class SchedulingProvider(BaseProvider):
+    """Provider wrapper that runs generations through a `Scheduler` slot."""
+
+    def __init__(
+        self,
+        provider: BaseProvider,
+        limit: int,
+        name: Optional[str] = None,
+        scheduler: Optional[Scheduler] = None,
+    ):
+        """
+        Args:
+            provider: The backend to protect.
+            limit: Generations allowed on it at once.
+            name: Backend identity; wrappers with the same name share slots.
+                Defaults to the provider's class and base URL.
+            scheduler: Defaults to the process-wide scheduler.
+        """
+        self.provider = provider
+        self.name = name or "{}({})".format(
+            type(provider).__name__, getattr(provider, "base_url", "")
+        )
+        self.scheduler = scheduler or get_scheduler()
+        self.scheduler.add_backend(self.name, limit)
+
+    def __getattr__(self, name):
+        # Anything not wrapped (e.g. update_api_key, base_url) goes to the real provider
+        if name == "provider":
+            raise AttributeError(name)
+        return getattr(self.provider, name)
+
+    def chat_completion(self, messages: List[Dict[str, str]], model: str, **kwargs) -> str:
+        with self.scheduler.slot(self.name):
+            return self.provider.chat_completion(messages, model, **kwargs)
+
+    def chat_completion_stream(
+        self, messages: List[Dict[str, str]], model: str, **kwargs
+    ) -> Iterator[str]:
+        # The slot is held until the stream is finished or closed
+        with self.scheduler.slot(self.name):
+            yield from self.provider.chat_completion_stream(messages, model, **kwargs)
+
+    def chat_with_tools(
+        self,
+        messages: List[Dict[str, Any]],
+        model: str,
+        tools: List[Dict[str, Any]],
+        **kwargs
+    ) -> Dict[str, Any]:
+        with self.scheduler.slot(self.name):
+            return self.provider.chat_with_tools(messages, model, tools, **kwargs)
+
+    async def achat_completion(
+        self, messages: List[Dict[str, str]], model: str, **kwargs
+    ) -> str:
+        async with self.scheduler.aslot(self.name):
+            return await self.provider.achat_completion(messages, model, **kwargs)
+
+    async def achat_completion_stream(
+        self, messages: List[Dict[str, str]], model: str, **kwargs
+    ) -> AsyncIterator[str]:
+        async with self.scheduler.aslot(self.name):
+            async for chunk in self.provider.achat_completion_stream(messages, model, **kwargs):
+                yield chunk
+
+    # Embeddings, listings and health checks are short and don't queue
+
+    def tool_result_message(self, tool_call: Dict[str, Any], content: str) -> Dict[str, Any]:
+        return self.provider.tool_result_message(tool_call, content)
+
+    def embed(self, texts: List[str], model: str) -> List[List[float]]:
+        return self.provider.embed(texts, model)
+
+    def warm_up(self, model: str) -> None:
+        self.provider.warm_up(model)
+
+    def needs_warm_up(self, model: str) -> bool:
+        return self.provider.needs_warm_up(model)
+
+    def list_models(self) -> List[str]:
+        return self.provider.list_models()
+
+    def is_available(self) -> bool:
+        return self.provider.is_available()
+
+    def running_models(self) -> List[Dict[str, Any]]:
+        return self.provider.running_models()
+
+    async def alist_models(self) -> List[str]:
+        return await self.provider.alist_models()
+
+    async def ais_available(self) -> bool:
+        return await self.provider.ais_available()
+
+
+def scheduled(provider: BaseProvider, limit: Optional[int], name: Optional[str] = None) -> BaseProvider:
+    """
+    `provider` behind the process-wide scheduler, or unchanged when scheduling
+    is off or `limit` is None or 0 (unlimited).
+    """
+    if not settings.scheduler_enabled or not limit:
+        return provider
+    return SchedulingProvider(provider, limit, name=name)
@@ -0,0 +1,387 @@
+"""
+HTTP API for Sam AI.
+
+An ASGI application serving the orchestrator to web, mobile and other
+clients, so they share one backend instead of each running its own. Every
+(user_id, session_id) pair is its own conversation with its own memory.
+
+Endpoints:
+    GET    /health                         Liveness, provider availability and queue depth
+    GET    /models                         Models offered by the provider
+    POST   /chat                           {"message", "session_id", "user_id", "mode"}
+    POST   /chat/stream                    Same body; the reply as Server-Sent Events
+    GET    /sessions/{session_id}/memory   Export stored history (?user_id=&format=jsonl)
+    DELETE /sessions/{session_id}/memory   Clear a conversation
+
+Streaming replies send one `data: {"content": "..."}` event per chunk and
+finish with an `event: done` event.
+
+When the provider is saturated, /chat answers 503 with a `Retry-After` header;
+when it fails, 502. Both carry {"error": "..."}. A stream ends with an
+`event: error` event carrying the same status instead of `event: done`.
+
+Usage:
+    python -m src.sam_ai.server --host 0.0.0.0 --port 8000 --workers 4
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional, Tuple
+
+try:
+    from starlette.applications import Starlette
+    from starlette.concurrency import iterate_in_threadpool
+    from starlette.requests import Request
+    from starlette.responses import JSONResponse, Response, StreamingResponse
+    from starlette.routing import Route
+except ImportError as e:
+    raise ImportError(
+        "The API server needs starlette and uvicorn: pip install 'sam-ai[server]'"
+    ) from e
+
+from .config import settings
+from .core.engine import AsyncOrchestrator
+from .providers import BaseProvider, ProviderBusy, get_provider
+from .providers.catalog import ModelCatalog
+from .providers.scheduler import get_scheduler
+from .storage import safe_name
+
+logger = logging.getLogger(__name__)
+
+SessionKey = Tuple[str, str]
+
+# Records per chunk of a memory export
+EXPORT_BATCH_SIZE = 200
+
+
+class SessionPool:
+    """
+    The orchestrators of the conversations this worker is serving.
+
+    Least recently used conversations are unloaded beyond `max_sessions`; their
+    memory stays on disk and is loaded again on their next request. A
+    conversation with a request in progress is never unloaded, so the pool
+    may briefly hold more than `max_sessions` under load.
+    """
+
+    def __init__(
+        self, max_sessions: Optional[int] = None, provider: Optional[BaseProvider] = None
+    ):
+        """
+        Args:
+            max_sessions: Conversations kept loaded. Defaults to `settings.server_max_sessions`.
+            provider: Provider shared by every conversation. Defaults to
+                `settings.default_provider`.
+        """
+        self.max_sessions = max_sessions or settings.server_max_sessions
+        self.provider = provider
+        self._sessions: "OrderedDict[SessionKey, AsyncOrchestrator]" = OrderedDict()
+        self._in_use: Dict[SessionKey, int] = {}
+        self._lock = asyncio.Lock()
+
+    @asynccontextmanager
+    async def use(self, user_id: str, session_id: str) -> AsyncIterator[AsyncOrchestrator]:
+        """The conversation's orchestrator, kept loaded until the block exits."""
+        key = (user_id, session_id)
+        orchestrator = await self._acquire(key)
+        try:
+            yield orchestrator
+        finally:
+            async with self._lock:
+                self._in_use[key] -= 1
+                if not self._in_use[key]:
+                    del self._in_use[key]
+                evicted = self._evict()
+            await self._close(evicted)
+
+    async def _acquire(self, key: SessionKey) -> AsyncOrchestrator:
+        async with self._lock:
+            orchestrator = self._sessions.get(key)
+            if orchestrator is not None:
+                self._sessions.move_to_end(key)
+                self._in_use[key] = self._in_use.get(key, 0) + 1
+                return orchestrator
+
+        # Loading memory reads the disk, so it happens off the event loop
+        orchestrator = await asyncio.to_thread(
+            AsyncOrchestrator, user_id=key[0], session_id=key[1], provider=self.provider
+        )
+        async with self._lock:
+            # Another request for the same conversation may have won the race
+            existing = self._sessions.get(key)
+            if existing is not None:
+                self._sessions.move_to_end(key)
+                orchestrator = existing
+            else:
+                self._sessions[key] = orchestrator
+            self._in_use[key] = self._in_use.get(key, 0) + 1
+            evicted = self._evict()
+        await self._close(evicted)
+        return orchestrator
+
+    def _evict(self):
+        """Unload idle conversations beyond the limit, oldest first. Caller holds `_lock`."""
+        evicted = []
+        for key in list(self._sessions):
+            if len(self._sessions) <= self.max_sessions:
+                break
+            if key not in self._in_use:
+                evicted.append(self._sessions.pop(key))
+        return evicted
+
+    @staticmethod
+    async def _close(orchestrators) -> None:
+        for orchestrator in orchestrators:
+            await asyncio.to_thread(orchestrator.memory.close)
+
+    async def close(self) -> None:
+        async with self._lock:
+            sessions = list(self._sessions.values())
+            self._sessions.clear()
+        await self._close(sessions)
+
+
+class _BadRequest(Exception):
+    pass
+
+
+async def _chat_request(request: Request) -> Dict:
+    try:
+        body = await request.json()
+    except ValueError:
+        raise _BadRequest("Request body must be JSON")
+    if not isinstance(body, dict) or not isinstance(body.get("message"), str):
+        raise _BadRequest("'message' (a string) is required")
+    if body.get("mode", "chat") not in ("chat", "agent"):
+        raise _BadRequest("'mode' must be 'chat' or 'agent'")
+    user_id, session_id = _session_ids(
+        str(body.get("user_id", "default")), str(body.get("session_id", "default"))
+    )
+    return {
+        "message": body["message"],
+        "mode": body.get("mode", "chat"),
+        "user_id": user_id,
+        "session_id": session_id,
+    }
+
+
+def _session_ids(user_id: str, session_id: str) -> SessionKey:
+    """Check ids taken from a request can name a conversation (e.g. not "..")."""
+    for identifier in (user_id, session_id):
+        try:
+            safe_name(identifier)
+        except ValueError as e:
+            raise _BadRequest(str(e))
+    return user_id, session_id
+
+
+def _bad_request(error: Exception) -> JSONResponse:
+    return JSONResponse({"error": str(error)}, status_code=400)
+
+
+def _provider_error(error: Exception) -> Tuple[int, Dict]:
+    """Status and body for a failed reply: 503 if the provider was busy, else 502."""
+    if isinstance(error, ProviderBusy):
+        logger.warning(f"Turned away: {error}")
+        return 503, {"error": str(error), "retry_after": settings.server_retry_after}
+    logger.error(f"Provider error: {error}")
+    return 502, {"error": str(error)}
+
+
+@asynccontextmanager
+async def _conversation(
+    request: Request, user_id: str, session_id: str
+) -> AsyncIterator[AsyncOrchestrator]:
+    """The conversation's orchestrator, held loaded for the duration of the request."""
+    async with request.app.state.sessions.use(user_id, session_id) as orchestrator:
+        if settings.server_workers > 1:
+            # Other workers may have added turns to this conversation since
+            await asyncio.to_thread(orchestrator.memory.reload)
+        yield orchestrator
+
+
+async def health(request: Request) -> JSONResponse:
+    # Served from the catalog, so health checks never wait on the provider
+    state = request.app.state.catalog.state
+    return JSONResponse({
+        "status": "ok",
+        "provider": settings.default_provider,
+        "model": settings.default_model,
+        "provider_available": state.available,
+        "checked": state.updated,
+        "scheduler": get_scheduler().stats(),  # Slots in use and queue depth per backend
+    })
+
+
+async def models(request: Request) -> JSONResponse:
+    state = request.app.state.catalog.state
+    return JSONResponse({
+        "provider": settings.default_provider,
+        "models": list(state.models),
+        "loaded": list(state.loaded),
+        "checked": state.updated,
+    })
+
+
+async def chat(request: Request) -> JSONResponse:
+    try:
+        params = await _chat_request(request)
+    except _BadRequest as e:
+        return _bad_request(e)
+    async with _conversation(request, params["user_id"], params["session_id"]) as orchestrator:
+        try:
+            response = await orchestrator.arespond(params["message"], params["mode"])
+        except Exception as e:
+            status, body = _provider_error(e)
+            headers = {"Retry-After": str(body["retry_after"])} if status == 503 else None
+            return JSONResponse(body, status_code=status, headers=headers)
+    return JSONResponse({"response": response, "session_id": params["session_id"]})
+
+
+async def chat_stream(request: Request) -> Response:
+    try:
+        params = await _chat_request(request)
+    except _BadRequest as e:
+        return _bad_request(e)
+
+    async def events():
+        # The conversation is held for as long as the stream runs. A client
+        # that disconnects cancels this generator, and with it the generation;
+        # the unfinished turn is not saved to memory
+        async with _conversation(request, params["user_id"], params["session_id"]) as orchestrator:
+            try:
+                async for chunk in orchestrator.arespond_stream(params["message"], params["mode"]):
+                    yield f"data: {json.dumps({'content': chunk}, ensure_ascii=False)}\n\n"
+            except Exception as e:
+                status, body = _provider_error(e)
+                body["status"] = status
+                yield f"event: error\ndata: {json.dumps(body, ensure_ascii=False)}\n\n"
+                return
+        yield "event: done\ndata: {}\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def export_memory(request: Request) -> Response:
+    try:
+        user_id, session_id = _session_ids(
+            request.query_params.get("user_id", "default"), request.path_params["session_id"]
+        )
+    except _BadRequest as e:
+        return _bad_request(e)
+    jsonl = request.query_params.get("format") == "jsonl"
+
+    def chunks(store):
+        # Streamed in batches, so a long SQLite history is never held in memory at once
+        batch = [] if jsonl else ["["]
+        for i, record in enumerate(store.iter_records(EXPORT_BATCH_SIZE)):
+            line = json.dumps(record.to_dict(), ensure_ascii=False)
+            batch.append(line + "\n" if jsonl else ("," if i else "") + line)
+            if len(batch) >= EXPORT_BATCH_SIZE:
+                yield "".join(batch)
+                batch = []
+        if not jsonl:
+            batch.append("]")
+        if batch:
+            yield "".join(batch)
+
+    async def body():
+        async with _conversation(request, user_id, session_id) as orchestrator:
+            async for chunk in iterate_in_threadpool(chunks(orchestrator.memory.store)):
+                yield chunk
+
+    return StreamingResponse(
+        body(), media_type="application/x-ndjson" if jsonl else "application/json"
+    )
+
+
+async def clear_memory(request: Request) -> Response:
+    try:
+        user_id, session_id = _session_ids(
+            request.query_params.get("user_id", "default"), request.path_params["session_id"]
+        )
+    except _BadRequest as e:
+        return _bad_request(e)
+    async with _conversation(request, user_id, session_id) as orchestrator:
+        await orchestrator.aclear_memory()
+    return Response(status_code=204)
+
+
+def create_app(max_sessions: Optional[int] = None) -> Starlette:
+    """
+    Build the ASGI application.
+
+    Args:
+        max_sessions: Conversations kept loaded. Defaults to `settings.server_max_sessions`.
+    """
+
+    @asynccontextmanager
+    async def lifespan(app: Starlette):
+        app.state.provider = get_provider(settings.default_provider)
+        app.state.catalog = ModelCatalog(app.state.provider)
+        await asyncio.to_thread(app.state.catalog.refresh)
+        app.state.catalog.start()
+        # One provider for every conversation, so they share its connections
+        # and, for the router, its view of backend health
+        app.state.sessions = SessionPool(max_sessions, provider=app.state.provider)
+        yield
+        app.state.catalog.stop()
+        await app.state.sessions.close()
+        if settings.default_provider in ("ollama", "router"):
+            from .providers.ollama_provider import aclose_async_clients
+
+            await aclose_async_clients()
+
+    return Starlette(
+        routes=[
+            Route("/health", health),
+            Route("/models", models),
+            Route("/chat", chat, methods=["POST"]),
+            Route("/chat/stream", chat_stream, methods=["POST"]),
+            Route("/sessions/{session_id}/memory", export_memory, methods=["GET"]),
+            Route("/sessions/{session_id}/memory", clear_memory, methods=["DELETE"]),
+        ],
+        lifespan=lifespan,
+    )
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Serve Sam AI over HTTP.")
+    parser.add_argument("--host", default=settings.server_host)
+    parser.add_argument("--port", type=int, default=settings.server_port)
+    parser.add_argument("--workers", type=int, default=settings.server_workers,
+                        help="Worker processes (more than one needs the sqlite memory backend)")
+    args = parser.parse_args(argv)
+
+    if args.workers > 1 and settings.memory_backend != "sqlite":
+        parser.error(
+            "--workers > 1 needs MEMORY_BACKEND=sqlite; per-session JSON-lines "
+            "logs cannot be shared between processes"
+        )
+
+    import uvicorn
+
+    # Workers are separate processes that read their settings from the environment
+    os.environ["SERVER_WORKERS"] = str(args.workers)
+    logging.basicConfig(level=settings.log_level, format="%(levelname)s %(message)s")
+    uvicorn.run(
+        f"{__package__}.server:create_app",
+        factory=True,
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,82 @@
+"""
+Persistence backends for Sam AI's conversation memory.
+"""
+
+import re
+
+from .base_store import BaseStore
+from .interaction import Interaction
+from .jsonl_store import JsonlStore
+from .sqlite_store import SQLiteStore
+from ..config import settings
+
+__all__ = ['BaseStore', 'Interaction', 'JsonlStore', 'SQLiteStore', 'get_store', 'safe_name']
+
+DEFAULT_ID = "default"
+
+
+def safe_name(identifier: str) -> str:
+    """
+    Make a user or session id safe to use as a file name.
+
+    Raises:
+        ValueError: If the id is only dots, which would name the directory
+            itself or its parent.
+    """
+    name = re.sub(r"[^A-Za-z0-9_.-]", "_", identifier) or "_"
+    if not name.strip("."):
+        raise ValueError(f"Invalid id: {identifier!r}")
+    return name
+
+
+def get_store(
+    backend: str = None, user_id: str = DEFAULT_ID, session_id: str = DEFAULT_ID
+) -> BaseStore:
+    """
+    Factory function to get the conversation store for a session.
+
+    Args:
+        backend: 'jsonl' or 'sqlite'. Defaults to `settings.memory_backend`.
+        user_id: Owner of the conversation.
+        session_id: Conversation identifier.
+
+    Returns:
+        A store bound to the requested conversation
+
+    Raises:
+        ValueError: If the backend name is not recognized
+    """
+    backend = (backend or settings.memory_backend).lower()
+    base_path = settings.memory_persistence_path
+
+    if backend == 'jsonl':
+        legacy_path = None
+        if user_id == DEFAULT_ID and session_id == DEFAULT_ID:
+            # The single-user default keeps the original file location
+            path = base_path / "conversation_memory.jsonl"
+            legacy_path = base_path / "conversation_memory.json"
+        else:
+            path = (
+                base_path / "sessions" / safe_name(user_id)
+                / f"{safe_name(session_id)}.jsonl"
+            )
+        return JsonlStore(
+            path,
+            max_records=settings.max_chat_history,
+            fsync_policy=settings.memory_fsync_policy,
+            fsync_interval=settings.memory_fsync_interval,
+            compaction_threshold=settings.memory_compaction_threshold,
+            legacy_path=legacy_path,
+            user_id=user_id,
+            session_id=session_id,
+            archive=settings.memory_archive_history,
+        )
+    elif backend == 'sqlite':
+        return SQLiteStore(
+            settings.memory_sqlite_path or base_path / "memory.db",
+            user_id=user_id,
+            session_id=session_id,
+            fsync_policy=settings.memory_fsync_policy,
+        )
+    else:
+        raise ValueError(f"Unknown memory backend: {backend}")
@@ -0,0 +1,72 @@
+"""
+Abstract base class for conversation memory stores.
+"""
+
+from abc import ABC, abstractmethod
+from typing import Dict, Iterator, List, Optional
+
+from .interaction import Interaction
+
+
+class BaseStore(ABC):
+    """
+    Abstract base class for all conversation stores.
+
+    A store instance is bound to a single conversation, identified by a user id
+    and a session id. Records are `Interaction`s, stored in their dict form
+    and returned oldest first unless noted.
+    """
+
+    def __init__(self, user_id: str = "default", session_id: str = "default"):
+        self.user_id = user_id
+        self.session_id = session_id
+
+    @abstractmethod
+    def load_recent(self, limit: int) -> List[Interaction]:
+        """Return the `limit` most recent records, oldest first."""
+        pass
+
+    @abstractmethod
+    def append(self, record: Interaction) -> None:
+        """Persist a new record at the end of the conversation."""
+        pass
+
+    @abstractmethod
+    def page(self, offset: int = 0, limit: int = 50) -> List[Interaction]:
+        """
+        Return a page of records, newest first.
+
+        Args:
+            offset: Number of most recent records to skip.
+            limit: Maximum number of records to return.
+        """
+        pass
+
+    @abstractmethod
+    def iter_records(self, batch_size: int = 500) -> Iterator[Interaction]:
+        """Yield every stored record, oldest first, reading `batch_size` at a time."""
+        pass
+
+    @abstractmethod
+    def count(self) -> int:
+        """Return the number of stored records."""
+        pass
+
+    @abstractmethod
+    def clear(self) -> None:
+        """Delete every record of this conversation."""
+        pass
+
+    @abstractmethod
+    def load_summary(self) -> Optional[Dict]:
+        """Return the saved running-summary state of this conversation, if any."""
+        pass
+
+    @abstractmethod
+    def save_summary(self, state: Dict) -> None:
+        """Replace the running-summary state of this conversation."""
+        pass
+
+    def close(self) -> None:
+        """Release any open handles. Safe to call more than once."""
+        pass
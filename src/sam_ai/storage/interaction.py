@@ -0,0 +1,117 @@
+"""
+Compact record type for conversation turns.
+
+A turn used to be a dict holding an ISO-8601 timestamp string; a dict parsed
+from JSON also carries its own copies of the key strings. `Interaction` keeps
+the same fields in `__slots__`, with the timestamp as an integer, which cuts
+the per-turn overhead to a fraction. Stores read and write the plain dict
+form, so files on disk stay readable JSON.
+"""
+
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+# Field names, shared by every record instead of repeated per turn
+FIELDS = ("timestamp", "user", "assistant", "tokens")
+
+
+def now_ms() -> int:
+    """The current time in milliseconds since the Unix epoch."""
+    return time.time_ns() // 1_000_000
+
+
+def parse_timestamp(value: Any) -> int:
+    """
+    Milliseconds since the epoch from a stored timestamp: an integer, or an
+    ISO-8601 string as written by older versions. Unreadable values give 0.
+    """
+    if isinstance(value, int):
+        return value
+    if isinstance(value, float):
+        return int(value)
+    try:
+        return int(datetime.fromisoformat(value).timestamp() * 1000)
+    except (TypeError, ValueError):
+        return 0
+
+
+def format_timestamp(timestamp: int) -> str:
+    """The ISO-8601 local time of a millisecond timestamp, as older versions stored it."""
+    return datetime.fromtimestamp(timestamp / 1000).isoformat()
+
+
+class Interaction:
+    """
+    One user message and the assistant's reply.
+
+    Supports `record["user"]`-style reads and `.get()`, so code written for
+    the dict records keeps working.
+    """
+
+    __slots__ = FIELDS
+
+    def __init__(
+        self,
+        user: str,
+        assistant: str,
+        timestamp: Optional[int] = None,
+        tokens: Optional[int] = None,
+    ):
+        """
+        Args:
+            user: The user's message.
+            assistant: The reply.
+            timestamp: Milliseconds since the epoch. Defaults to now.
+            tokens: Cached token estimate of the pair, if already known.
+        """
+        self.timestamp = now_ms() if timestamp is None else timestamp
+        self.user = user
+        self.assistant = assistant
+        self.tokens = tokens
+
+    @classmethod
+    def from_dict(cls, record: Dict[str, Any]) -> "Interaction":
+        """Build from the stored dict form, including old ISO timestamps."""
+        return cls(
+            record.get("user", ""),
+            record.get("assistant", ""),
+            parse_timestamp(record.get("timestamp")),
+            record.get("tokens"),
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        """The dict form written to stores and exports."""
+        record = {"timestamp": self.timestamp, "user": self.user, "assistant": self.assistant}
+        if self.tokens is not None:
+            record["tokens"] = self.tokens
+        return record
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        if key not in FIELDS:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        value = getattr(self, key, None) if key in FIELDS else None
+        return default if value is None else value
+
+    def __eq__(self, other: Any) -> bool:
+        if not isinstance(other, Interaction):
+            return NotImplemented
+        return (self.timestamp, self.user, self.assistant) == (
+            other.timestamp, other.user, other.assistant
+        )
+
+    __hash__ = None  # Mutable (the token estimate is filled in lazily)
+
+    def __repr__(self) -> str:
+        return (
+            f"Interaction(user={self.user!r}, assistant={self.assistant!r}, "
+            f"timestamp={self.timestamp})"
+        )
@@ -0,0 +1,355 @@
+"""
+Append-only JSON-lines store for conversation memory.
+
+Each interaction is written as a single line appended to the log, so a turn
+costs one small write instead of rewriting the whole history. The log is
+periodically compacted down to the most recent `max_records` records, using a
+temporary file and an atomic rename so a crash can never leave a half-written
+file behind.
+
+Turns that compaction removes from the log move to gzip-compressed cold
+segments in a directory beside it (`<name>.cold/`), one segment per
+compaction. Only the log is read at startup; a segment is decompressed when
+paging or exporting reaches back into it.
+"""
+
+import gzip
+import json
+import logging
+import os
+import shutil
+import time
+from collections import deque
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .base_store import BaseStore
+from .interaction import Interaction
+
+logger = logging.getLogger(__name__)
+
+FSYNC_POLICIES = ("always", "interval", "never")
+
+
+def _dumps(record: Interaction) -> str:
+    return json.dumps(record.to_dict(), ensure_ascii=False, separators=(",", ":"))
+
+
+class JsonlStore(BaseStore):
+    """Append-only JSON-lines log with periodic compaction into compressed cold segments."""
+
+    def __init__(
+        self,
+        path: Path,
+        max_records: int = 20,
+        fsync_policy: str = "interval",
+        fsync_interval: float = 1.0,
+        compaction_threshold: int = 100,
+        legacy_path: Optional[Path] = None,
+        user_id: str = "default",
+        session_id: str = "default",
+        archive: bool = True,
+    ):
+        """
+        Args:
+            path: Location of the .jsonl log.
+            max_records: Number of most recent records retained by compaction.
+            fsync_policy: 'always' fsyncs after every append, 'interval' at most
+                once every `fsync_interval` seconds, 'never' leaves it to the OS.
+            fsync_interval: Seconds between fsyncs for the 'interval' policy.
+            compaction_threshold: Number of appends after which the log is
+                rewritten to the retained records.
+            legacy_path: Optional pretty-printed JSON file from older versions,
+                migrated into the log on first load.
+            user_id: Owner of the conversation.
+            session_id: Conversation identifier.
+            archive: Move compacted-away records to cold segments instead of
+                dropping them.
+        """
+        super().__init__(user_id, session_id)
+        if fsync_policy not in FSYNC_POLICIES:
+            raise ValueError(f"Unknown fsync policy: {fsync_policy}")
+
+        self.path = Path(path)
+        self.fsync_policy = fsync_policy
+        self.fsync_interval = fsync_interval
+        self.compaction_threshold = compaction_threshold
+        self.legacy_path = legacy_path
+        self.cold_path = self.path.with_suffix(".cold") if archive else None
+
+        # Retained records; the log on disk holds these plus recent appends
+        self._records = deque(maxlen=max_records)
+        # Records that left the retained window but are still only in the log,
+        # until the next compaction moves them to a cold segment
+        self._evicted: List[Interaction] = []
+        # The last cold segment read, as (path, records)
+        self._cold_cache: Optional[Tuple[Path, List[Interaction]]] = None
+        self._loaded = False
+        self._file = None
+        self._appends_since_compaction = 0
+        self._last_fsync = time.monotonic()
+
+    def load_recent(self, limit: int) -> List[Interaction]:
+        self._ensure_loaded()
+        return list(self._records)[-limit:] if limit > 0 else []
+
+    def _ensure_loaded(self) -> None:
+        if not self._loaded:
+            records = self.load()
+            overflow = len(records) - (self._records.maxlen or 0)
+            if overflow > 0:
+                self._retire(records[:overflow])
+            self._records.extend(records)
+            self._loaded = True
+
+    def _retire(self, records: List[Interaction]) -> None:
+        """Records leaving the retained window; archived at the next compaction."""
+        if self.cold_path is not None:
+            self._evicted.extend(records)
+
+    def load(self) -> List[Interaction]:
+        """
+        Read all records from the log.
+
+        Lines that cannot be decoded (e.g. a write torn by a crash) are skipped
+        rather than discarding the whole history; if any were found, the log is
+        compacted immediately so later appends start on a clean line.
+        """
+        if not self.path.exists():
+            return self._migrate_legacy()
+
+        records = []
+        corrupt_lines = 0
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    records.append(Interaction.from_dict(json.loads(line)))
+                except (json.JSONDecodeError, AttributeError):
+                    corrupt_lines += 1
+
+        if corrupt_lines:
+            logger.warning(
+                f"Skipped {corrupt_lines} unreadable line(s) in {self.path}; compacting"
+            )
+            self.compact(records)
+        return records
+
+    def _migrate_legacy(self) -> List[Interaction]:
+        """Convert a legacy JSON array file into the append-only log."""
+        if not self.legacy_path or not self.legacy_path.exists():
+            return []
+
+        try:
+            with open(self.legacy_path, "r", encoding="utf-8") as f:
+                records = [Interaction.from_dict(r) for r in json.load(f)]
+        except (json.JSONDecodeError, OSError, TypeError, AttributeError) as e:
+            logger.warning(f"Could not migrate legacy memory file {self.legacy_path}: {e}")
+            return []
+
+        self.compact(records)
+        self.legacy_path.replace(self.legacy_path.with_suffix(".json.bak"))
+        logger.info(f"Migrated {len(records)} interactions to {self.path}")
+        return records
+
+    def append(self, record: Interaction) -> None:
+        """Append a single record to the log, compacting it when it grows too long."""
+        self._ensure_loaded()
+        if len(self._records) == self._records.maxlen:
+            self._retire([self._records[0]])
+        self._records.append(record)
+
+        if self._file is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._file = open(self.path, "a", encoding="utf-8")
+
+        self._file.write(_dumps(record) + "\n")
+        self._file.flush()
+        self._appends_since_compaction += 1
+
+        if self.fsync_policy == "always":
+            self._fsync()
+        elif self.fsync_policy == "interval":
+            if time.monotonic() - self._last_fsync >= self.fsync_interval:
+                self._fsync()
+
+        if self.should_compact():
+            self.compact(self._records)
+
+    def _fsync(self) -> None:
+        os.fsync(self._file.fileno())
+        self._last_fsync = time.monotonic()
+
+    def should_compact(self) -> bool:
+        """Whether enough appends have accumulated to warrant a compaction."""
+        return self._appends_since_compaction >= self.compaction_threshold
+
+    def compact(self, records: Iterable[Interaction]) -> None:
+        """
+        Atomically replace the log with exactly `records`.
+
+        Records that have left the retained window are first written to a new
+        cold segment. The new contents are written and fsynced to a temporary
+        file which is then renamed over the log, so readers see either the old
+        or the new file, never a partial one. A crash between the two steps
+        can repeat those turns in the cold history, but never lose them.
+        """
+        self.close()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if self._evicted:
+            self._archive(self._evicted)
+            self._evicted = []
+        tmp_path = self.path.with_suffix(self.path.suffix + ".tmp")
+
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for record in records:
+                f.write(_dumps(record) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+        os.replace(tmp_path, self.path)
+        self._fsync_directory(self.path.parent)
+        self._appends_since_compaction = 0
+
+    @staticmethod
+    def _fsync_directory(directory: Path) -> None:
+        """Persist a rename itself (not supported on every platform)."""
+        if os.name != "posix":
+            return
+        fd = os.open(directory, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    # --- Cold segments ---
+
+    def _segments(self) -> List[Tuple[Path, int]]:
+        """(path, record count) of every cold segment, oldest first."""
+        if self.cold_path is None or not self.cold_path.is_dir():
+            return []
+        segments = []
+        for path in self.cold_path.glob("*.jsonl.gz"):
+            # Named <sequence>-<count>.jsonl.gz, so counting needs no decompression
+            try:
+                sequence, count = path.name.split(".")[0].split("-")
+                segments.append((int(sequence), path, int(count)))
+            except ValueError:
+                continue
+        return [(path, count) for _, path, count in sorted(segments)]
+
+    def _archive(self, records: List[Interaction]) -> None:
+        """Write `records` to a new compressed cold segment."""
+        segments = self._segments()
+        sequence = int(segments[-1][0].name.split("-")[0]) + 1 if segments else 1
+        self.cold_path.mkdir(parents=True, exist_ok=True)
+        path = self.cold_path / f"{sequence:06d}-{len(records)}.jsonl.gz"
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, "wb") as raw:
+            with gzip.GzipFile(fileobj=raw, mode="wb", mtime=0) as f:
+                f.write("".join(_dumps(r) + "\n" for r in records).encode("utf-8"))
+            raw.flush()
+            os.fsync(raw.fileno())
+        os.replace(tmp_path, path)
+        self._fsync_directory(self.cold_path)
+
+    def _read_segment(self, path: Path) -> List[Interaction]:
+        cached = self._cold_cache
+        if cached is not None and cached[0] == path:
+            return cached[1]
+        records = []
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        records.append(Interaction.from_dict(json.loads(line)))
+                    except (json.JSONDecodeError, AttributeError):
+                        continue
+        except (OSError, EOFError) as e:
+            logger.warning(f"Could not fully read cold segment {path}: {e}")
+        self._cold_cache = (path, records)
+        return records
+
+    # --- Reading history ---
+
+    def page(self, offset: int = 0, limit: int = 50) -> List[Interaction]:
+        self._ensure_loaded()
+        # Newest first: the retained window, the turns awaiting archiving,
+        # then the cold segments, decompressing only those the page reaches
+        hot = list(reversed(self._records)) + self._evicted[::-1]
+        result = hot[offset:offset + limit]
+        skip = max(0, offset - len(hot))
+        for path, count in reversed(self._segments()):
+            if len(result) >= limit:
+                break
+            if skip >= count:
+                skip -= count
+                continue
+            records = self._read_segment(path)[::-1]
+            result.extend(records[skip:skip + limit - len(result)])
+            skip = 0
+        return result
+
+    def iter_records(self, batch_size: int = 500) -> Iterator[Interaction]:
+        # Cold segments are decompressed one at a time; the rest is in memory
+        self._ensure_loaded()
+        for path, _ in self._segments():
+            yield from self._read_segment(path)
+        yield from self._evicted + list(self._records)
+
+    def count(self) -> int:
+        self._ensure_loaded()
+        cold = sum(count for _, count in self._segments())
+        return cold + len(self._evicted) + len(self._records)
+
+    @property
+    def _summary_path(self) -> Path:
+        return self.path.with_suffix(".summary.json")
+
+    def load_summary(self) -> Optional[Dict]:
+        try:
+            with open(self._summary_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+
+    def save_summary(self, state: Dict) -> None:
+        # Written beside the log with the same temp-file-and-rename pattern
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self._summary_path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f, ensure_ascii=False)
+            f.flush()
+            if self.fsync_policy != "never":
+                os.fsync(f.fileno())
+        os.replace(tmp_path, self._summary_path)
+
+    def clear(self) -> None:
+        """Delete the log, its cold segments and its summary."""
+        self.close()
+        self._records.clear()
+        self._evicted = []
+        self._cold_cache = None
+        if self.cold_path is not None:
+            shutil.rmtree(self.cold_path, ignore_errors=True)
+        self._loaded = True
+        self._appends_since_compaction = 0
+        for path in (self.path, self._summary_path):
+            try:
+                if path.exists():
+                    path.unlink()
+            except OSError:
+                pass
+
+    def close(self) -> None:
+        """Flush, fsync and close the append handle if it is open."""
+        if self._file is not None:
+            try:
+                self._file.flush()
+                if self.fsync_policy != "never":
+                    os.fsync(self._file.fileno())
+            finally:
+                self._file.close()
+                self._file = None
@@ -0,0 +1,187 @@
+"""
+SQLite-backed conversation store.
+
+All conversations live in one database file, keyed by user id and session id,
+so a single process can host many sessions while only loading the turns it
+actually needs. The database runs in WAL mode so readers never block the
+writer, and several worker processes can share the same file.
+"""
+
+import json
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+from .base_store import BaseStore
+from .interaction import Interaction, format_timestamp
+
+# Maps the memory fsync policy onto SQLite's durability levels
+_SYNCHRONOUS = {"always": "FULL", "interval": "NORMAL", "never": "OFF"}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS interactions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT NOT NULL,
+    session_id TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    record TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_interactions_session
+    ON interactions (user_id, session_id, id);
+CREATE INDEX IF NOT EXISTS idx_interactions_session_timestamp
+    ON interactions (user_id, session_id, timestamp);
+CREATE INDEX IF NOT EXISTS idx_interactions_timestamp
+    ON interactions (timestamp);
+CREATE TABLE IF NOT EXISTS summaries (
+    user_id TEXT NOT NULL,
+    session_id TEXT NOT NULL,
+    state TEXT NOT NULL,
+    PRIMARY KEY (user_id, session_id)
+);
+"""
+
+# sqlite3 connections must not be shared across threads, so each thread keeps
+# one connection per database file, reused by every store pointing at it.
+_local = threading.local()
+_initialized_paths = set()
+_init_lock = threading.Lock()
+
+
+def get_connection(db_path: Path, fsync_policy: str = "interval") -> sqlite3.Connection:
+    """Return this thread's connection to `db_path`, creating the schema once."""
+    key = str(Path(db_path).resolve())
+    connections = getattr(_local, "connections", None)
+    if connections is None:
+        connections = _local.connections = {}
+
+    conn = connections.get(key)
+    if conn is None:
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(key, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(f"PRAGMA synchronous={_SYNCHRONOUS.get(fsync_policy, 'NORMAL')}")
+        with _init_lock:
+            if key not in _initialized_paths:
+                conn.executescript(_SCHEMA)
+                _initialized_paths.add(key)
+        connections[key] = conn
+    return conn
+
+
+class SQLiteStore(BaseStore):
+    """Conversation store backed by a shared SQLite database."""
+
+    def __init__(
+        self,
+        db_path: Path,
+        user_id: str = "default",
+        session_id: str = "default",
+        fsync_policy: str = "interval",
+    ):
+        """
+        Args:
+            db_path: Location of the SQLite database file.
+            user_id: Owner of the conversation.
+            session_id: Conversation identifier.
+            fsync_policy: Memory fsync policy, mapped onto PRAGMA synchronous.
+        """
+        super().__init__(user_id, session_id)
+        self.db_path = Path(db_path)
+        self.fsync_policy = fsync_policy
+
+    @property
+    def _conn(self) -> sqlite3.Connection:
+        return get_connection(self.db_path, self.fsync_policy)
+
+    def load_recent(self, limit: int) -> List[Interaction]:
+        records = self.page(0, limit)
+        records.reverse()
+        return records
+
+    def append(self, record: Interaction) -> None:
+        with self._conn:
+            self._conn.execute(
+                "INSERT INTO interactions (user_id, session_id, timestamp, record) "
+                "VALUES (?, ?, ?, ?)",
+                (
+                    self.user_id,
+                    self.session_id,
+                    # The column keeps the ISO form, so it sorts with older rows
+                    format_timestamp(record.timestamp),
+                    json.dumps(record.to_dict(), ensure_ascii=False, separators=(",", ":")),
+                ),
+            )
+
+    def page(self, offset: int = 0, limit: int = 50) -> List[Interaction]:
+        rows = self._conn.execute(
+            "SELECT record FROM interactions WHERE user_id = ? AND session_id = ? "
+            "ORDER BY id DESC LIMIT ? OFFSET ?",
+            (self.user_id, self.session_id, limit, offset),
+        ).fetchall()
+        return [Interaction.from_dict(json.loads(row[0])) for row in rows]
+
+    def iter_records(self, batch_size: int = 500) -> Iterator[Interaction]:
+        # Keyset pagination keeps each batch an index range scan
+        last_id = 0
+        while True:
+            rows = self._conn.execute(
+                "SELECT id, record FROM interactions "
+                "WHERE user_id = ? AND session_id = ? AND id > ? "
+                "ORDER BY id LIMIT ?",
+                (self.user_id, self.session_id, last_id, batch_size),
+            ).fetchall()
+            if not rows:
+                return
+            for row_id, record in rows:
+                yield Interaction.from_dict(json.loads(record))
+            last_id = rows[-1][0]
+
+    def count(self) -> int:
+        return self._conn.execute(
+            "SELECT COUNT(*) FROM interactions WHERE user_id = ? AND session_id = ?",
+            (self.user_id, self.session_id),
+        ).fetchone()[0]
+
+    def load_summary(self) -> Optional[Dict]:
+        row = self._conn.execute(
+            "SELECT state FROM summaries WHERE user_id = ? AND session_id = ?",
+            (self.user_id, self.session_id),
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save_summary(self, state: Dict) -> None:
+        with self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO summaries (user_id, session_id, state) "
+                "VALUES (?, ?, ?)",
+                (self.user_id, self.session_id, json.dumps(state, ensure_ascii=False)),
+            )
+
+    def clear(self) -> None:
+        with self._conn:
+            for table in ("interactions", "summaries"):
+                self._conn.execute(
+                    f"DELETE FROM {table} WHERE user_id = ? AND session_id = ?",
+                    (self.user_id, self.session_id),
+                )
+
+    def list_sessions(self, user_id: str = None) -> List[Dict]:
+        """List stored sessions with their size and last activity, most recent first."""
+        query = (
+            "SELECT user_id, session_id, COUNT(*), MAX(timestamp) FROM interactions "
+        )
+        params = ()
+        if user_id is not None:
+            query += "WHERE user_id = ? "
+            params = (user_id,)
+        query += "GROUP BY user_id, session_id ORDER BY MAX(timestamp) DESC"
+        return [
+            {
+                "user_id": row[0],
+                "session_id": row[1],
+                "interactions": row[2],
+                "last_activity": row[3],
+            }
+            for row in self._conn.execute(query, params).fetchall()
+        ]
@@ -1,23 +1,49 @@
 """
 Tool system for Sam AI's agent mode.
+
+Built-in tools are registered by import path, so their modules are only
+imported when a tool is first used. See `registry` for adding more.
 """
 
-from src.sam_ai.tools.example_tools import calculator, get_current_time, read_file
-
-# Registry of available tools
-TOOL_REGISTRY = {
-    "calculator": {
-        "function": calculator,
-        "description": "Perform mathematical calculations. Input should be a mathematical expression as a string."
-    },
-    "get_current_time": {
-        "function": get_current_time,
-        "description": "Get the current date and time."
-    },
-    "read_file": {
-        "function": read_file,
-        "description": "Read the contents of a text file. Input should be the file path."
-    }
+from .registry import TOOL_REGISTRY, ToolRegistry, function_schema, tool
+from .executor import ToolExecutor
+
+TOOL_REGISTRY.register_lazy(
+    "calculator",
+    f"{__name__}.example_tools:calculator",
+    description="Perform mathematical calculations. Supports + - * / // % **, parentheses, pi, e and functions such as sqrt, log, sin, abs, min and max. Pass several expressions at once with 'expressions', and bind names to numbers or lists of numbers with 'variables' to evaluate over many values in one call.",
+)
+TOOL_REGISTRY.register_lazy(
+    "get_current_time",
+    f"{__name__}.example_tools:get_current_time",
+)
+TOOL_REGISTRY.register_lazy(
+    "read_file",
+    f"{__name__}.file_tools:read_file",
+    description="Read part of a text file without loading all of it. Use head or tail for the first or last lines, start_line/end_line for a line range, offset/length for a byte range, or pattern to list matching lines with their line numbers. Large results are truncated.",
+    timeout=10,
+    stream=f"{__name__}.file_tools:stream_file",
+)
+
+# Tool functions are importable from the package, loaded on first access
+_LAZY_ATTRIBUTES = {
+    "calculator": "example_tools",
+    "get_current_time": "example_tools",
+    "read_file": "file_tools",
+    "stream_file": "file_tools",
 }
 
-__all__ = ['TOOL_REGISTRY', 'calculator', 'get_current_time', 'read_file']
\ No newline at end of file
+
+def __getattr__(name):
+    if name in _LAZY_ATTRIBUTES:
+        import importlib
+
+        module = importlib.import_module(f"{__name__}.{_LAZY_ATTRIBUTES[name]}")
+        return getattr(module, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+__all__ = [
+    'TOOL_REGISTRY', 'ToolExecutor', 'ToolRegistry', 'function_schema', 'tool',
+    'calculator', 'get_current_time', 'read_file', 'stream_file',
+]
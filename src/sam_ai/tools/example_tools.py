@@ -3,30 +3,46 @@ Example tools for Sam AI's agent mode.
 """
 
 import datetime
-from pathlib import Path
-from typing import Dict, Any
+from typing import Dict, Any, List
 
-def calculator(expression: str) -> Dict[str, Any]:
+from .expression import ExpressionError, evaluate
+
+def calculator(
+    expression: str = None,
+    expressions: List[str] = None,
+    variables: Dict[str, Any] = None,
+) -> Dict[str, Any]:
     """
-    Evaluate a mathematical expression safely.
+    Evaluate mathematical expressions safely.
+    
+    Expressions are parsed and compiled by `expression.compile_expression`,
+    never passed to `eval`, and are bounded in operand size and exponent.
     
     Args:
         expression: Mathematical expression as string
+        expressions: Several expressions to evaluate in one call
+        variables: Values for names used in the expressions; list values are
+            evaluated element-wise (vectorized)
         
     Returns:
-        Dictionary with result or error
+        Dictionary with result or error, or with one entry per expression
+        under "results" when `expressions` is given
     """
+    if expressions is None:
+        if expression is None:
+            return {"error": "Provide an expression or a list of expressions"}
+        return _calculate(expression, variables)
+    
+    return {"results": [_calculate(e, variables) for e in expressions]}
+
+def _calculate(expression: str, variables: Dict[str, Any] = None) -> Dict[str, Any]:
     try:
-        # Very basic safe evaluation - in production, use a proper safe eval library
-        allowed_chars = set('0123456789+-*/(). ')
-        if not all(c in allowed_chars for c in expression):
-            return {"error": "Invalid characters in expression"}
-            
-        result = eval(expression, {"__builtins__": {}}, {})
+        result = evaluate(expression, variables)
         return {"result": result, "expression": expression}
-        
+    except ExpressionError as e:
+        return {"error": f"Invalid expression: {str(e)}", "expression": expression}
     except Exception as e:
-        return {"error": f"Calculation error: {str(e)}"}
+        return {"error": f"Calculation error: {str(e)}", "expression": expression}
 
 def get_current_time() -> Dict[str, Any]:
     """Get the current date and time."""
@@ -35,27 +51,3 @@ def get_current_time() -> Dict[str, Any]:
         "current_time": now.isoformat(),
         "formatted": now.strftime("%Y-%m-%d %H:%M:%S")
     }
-
-def read_file(file_path: str) -> Dict[str, Any]:
-    """
-    Read the contents of a text file.
-    
-    Args:
-        file_path: Path to the file to read
-        
-    Returns:
-        Dictionary with file content or error
-    """
-    try:
-        path = Path(file_path)
-        if not path.exists():
-            return {"error": f"File not found: {file_path}"}
-            
-        if not path.is_file():
-            return {"error": f"Path is not a file: {file_path}"}
-            
-        content = path.read_text(encoding='utf-8')
-        return {"content": content, "file_path": str(path)}
-        
-    except Exception as e:
-        return {"error": f"Error reading file: {str(e)}"}
\ No newline at end of file
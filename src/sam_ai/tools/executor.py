@@ -0,0 +1,157 @@
+"""
+Tool executor for Sam AI's agent mode.
+
+Runs the tool calls requested by the model. Calls from the same model turn are
+independent, so they run concurrently on a shared thread pool, each bounded by
+its own timeout.
+"""
+
+import inspect
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from typing import Any, Dict, Iterator, List, Optional
+
+from ..config import settings
+from .registry import ToolRegistry
+
+logger = logging.getLogger(__name__)
+
+# Shared by every executor so concurrent conversations can't multiply threads
+_pool: Optional[ThreadPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool() -> ThreadPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(
+                max_workers=settings.tool_max_workers, thread_name_prefix="sam-tool"
+            )
+        return _pool
+
+
+def _accepts(function, arguments: Dict[str, Any]) -> bool:
+    """Whether `function` can be called with `arguments` as keyword arguments."""
+    try:
+        inspect.signature(function).bind(**arguments)
+    except TypeError:
+        return False
+    return True
+
+
+class ToolExecutor:
+    """Exposes registered tools to the model and runs the calls it makes."""
+
+    def __init__(self, registry: Dict[str, Dict[str, Any]] = None):
+        """
+        Args:
+            registry: Mapping of tool name to its entry ("function", "description",
+                "parameters" JSON schema and optional "timeout" in seconds).
+                Defaults to `TOOL_REGISTRY`.
+        """
+        if registry is None:
+            from .registry import TOOL_REGISTRY
+
+            registry = TOOL_REGISTRY
+        self.registry = registry
+
+    def tool_schemas(self) -> List[Dict[str, Any]]:
+        """Tool definitions in the function-calling format shared by OpenAI and Ollama."""
+        if isinstance(self.registry, ToolRegistry):
+            return self.registry.schemas()
+        return [
+            {
+                "type": "function",
+                "function": {
+                    "name": name,
+                    "description": entry["description"],
+                    "parameters": entry.get(
+                        "parameters", {"type": "object", "properties": {}}
+                    ),
+                },
+            }
+            for name, entry in self.registry.items()
+        ]
+
+    def _timeout(self, name: str) -> float:
+        if isinstance(self.registry, ToolRegistry):
+            timeout = self.registry.timeout(name)
+        else:
+            timeout = self.registry.get(name, {}).get("timeout")
+        return settings.tool_timeout if timeout is None else timeout
+
+    def _entry(self, name: str) -> Optional[Dict[str, Any]]:
+        try:
+            return self.registry.get(name)
+        except Exception as e:
+            # A lazily registered tool whose module fails to import
+            logger.error(f"Could not load tool {name}: {e}")
+            return {"function": None, "error": f"Tool {name} could not be loaded: {e}"}
+
+    def stream(self, name: str, arguments: Dict[str, Any]) -> Iterator[Any]:
+        """
+        Run one tool, yielding its output incrementally.
+
+        Tools registered with a "stream" generator (e.g. `read_file`) yield
+        chunks as they are produced. Any other tool, or arguments the generator
+        doesn't take (such as `read_file`'s `tail`), yield the single result.
+        Failures are yielded as an {"error": ...} result, as `execute` reports them.
+        """
+        entry = self._entry(name)
+        stream = entry.get("stream") if entry else None
+        if stream is None or not _accepts(stream, arguments):
+            yield self._run(name, arguments)
+            return
+        try:
+            yield from stream(**arguments)
+        except Exception as e:
+            yield {"error": f"Tool {name} failed: {e}"}
+
+    def _run(self, name: str, arguments: Dict[str, Any]) -> Any:
+        entry = self._entry(name)
+        if entry is None:
+            return {"error": f"Unknown tool: {name}"}
+        if "error" in entry:
+            return {"error": entry["error"]}
+        try:
+            return entry["function"](**arguments)
+        except TypeError as e:
+            return {"error": f"Invalid arguments for {name}: {e}"}
+        except Exception as e:
+            return {"error": f"Tool {name} failed: {e}"}
+
+    def execute(self, tool_calls: List[Dict[str, Any]]) -> List[Any]:
+        """
+        Run tool calls concurrently and return their results in the same order.
+
+        Args:
+            tool_calls: Dicts with "name" and "arguments" (a dict), as returned
+                by `BaseProvider.chat_with_tools`.
+
+        Returns:
+            One result per call. Failures and timeouts are reported as
+            {"error": ...} results so the model can see and recover from them.
+        """
+        start = time.monotonic()
+        futures = [
+            _get_pool().submit(self._run, call["name"], call.get("arguments") or {})
+            for call in tool_calls
+        ]
+
+        results = []
+        for call, future in zip(tool_calls, futures):
+            timeout = self._timeout(call["name"])
+            # Each call gets its own deadline measured from submission, so the
+            # whole batch takes at most as long as the slowest allowed tool
+            remaining = max(0.0, start + timeout - time.monotonic())
+            try:
+                results.append(future.result(timeout=remaining))
+            except TimeoutError:
+                # Python threads can't be interrupted; the call is abandoned and
+                # finishes in the background
+                logger.warning(f"Tool {call['name']} timed out after {timeout}s")
+                results.append({"error": f"Tool {call['name']} timed out after {timeout}s"})
+        return results
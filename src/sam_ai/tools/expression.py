@@ -0,0 +1,230 @@
+"""
+Safe arithmetic expression engine for Sam AI's calculator tool.
+
+Expressions are parsed into an AST, checked against a whitelist of nodes, and
+compiled into nested Python closures that are cached per expression string.
+Nothing is passed to `eval`. Integer arithmetic is bounded by operand size and
+exponent limits, so inputs like `9**9**9` fail immediately instead of pinning
+a worker thread. Variables bound to lists are evaluated as NumPy arrays, so a
+whole batch of values is computed in one vectorized pass.
+"""
+
+import ast
+import math
+import operator
+from functools import lru_cache, reduce
+from typing import Any, Callable, Dict
+
+import numpy as np
+
+# Limits on what a single expression may compute
+MAX_EXPRESSION_LENGTH = 1000
+MAX_INT_BITS = 4096  # Largest integer operand or result, in bits (~1233 digits)
+MAX_EXPONENT = 10000
+MAX_ROUND_DIGITS = 100  # round(1, -10**7) takes seconds
+
+CONSTANTS = {"pi": math.pi, "e": math.e, "tau": math.tau}
+
+
+def _elementwise(ufunc: Callable) -> Callable:
+    """Apply a binary NumPy ufunc across any number of arguments, e.g. min(x, y, z)."""
+    return lambda *values: reduce(ufunc, values)
+
+
+def _bounded_round(round_function: Callable) -> Callable:
+    """Reject `ndigits` far beyond any float's precision, e.g. round(1, -10**7)."""
+    def bounded(number, ndigits=None):
+        if ndigits is None:
+            return round_function(number)
+        if isinstance(ndigits, int) and abs(ndigits) > MAX_ROUND_DIGITS:
+            raise ExpressionError(f"round() digits {ndigits} exceed {MAX_ROUND_DIGITS}")
+        return round_function(number, ndigits)
+    return bounded
+
+
+# name -> (scalar implementation, array implementation)
+FUNCTIONS = {
+    "abs": (abs, np.abs),
+    "round": (_bounded_round(round), _bounded_round(np.round)),
+    "min": (min, _elementwise(np.minimum)),
+    "max": (max, _elementwise(np.maximum)),
+    "sqrt": (math.sqrt, np.sqrt),
+    "exp": (math.exp, np.exp),
+    "log": (math.log, np.log),
+    "log10": (math.log10, np.log10),
+    "log2": (math.log2, np.log2),
+    "sin": (math.sin, np.sin),
+    "cos": (math.cos, np.cos),
+    "tan": (math.tan, np.tan),
+    "asin": (math.asin, np.arcsin),
+    "acos": (math.acos, np.arccos),
+    "atan": (math.atan, np.arctan),
+    "floor": (math.floor, np.floor),
+    "ceil": (math.ceil, np.ceil),
+}
+
+Evaluator = Callable[[Dict[str, Any]], Any]
+
+
+class ExpressionError(ValueError):
+    """Raised for expressions that are invalid, unsupported or too expensive."""
+
+
+def _check_int(value: Any) -> Any:
+    if isinstance(value, int) and value.bit_length() > MAX_INT_BITS:
+        raise ExpressionError(f"Result exceeds {MAX_INT_BITS} bits")
+    return value
+
+
+def _power(base: Any, exponent: Any) -> Any:
+    if isinstance(exponent, (int, float)) and abs(exponent) > MAX_EXPONENT:
+        raise ExpressionError(f"Exponent {exponent} exceeds {MAX_EXPONENT}")
+    if isinstance(base, int) and isinstance(exponent, int) and exponent > 0:
+        # |base| >= 2**(bits - 1), so this is the fewest bits the result can have
+        if (base.bit_length() - 1) * exponent + 1 > MAX_INT_BITS:
+            raise ExpressionError(f"Result exceeds {MAX_INT_BITS} bits")
+    result = base ** exponent
+    if isinstance(result, complex):
+        raise ExpressionError("Result is not a real number")
+    return result
+
+
+def _multiply(left: Any, right: Any) -> Any:
+    if isinstance(left, int) and isinstance(right, int):
+        if left.bit_length() + right.bit_length() > MAX_INT_BITS:
+            raise ExpressionError(f"Result exceeds {MAX_INT_BITS} bits")
+    return left * right
+
+
+BINARY_OPERATORS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: _multiply,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+    ast.Mod: operator.mod,
+    ast.Pow: _power,
+}
+
+UNARY_OPERATORS = {
+    ast.UAdd: operator.pos,
+    ast.USub: operator.neg,
+}
+
+
+def _compile_node(node: ast.AST) -> Evaluator:
+    """Translate a whitelisted AST node into a closure over its operands."""
+    if isinstance(node, ast.Constant):
+        value = node.value
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise ExpressionError(f"Unsupported literal: {value!r}")
+        _check_int(value)
+        return lambda env: value
+
+    if isinstance(node, ast.Name):
+        name = node.id
+        if name in CONSTANTS:
+            value = CONSTANTS[name]
+            return lambda env: value
+
+        def lookup(env):
+            try:
+                return env[name]
+            except KeyError:
+                raise ExpressionError(f"Unknown name: {name}")
+
+        return lookup
+
+    if isinstance(node, ast.BinOp) and type(node.op) in BINARY_OPERATORS:
+        op = BINARY_OPERATORS[type(node.op)]
+        left, right = _compile_node(node.left), _compile_node(node.right)
+        return lambda env: _check_int(op(left(env), right(env)))
+
+    if isinstance(node, ast.UnaryOp) and type(node.op) in UNARY_OPERATORS:
+        op = UNARY_OPERATORS[type(node.op)]
+        operand = _compile_node(node.operand)
+        return lambda env: op(operand(env))
+
+    if isinstance(node, ast.Call):
+        if not isinstance(node.func, ast.Name) or node.func.id not in FUNCTIONS:
+            raise ExpressionError(f"Unsupported function: {ast.unparse(node.func)}")
+        if node.keywords:
+            raise ExpressionError("Keyword arguments are not supported")
+        scalar_fn, array_fn = FUNCTIONS[node.func.id]
+        args = [_compile_node(arg) for arg in node.args]
+
+        def call(env):
+            values = [arg(env) for arg in args]
+            if any(isinstance(v, np.ndarray) for v in values):
+                return array_fn(*values)
+            return scalar_fn(*values)
+
+        return call
+
+    raise ExpressionError(f"Unsupported syntax: {type(node).__name__}")
+
+
+@lru_cache(maxsize=512)
+def compile_expression(expression: str) -> Evaluator:
+    """
+    Parse and compile `expression`, caching the result per expression string.
+
+    Returns:
+        A function taking a dict of variable values and returning the result.
+
+    Raises:
+        ExpressionError: If the expression is too long, malformed or uses
+            anything other than arithmetic, whitelisted functions and names.
+    """
+    if len(expression) > MAX_EXPRESSION_LENGTH:
+        raise ExpressionError(f"Expression longer than {MAX_EXPRESSION_LENGTH} characters")
+    try:
+        tree = ast.parse(expression.strip(), mode="eval")
+    except (SyntaxError, ValueError, RecursionError, MemoryError) as e:
+        raise ExpressionError(f"Invalid expression: {e}")
+    return _compile_node(tree.body)
+
+
+def evaluate(expression: str, variables: Dict[str, Any] = None) -> Any:
+    """
+    Evaluate an arithmetic expression.
+
+    Args:
+        expression: e.g. "sqrt(x**2 + y**2)".
+        variables: Values for names used in the expression. Lists are converted
+            to float arrays and evaluated element-wise in one vectorized pass.
+
+    Returns:
+        An int or float, or a list of floats when any variable is a list.
+
+    Raises:
+        ExpressionError: For invalid or over-limit expressions.
+        ArithmeticError: For division by zero, overflow and domain errors.
+    """
+    env = {}
+    for name, value in (variables or {}).items():
+        if isinstance(value, (list, tuple, np.ndarray)):
+            try:
+                value = np.asarray(value, dtype=np.float64)
+            except (OverflowError, TypeError, ValueError):
+                raise ExpressionError(f"Variable {name} must be a list of finite numbers")
+        elif isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise ExpressionError(f"Variable {name} must be a number or a list of numbers")
+        elif isinstance(value, int) and value.bit_length() > MAX_INT_BITS:
+            # Bound like literals, so a variable can't carry a huge operand in
+            raise ExpressionError(f"Variable {name} exceeds {MAX_INT_BITS} bits")
+        env[name] = value
+
+    try:
+        with np.errstate(divide="raise", over="raise", invalid="raise"):
+            result = compile_expression(expression)(env)
+    except FloatingPointError as e:
+        raise ArithmeticError(str(e))
+    except RecursionError:
+        raise ExpressionError("Expression is nested too deeply")
+
+    if isinstance(result, np.ndarray):
+        return result.tolist()
+    if isinstance(result, np.generic):
+        return result.item()
+    return result
@@ -0,0 +1,308 @@
+"""
+File tools for Sam AI's agent mode.
+
+Files are never loaded whole: reads are limited to a byte range, a line range,
+the first or last lines, or the lines matching a pattern, and every result is
+capped at `settings.tool_read_max_bytes` so large logs can't exhaust memory or
+flood the prompt. Pattern search runs over a memory map of the file.
+"""
+
+import codecs
+import mmap
+import re
+from collections import deque
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional
+
+from ..config import settings
+
+# Byte-order marks, longest first so UTF-32 LE isn't mistaken for UTF-16 LE
+_BOMS = [
+    (codecs.BOM_UTF32_LE, "utf-32"),
+    (codecs.BOM_UTF32_BE, "utf-32"),
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+]
+
+# Encodings where b"\n" and ASCII pattern bytes mean the same thing as in text
+_ASCII_COMPATIBLE = {"utf-8", "utf-8-sig", "ascii", "latin-1", "iso8859-1"}
+
+
+def sniff_encoding(path: Path, sample_size: int = 8192) -> Optional[str]:
+    """
+    Guess a file's text encoding from its first `sample_size` bytes.
+
+    Returns:
+        The encoding name, or None if the file looks binary.
+    """
+    with open(path, "rb") as f:
+        sample = f.read(sample_size)
+
+    for bom, encoding in _BOMS:
+        if sample.startswith(bom):
+            return encoding
+    if b"\x00" in sample:
+        return None
+    try:
+        sample.decode("utf-8")
+    except UnicodeDecodeError as e:
+        # A multi-byte character cut off by the end of the sample is still UTF-8
+        if e.start < len(sample) - 3:
+            return "latin-1"
+    return "utf-8"
+
+
+def _is_ascii_compatible(encoding: str) -> bool:
+    return codecs.lookup(encoding).name in _ASCII_COMPATIBLE
+
+
+def _open_text(path: Path, encoding: str):
+    return open(path, "r", encoding=encoding, errors="replace", newline="")
+
+
+def stream_file(
+    file_path: str,
+    offset: int = 0,
+    length: Optional[int] = None,
+    chunk_size: int = 65536,
+    encoding: Optional[str] = None,
+) -> Iterator[str]:
+    """
+    Yield a file's text in chunks, without holding more than one chunk in memory.
+
+    Args:
+        file_path: Path to the file to read
+        offset: Byte offset to start from
+        length: Maximum bytes to read (default: to the end of the file)
+        chunk_size: Bytes decoded per chunk, at most `settings.tool_read_max_bytes`
+        encoding: Text encoding (default: sniffed from the file)
+    """
+    path = Path(file_path)
+    chunk_size = max(1, min(chunk_size, settings.tool_read_max_bytes))
+    encoding = encoding or sniff_encoding(path) or "latin-1"
+    decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+    remaining = float("inf") if length is None else length
+
+    with open(path, "rb") as f:
+        f.seek(offset)
+        while remaining > 0:
+            data = f.read(int(min(chunk_size, remaining)))
+            if not data:
+                break
+            remaining -= len(data)
+            text = decoder.decode(data)
+            if text:
+                yield text
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+
+def _read_range(path: Path, encoding: str, offset: int, length: int, cap: int) -> Dict[str, Any]:
+    content = "".join(stream_file(path, offset, min(length, cap), encoding=encoding))
+    return {"content": content, "offset": offset, "truncated": length > cap}
+
+
+def _skip_line(f, chunk_size: int = 65536) -> bool:
+    """Move past one line in bounded reads, however long it is. False at end of file."""
+    piece = f.readline(chunk_size)
+    if not piece:
+        return False
+    while not piece.endswith(("\n", "\r")):
+        piece = f.readline(chunk_size)
+        if not piece:
+            break
+    return True
+
+
+def _read_lines(path: Path, encoding: str, start: int, end: Optional[int], cap: int) -> Dict[str, Any]:
+    """
+    Lines `start`..`end` (1-based, inclusive), up to `cap` characters.
+
+    Every read is bounded, so a file with one enormous line is never loaded whole.
+    """
+    lines = []
+    used = 0
+    number = 0
+    last = start - 1
+    truncated = False
+    with _open_text(path, encoding) as f:
+        while end is None or number < end:
+            if number + 1 < start:
+                if not _skip_line(f):
+                    break
+                number += 1
+                continue
+            # One character past the budget shows whether the line fits
+            line = f.readline(cap - used + 1)
+            if not line:
+                break
+            if len(line) > cap - used:
+                truncated = True
+                break
+            number += 1
+            lines.append(line)
+            used += len(line)
+            last = number
+    return {
+        "content": "".join(lines),
+        "start_line": start,
+        "end_line": last,
+        "truncated": truncated,
+    }
+
+
+def _read_tail(path: Path, encoding: str, count: int, cap: int) -> Dict[str, Any]:
+    """The last `count` lines, read backwards from the end of the file."""
+    if count <= 0:
+        return {"content": "", "truncated": False}
+    if not _is_ascii_compatible(encoding):
+        with _open_text(path, encoding) as f:
+            lines = list(deque(f, maxlen=count))
+        content = "".join(lines)
+        return {"content": content[-cap:], "truncated": len(content) > cap}
+
+    block_size = 65536
+    with open(path, "rb") as f:
+        position = f.seek(0, 2)
+        data = b""
+        # One extra newline: the file's final line break doesn't start a line
+        while position > 0 and data.count(b"\n") <= count and len(data) <= cap:
+            step = min(block_size, position)
+            position -= step
+            f.seek(position)
+            data = f.read(step) + data
+
+    lines = data.splitlines(keepends=True)
+    if position > 0:
+        lines = lines[1:]  # Partial first line
+    data = b"".join(lines[-count:])
+    truncated = len(data) > cap
+    return {"content": data[-cap:].decode(encoding, errors="replace"), "truncated": truncated}
+
+
+def _count_newlines(mm: mmap.mmap, start: int, end: int, block_size: int = 65536) -> int:
+    """Line breaks in `mm[start:end]`, counted a block at a time."""
+    count = 0
+    for position in range(start, end, block_size):
+        count += mm[position:min(position + block_size, end)].count(b"\n")
+    return count
+
+
+def _grep(path: Path, encoding: str, pattern: str, max_matches: int, cap: int) -> Dict[str, Any]:
+    """Lines matching `pattern`, with 1-based line numbers."""
+    matches = []
+    used = 0
+    truncated = False
+
+    if not _is_ascii_compatible(encoding):
+        regex = re.compile(pattern)
+        with _open_text(path, encoding) as f:
+            for number, line in enumerate(f, 1):
+                if regex.search(line):
+                    if len(matches) >= max_matches or used + len(line) > cap:
+                        truncated = True
+                        break
+                    matches.append({"line": number, "text": line.rstrip("\r\n")})
+                    used += len(line)
+        return {"matches": matches, "truncated": truncated}
+
+    # Encoding the pattern as utf-8-sig would put the file's BOM in front of it
+    pattern_encoding = "utf-8" if codecs.lookup(encoding).name == "utf-8-sig" else encoding
+    regex = re.compile(pattern.encode(pattern_encoding), re.MULTILINE)
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        line_number = 1
+        counted_to = 0
+        next_line = 0
+        for match in regex.finditer(mm):
+            if match.start() < next_line:
+                continue  # Another match on a line already reported
+            line_start = mm.rfind(b"\n", 0, match.start()) + 1
+            line_end = mm.find(b"\n", match.end())
+            if line_end == -1:
+                line_end = len(mm)
+            if len(matches) >= max_matches or used + line_end - line_start > cap:
+                truncated = True
+                break
+            line_number += _count_newlines(mm, counted_to, line_start)
+            counted_to = line_start
+            text = mm[line_start:line_end].rstrip(b"\r").decode(encoding, errors="replace")
+            matches.append({"line": line_number, "text": text})
+            used += line_end - line_start
+            next_line = line_end + 1
+    return {"matches": matches, "truncated": truncated}
+
+
+def read_file(
+    file_path: str,
+    offset: Optional[int] = None,
+    length: Optional[int] = None,
+    start_line: Optional[int] = None,
+    end_line: Optional[int] = None,
+    head: Optional[int] = None,
+    tail: Optional[int] = None,
+    pattern: Optional[str] = None,
+    max_matches: int = 100,
+    encoding: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Read part of a text file.
+
+    Exactly one way of selecting content is used, in this order: `pattern`,
+    `tail`, `head`, `start_line`/`end_line`, `offset`/`length`. Without any,
+    the file is read from the start. Results never exceed
+    `settings.tool_read_max_bytes`; "truncated" says whether more was available.
+
+    Args:
+        file_path: Path to the file to read
+        offset: Byte offset to start reading at
+        length: Number of bytes to read
+        start_line: First line to return (1-based)
+        end_line: Last line to return (inclusive)
+        head: Return the first `head` lines
+        tail: Return the last `tail` lines
+        pattern: Regular expression; return the matching lines with line numbers
+        max_matches: Maximum matching lines returned for `pattern`
+        encoding: Text encoding (default: sniffed from the file)
+
+    Returns:
+        Dictionary with file content (or matches) or error
+    """
+    try:
+        path = Path(file_path)
+        if not path.exists():
+            return {"error": f"File not found: {file_path}"}
+
+        if not path.is_file():
+            return {"error": f"Path is not a file: {file_path}"}
+
+        size = path.stat().st_size
+        encoding = encoding or sniff_encoding(path)
+        if encoding is None:
+            return {"error": f"Not a text file: {file_path}"}
+        cap = settings.tool_read_max_bytes
+
+        if size == 0:
+            result = {"content": "", "truncated": False}
+        elif pattern is not None:
+            result = _grep(path, encoding, pattern, max_matches, cap)
+        elif tail is not None:
+            result = _read_tail(path, encoding, tail, cap)
+        elif head is not None:
+            result = _read_lines(path, encoding, 1, head, cap)
+        elif start_line is not None or end_line is not None:
+            result = _read_lines(path, encoding, start_line or 1, end_line, cap)
+        else:
+            offset = offset or 0
+            available = max(0, size - offset)
+            length = available if length is None else min(length, available)
+            result = _read_range(path, encoding, offset, length, cap)
+
+        result.update({"file_path": str(path), "size": size, "encoding": encoding})
+        return result
+
+    except re.error as e:
+        return {"error": f"Invalid pattern: {str(e)}"}
+    except Exception as e:
+        return {"error": f"Error reading file: {str(e)}"}
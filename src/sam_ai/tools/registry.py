@@ -0,0 +1,294 @@
+"""
+Tool registry for Sam AI's agent mode.
+
+Tools are registered in three ways:
+
+* `@tool` on a function, for tools defined in code that is already imported;
+* `register_lazy("name", "package.module:function")`, which defers importing
+  the module until the tool is first needed;
+* the "sam_ai.tools" entry-point group, for tools shipped by other packages
+  (`name = "package.module:function"`), discovered on first lookup.
+
+Function-calling schemas are generated once per tool from its signature, type
+hints and docstring, then cached, so building the tool list for a request
+costs nothing after the first time.
+"""
+
+import importlib
+import inspect
+import logging
+import re
+import threading
+from collections.abc import Mapping
+from typing import (
+    Any, Callable, Dict, Iterator, List, Optional, Tuple, Union, get_args, get_origin, get_type_hints,
+)
+
+logger = logging.getLogger(__name__)
+
+ENTRY_POINT_GROUP = "sam_ai.tools"
+
+_JSON_TYPES = {str: "string", int: "integer", float: "number", bool: "boolean"}
+
+
+def _json_schema(annotation: Any) -> Dict[str, Any]:
+    """JSON schema for a type hint; unknown types are left unconstrained."""
+    origin = get_origin(annotation)
+    if origin is Union:
+        args = [a for a in get_args(annotation) if a is not type(None)]
+        return _json_schema(args[0]) if len(args) == 1 else {}
+    if annotation in _JSON_TYPES:
+        return {"type": _JSON_TYPES[annotation]}
+    if annotation in (list, tuple) or origin in (list, tuple):
+        args = get_args(annotation)
+        schema = {"type": "array"}
+        if args and args[0] is not Ellipsis:
+            schema["items"] = _json_schema(args[0])
+        return schema
+    if annotation is dict or origin is dict:
+        return {"type": "object"}
+    return {}
+
+
+def _docstring_parts(function: Callable) -> Tuple[str, Dict[str, str]]:
+    """Split a Google-style docstring into its summary and per-argument descriptions."""
+    doc = inspect.getdoc(function) or ""
+    summary = doc.split("\n\n")[0].replace("\n", " ").strip()
+    arguments = {}
+    lines = doc.splitlines()
+    if "Args:" in lines:
+        indent = None
+        current = None
+        for line in lines[lines.index("Args:") + 1 :]:
+            if line and not line[0].isspace():
+                break  # Next section, e.g. "Returns:"
+            stripped = line.strip()
+            if not stripped:
+                continue
+            depth = len(line) - len(stripped)
+            indent = depth if indent is None else indent
+            match = re.match(r"(\w+)(?:\s*\(.*?\))?:\s*(.*)", stripped)
+            if depth == indent and match:
+                current = match.group(1)
+                arguments[current] = match.group(2)
+            elif current:
+                arguments[current] += " " + stripped
+    return summary, arguments
+
+
+def function_schema(function: Callable) -> Dict[str, Any]:
+    """
+    Build a JSON schema for a function's parameters from its signature.
+
+    Parameters without a default are required; descriptions come from the
+    docstring's "Args:" section.
+    """
+    hints = get_type_hints(function)
+    _, descriptions = _docstring_parts(function)
+    properties = {}
+    required = []
+    for name, parameter in inspect.signature(function).parameters.items():
+        if parameter.kind in (parameter.VAR_POSITIONAL, parameter.VAR_KEYWORD):
+            continue
+        schema = _json_schema(hints.get(name, Any))
+        if name in descriptions:
+            schema["description"] = descriptions[name]
+        properties[name] = schema
+        if parameter.default is parameter.empty:
+            required.append(name)
+
+    schema = {"type": "object", "properties": properties}
+    if required:
+        schema["required"] = required
+    return schema
+
+
+def _import_target(target: str) -> Callable:
+    module_name, _, attribute = target.partition(":")
+    return getattr(importlib.import_module(module_name), attribute)
+
+
+class ToolRegistry(Mapping):
+    """
+    Mapping of tool name to its entry, importing tool modules on first use.
+
+    Each entry is a dict with "function", "description", "parameters" (JSON
+    schema) and optionally "timeout" (seconds) and "stream" (a generator
+    function yielding the tool's output incrementally).
+    """
+
+    def __init__(self, entry_point_group: Optional[str] = ENTRY_POINT_GROUP):
+        self.entry_point_group = entry_point_group
+        self._specs: Dict[str, Dict[str, Any]] = {}
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._schemas: Optional[List[Dict[str, Any]]] = None
+        self._plugins_loaded = entry_point_group is None
+        self._lock = threading.RLock()
+
+    def register(
+        self,
+        function: Optional[Callable] = None,
+        *,
+        name: Optional[str] = None,
+        description: Optional[str] = None,
+        parameters: Optional[Dict[str, Any]] = None,
+        timeout: Optional[float] = None,
+        stream: Optional[Callable] = None,
+    ):
+        """
+        Register a function as a tool. Usable as `@tool` or `@tool(name=...)`.
+
+        Args:
+            function: The tool implementation.
+            name: Tool name shown to the model. Defaults to the function name.
+            description: Defaults to the first paragraph of the docstring.
+            parameters: JSON schema. Defaults to one generated from the signature.
+            timeout: Seconds before a call is abandoned. Defaults to `settings.tool_timeout`.
+            stream: Generator function yielding the output incrementally.
+        """
+        def decorator(function: Callable) -> Callable:
+            self._add(name or function.__name__, {
+                "function": function,
+                "description": description,
+                "parameters": parameters,
+                "timeout": timeout,
+                "stream": stream,
+            })
+            return function
+
+        return decorator if function is None else decorator(function)
+
+    def register_lazy(
+        self,
+        name: str,
+        target: str,
+        *,
+        description: Optional[str] = None,
+        parameters: Optional[Dict[str, Any]] = None,
+        timeout: Optional[float] = None,
+        stream: Optional[str] = None,
+    ) -> None:
+        """
+        Register a tool by import path ("package.module:function") without importing it.
+
+        The module is imported the first time the tool is looked up. Passing
+        both `description` and `parameters` also keeps `schemas()` from
+        importing it.
+        """
+        self._add(name, {
+            "target": target,
+            "description": description,
+            "parameters": parameters,
+            "timeout": timeout,
+            "stream": stream,
+        })
+
+    def _add(self, name: str, spec: Dict[str, Any]) -> None:
+        with self._lock:
+            self._specs[name] = spec
+            self._entries.pop(name, None)
+            self._schemas = None
+
+    def unregister(self, name: str) -> None:
+        """Remove a tool."""
+        with self._lock:
+            self._specs.pop(name, None)
+            self._entries.pop(name, None)
+            self._schemas = None
+
+    def _load_plugins(self) -> None:
+        """Register tools advertised by installed packages, once."""
+        if self._plugins_loaded:
+            return
+        with self._lock:
+            if self._plugins_loaded:
+                return
+            self._plugins_loaded = True
+            from importlib.metadata import entry_points
+
+            try:
+                found = entry_points(group=self.entry_point_group)
+            except TypeError:  # Python < 3.10
+                found = entry_points().get(self.entry_point_group, [])
+            for entry_point in found:
+                if entry_point.name not in self._specs:
+                    self._add(entry_point.name, {"target": entry_point.value})
+
+    def __getitem__(self, name: str) -> Dict[str, Any]:
+        self._load_plugins()
+        entry = self._entries.get(name)
+        if entry is not None:
+            return entry
+
+        with self._lock:
+            spec = self._specs[name]
+            function = spec.get("function") or _import_target(spec["target"])
+            stream = spec.get("stream")
+            if isinstance(stream, str):
+                stream = _import_target(stream)
+            entry = {
+                "function": function,
+                "description": spec.get("description") or _docstring_parts(function)[0],
+                "parameters": spec.get("parameters") or function_schema(function),
+            }
+            if spec.get("timeout") is not None:
+                entry["timeout"] = spec["timeout"]
+            if stream is not None:
+                entry["stream"] = stream
+            self._entries[name] = entry
+            return entry
+
+    def __iter__(self) -> Iterator[str]:
+        self._load_plugins()
+        return iter(list(self._specs))
+
+    def __len__(self) -> int:
+        self._load_plugins()
+        return len(self._specs)
+
+    def __contains__(self, name: object) -> bool:
+        self._load_plugins()
+        return name in self._specs
+
+    def timeout(self, name: str) -> Optional[float]:
+        """A tool's configured timeout, without importing it."""
+        spec = self._specs.get(name)
+        return spec.get("timeout") if spec else None
+
+    def schemas(self) -> List[Dict[str, Any]]:
+        """Function-calling definitions of every tool, built once and cached."""
+        self._load_plugins()
+        schemas = self._schemas
+        if schemas is not None:
+            return schemas
+
+        with self._lock:
+            schemas = []
+            for name in list(self._specs):
+                spec = self._specs[name]
+                if spec.get("description") and spec.get("parameters"):
+                    description, parameters = spec["description"], spec["parameters"]
+                else:
+                    try:
+                        entry = self[name]
+                    except Exception as e:
+                        logger.warning(f"Skipping tool {name}: {e}")
+                        continue
+                    description, parameters = entry["description"], entry["parameters"]
+                schemas.append({
+                    "type": "function",
+                    "function": {
+                        "name": name,
+                        "description": description,
+                        "parameters": parameters,
+                    },
+                })
+            self._schemas = schemas
+            return schemas
+
+
+# The registry used by agent mode
+TOOL_REGISTRY = ToolRegistry()
+
+# Decorator registering a function in TOOL_REGISTRY
+tool = TOOL_REGISTRY.register
@@ -0,0 +1,95 @@
+"""
+Tests for batch generation.
+"""
+
+import asyncio
+import json
+
+import pytest
+from unittest.mock import patch, MagicMock, AsyncMock
+from src.sam_ai.core.batch import BatchRunner, main
+from src.sam_ai.core.memory_manager import MemoryManager
+
+
+def _write_prompts(path, count):
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(count):
+            f.write(json.dumps({"id": f"q{i}", "prompt": f"Question {i}"}) + "\n")
+
+
+def _read_results(path):
+    results = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                results.append(json.loads(line))
+            except json.JSONDecodeError:
+                pass
+    return results
+
+
+class TestBatchRunner:
+    """Test concurrent batch runs, checkpointing and isolation from memory."""
+
+    def _provider(self, fail_on=()):
+        in_flight = 0
+        provider = MagicMock()
+        provider.max_in_flight = 0
+
+        async def fake_completion(messages, model, **kwargs):
+            nonlocal in_flight
+            in_flight += 1
+            provider.max_in_flight = max(provider.max_in_flight, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+            prompt = messages[-1]["content"]
+            if prompt in fail_on:
+                raise ConnectionError("refused")
+            return f"Answer to {prompt}"
+
+        provider.achat_completion = AsyncMock(side_effect=fake_completion)
+        return provider
+
+    def test_runs_with_bounded_concurrency(self, tmp_path):
+        """Test every prompt gets a result and concurrency stays bounded."""
+        _write_prompts(tmp_path / "in.jsonl", 20)
+        provider = self._provider()
+
+        with patch.object(MemoryManager, "add_interaction") as mock_add:
+            counts = BatchRunner(provider, model="phi3", concurrency=4).run(
+                tmp_path / "in.jsonl", tmp_path / "out.jsonl"
+            )
+
+        results = {r["id"]: r for r in _read_results(tmp_path / "out.jsonl")}
+        assert counts == {"succeeded": 20, "failed": 0, "skipped": 0}
+        assert results["q7"]["response"] == "Answer to Question 7"
+        assert provider.max_in_flight == 4
+        mock_add.assert_not_called()
+
+    def test_resume_skips_completed_and_retries_failed(self, tmp_path):
+        """Test a re-run only processes prompts without a response."""
+        _write_prompts(tmp_path / "in.jsonl", 5)
+        out = tmp_path / "out.jsonl"
+        first = BatchRunner(self._provider(fail_on={"Question 3"}), concurrency=2)
+        assert first.run(tmp_path / "in.jsonl", out)["failed"] == 1
+
+        with open(out, "a", encoding="utf-8") as f:
+            f.write('{"id": "q4", "resp')  # torn by an interruption
+
+        provider = self._provider()
+        counts = BatchRunner(provider, concurrency=2).run(tmp_path / "in.jsonl", out)
+
+        assert counts == {"succeeded": 1, "failed": 0, "skipped": 4}
+        assert provider.achat_completion.call_count == 1
+        assert _read_results(out)[-1]["id"] == "q3"
+
+    def test_cli(self, tmp_path, capsys):
+        """Test the command-line entry point."""
+        _write_prompts(tmp_path / "in.jsonl", 3)
+
+        with patch("src.sam_ai.core.batch.get_provider", return_value=self._provider()):
+            code = main([str(tmp_path / "in.jsonl"), str(tmp_path / "out.jsonl"), "--provider", "ollama"])
+
+        assert code == 0
+        assert len(_read_results(tmp_path / "out.jsonl")) == 3
+        assert "3 succeeded" in capsys.readouterr().err
@@ -0,0 +1,84 @@
+"""
+Tests for the benchmark harness.
+"""
+
+import json
+
+import pytest
+import requests
+from benchmarks.footprint import run_footprint
+from benchmarks.mock_server import MockLLMServer
+from benchmarks.run import compare, main, run_benchmarks
+
+
+@pytest.fixture
+def server():
+    with MockLLMServer(latency=0, tokens_per_second=0, response_tokens=4) as server:
+        yield server
+
+
+class TestMockLLMServer:
+    def test_ollama_stream(self, server):
+        response = requests.post(
+            f"{server.url}/api/chat",
+            json={"model": "mock", "messages": [{"role": "user", "content": "hi"}], "stream": True},
+        )
+        lines = [json.loads(line) for line in response.iter_lines() if line]
+        assert "".join(line["message"]["content"] for line in lines) == "word0 word1 word2 word3 "
+        assert lines[-1]["done"] is True
+
+    def test_openai_completion(self, server):
+        response = requests.post(
+            f"{server.url}/v1/chat/completions",
+            json={"model": "mock", "messages": [{"role": "user", "content": "hi"}]},
+        )
+        assert response.json()["choices"][0]["message"]["content"] == "word0 word1 word2 word3 "
+
+
+class TestHarness:
+    def test_report(self, server, tmp_path):
+        report = run_benchmarks(["ollama_stream", "orchestrator_stream"], [1, 2], 4, server)
+
+        assert report["meta"]["server"]["response_tokens"] == 4
+        assert [(r["scenario"], r["concurrency"]) for r in report["results"]] == [
+            ("ollama_stream", 1), ("ollama_stream", 2),
+            ("orchestrator_stream", 1), ("orchestrator_stream", 2),
+        ]
+        for result in report["results"]:
+            assert result["errors"] == 0
+            assert set(result["latency_ms"]) == {"p50", "p95", "p99", "mean"}
+            assert result["ttft_ms"]["p50"] <= result["latency_ms"]["p50"]
+            assert result["throughput_rps"] > 0
+            assert "rss_growth_kb" in result
+
+    def test_compare_flags_regressions(self):
+        baseline = {"results": [{
+            "scenario": "ollama_chat", "concurrency": 1,
+            "latency_ms": {"p95": 100.0}, "ttft_ms": None, "throughput_rps": 10.0,
+        }]}
+        slower = {"results": [{
+            "scenario": "ollama_chat", "concurrency": 1,
+            "latency_ms": {"p95": 150.0}, "ttft_ms": None, "throughput_rps": 7.0,
+        }]}
+
+        assert compare(baseline, baseline, 0.2) == []
+        assert len(compare(slower, baseline, 0.2)) == 2
+        assert compare(slower, baseline, 0.6) == []
+
+    def test_cli(self, tmp_path):
+        output = tmp_path / "report.json"
+        args = ["--scenarios", "memory", "--concurrency", "1", "--requests", "3", "--output", str(output)]
+
+        assert main(args) == 0
+        assert json.loads(output.read_text())["results"][0]["scenario"] == "memory"
+        assert main(args + ["--compare", str(output), "--threshold", "1000"]) == 0
+
+
+class TestFootprint:
+    def test_compact_records_are_smaller(self):
+        report = run_footprint(300, window=10, threshold=50)
+
+        memory, disk = report["memory"], report["disk"]
+        assert memory["interaction_overhead_per_turn"] < memory["dict_overhead_per_turn"]
+        assert disk["cold_segment_bytes"] > 0
+        assert disk["compact_bytes_per_turn"] < disk["legacy_log_bytes_per_turn"]
@@ -0,0 +1,57 @@
+"""
+Tests for token-budgeted context assembly.
+"""
+
+import pytest
+from src.sam_ai.config import settings
+from src.sam_ai.core.context_builder import (
+    ContextBuilder,
+    context_window_for,
+    estimate_tokens,
+    fit_interactions,
+    interaction_tokens,
+)
+
+
+class TestContextBuilder:
+    """Test token estimates and history budgeting."""
+
+    def test_estimate_grows_with_length(self):
+        """Test longer text is estimated at more tokens."""
+        assert estimate_tokens("") == 0
+        assert 0 < estimate_tokens("Hello there") < estimate_tokens("Hello there " * 50)
+
+    def test_interaction_estimate_is_cached(self):
+        """Test the estimate is stored on the interaction and reused."""
+        interaction = {"user": "Hello", "assistant": "Hi"}
+        tokens = interaction_tokens(interaction)
+
+        assert interaction["tokens"] == tokens
+        interaction["tokens"] = 999
+        assert interaction_tokens(interaction) == 999
+
+    def test_fit_keeps_newest_within_budget(self):
+        """Test history is filled newest first and returned in order."""
+        history = [
+            {"user": f"u{i}", "assistant": "a", "tokens": 10} for i in range(5)
+        ]
+
+        selected, used = fit_interactions(reversed(history), 35)
+
+        assert [i["user"] for i in selected] == ["u2", "u3", "u4"]
+        assert used == 30
+
+    def test_budget_leaves_room_for_reply(self, monkeypatch):
+        """Test the history budget excludes the prompt and reply reserve."""
+        monkeypatch.setattr(settings, "context_window_tokens", None)
+        monkeypatch.setattr(settings, "model_context_windows", {"llama3": 8192})
+
+        assert context_window_for("llama3:8b") == 8192
+        assert context_window_for("phi3") == settings.default_context_window
+
+        builder = ContextBuilder("llama3:8b", reply_tokens=1000)
+        budget = builder.history_budget("System prompt", "Hello")
+        assert 8192 - 1000 - 20 < budget < 8192 - 1000
+        assert ContextBuilder("llama3", context_window=100, reply_tokens=200).history_budget(
+            "System prompt", "Hello"
+        ) == 0
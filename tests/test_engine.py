@@ -2,10 +2,17 @@
 Tests for the main orchestration engine.
 """
 
+import asyncio
+import json
+import logging
+
 import pytest
-from unittest.mock import patch, MagicMock
-from src.sam_ai.core.engine import Orchestrator
+from unittest.mock import patch, MagicMock, AsyncMock
+from src.sam_ai.config import settings
+from src.sam_ai.core.engine import BUSY_REPLY, AsyncOrchestrator, Orchestrator
 from src.sam_ai.core.memory_manager import MemoryManager
+from src.sam_ai.providers import ProviderBusy, ToolCallingNotSupported
+from src.sam_ai.providers.ollama_provider import OllamaProvider
 
 class TestOrchestrator:
     """Test the main orchestrator functionality."""
@@ -21,7 +28,24 @@ class TestOrchestrator:
         assert orchestrator.current_mode == "chat"
         assert orchestrator.provider == mock_provider
         mock_get_provider.assert_called_once()
-    
+
+    @patch('requests.Session.post')
+    @patch('src.sam_ai.core.engine.threading.Thread')
+    @patch('src.sam_ai.core.engine.get_provider')
+    def test_warm_up_once_per_process(self, mock_get_provider, mock_thread, mock_post, monkeypatch):
+        """Test orchestrators stop starting warm-ups once the provider has the model loaded."""
+        monkeypatch.setattr(settings, "ollama_warm_up", True)
+        mock_get_provider.return_value = OllamaProvider(base_url="http://engine-warm-up:11434")
+
+        Orchestrator()
+        mock_thread.call_args.kwargs["target"]()
+        for _ in range(3):
+            Orchestrator()
+        Orchestrator().warm_up("other-model")
+
+        assert mock_thread.call_count == 2
+        mock_post.assert_called_once()
+
     @patch('src.sam_ai.core.engine.get_provider')
     @patch.object(MemoryManager, 'get_context')
     @patch.object(MemoryManager, 'add_interaction')
@@ -38,4 +62,168 @@ class TestOrchestrator:
         
         assert response == "Test response"
         mock_provider.chat_completion.assert_called_once()
-        mock_add.assert_called_once()
\ No newline at end of file
+        mock_add.assert_called_once()
+
+    @patch('src.sam_ai.core.engine.get_provider')
+    @patch.object(MemoryManager, 'get_context')
+    @patch.object(MemoryManager, 'add_interaction')
+    def test_process_message_stream(self, mock_add, mock_get_context, mock_get_provider):
+        """Test streaming saves the full response to memory once the stream ends."""
+        mock_provider = MagicMock()
+        mock_provider.chat_completion_stream.return_value = iter(["Test ", "response"])
+        mock_get_provider.return_value = mock_provider
+
+        mock_get_context.return_value = []
+
+        orchestrator = Orchestrator()
+        stream = orchestrator.process_message_stream("Hello", "chat")
+
+        assert next(stream) == "Test "
+        mock_add.assert_not_called()
+
+        assert list(stream) == ["response"]
+        mock_add.assert_called_once_with("Hello", "Test response")
+
+    @patch('src.sam_ai.core.engine.get_provider')
+    def test_summary_is_injected_after_system_prompt(self, mock_get_provider):
+        """Test the running summary replaces older turns in the prompt."""
+        orchestrator = Orchestrator()
+        orchestrator.memory.summary = "The user has a cat called Sam."
+
+        messages = orchestrator._prepare_messages("Hello", [])
+
+        assert messages[0]["role"] == "system"
+        assert messages[1]["role"] == "system"
+        assert "cat called Sam" in messages[1]["content"]
+        assert messages[-1] == {"role": "user", "content": "Hello"}
+
+
+    @patch('src.sam_ai.core.engine.get_provider')
+    def test_prompt_prefix_is_stable_between_turns(self, mock_get_provider, tmp_path, monkeypatch):
+        """Test the history anchor and pinned summary stay byte-identical while they fit."""
+        monkeypatch.setattr(settings, "memory_persistence_path", tmp_path)
+        orchestrator = Orchestrator()
+        memory = orchestrator.memory
+        memory.summary = "The user has a cat called Sam."
+        memory.add_interaction("Hello", "Hi!")
+
+        context = orchestrator._get_context("How are you?", "chat")
+        first = orchestrator._prepare_messages("How are you?", context)
+        memory.add_interaction("How are you?", "Fine, thanks.")
+        memory.summary = "The user has a cat called Sam and likes tea."  # A background update
+        context = orchestrator._get_context("And you?", "chat")
+        second = orchestrator._prepare_messages("And you?", context)
+
+        assert second[: len(first) - 1] == first[:-1]  # System prompt, summary, history
+        assert second[1]["content"].endswith("cat called Sam.")  # Still the pinned summary
+        assert second[len(first) - 1 : -1] == [
+            {"role": "user", "content": "How are you?"},
+            {"role": "assistant", "content": "Fine, thanks."},
+        ]
+        assert "\n        " not in first[0]["content"]  # no indentation drift
+
+    @patch('src.sam_ai.core.engine.get_provider')
+    @patch.object(MemoryManager, 'get_context')
+    @patch.object(MemoryManager, 'add_interaction')
+    def test_agent_mode_runs_tools_until_answer(
+        self, mock_add, mock_get_context, mock_get_provider, caplog
+    ):
+        """Test tool results are fed back to the model until it answers."""
+        caplog.set_level(logging.INFO, logger="src.sam_ai.core.engine")
+        mock_provider = MagicMock()
+        mock_provider.chat_with_tools.side_effect = [
+            {
+                "content": "",
+                "tool_calls": [
+                    {"id": "1", "name": "calculator", "arguments": {"expression": "6*7"}},
+                    {"id": "2", "name": "calculator", "arguments": {"expression": "1+1"}},
+                ],
+                "message": {"role": "assistant", "content": ""},
+            },
+            {"content": "6*7 is 42.", "tool_calls": [], "message": {}},
+        ]
+        mock_provider.tool_result_message.side_effect = (
+            lambda call, content: {"role": "tool", "tool_call_id": call["id"], "content": content}
+        )
+        mock_get_provider.return_value = mock_provider
+        mock_get_context.return_value = []
+
+        orchestrator = Orchestrator()
+        response = orchestrator.process_message("What is 6*7?", "agent")
+
+        assert response == "6*7 is 42."
+        second_round = mock_provider.chat_with_tools.call_args.kwargs["messages"]
+        assert [json.loads(m["content"])["result"] for m in second_round[-2:]] == [42, 2]
+        mock_provider.chat_completion.assert_not_called()
+        mock_add.assert_called_once_with("What is 6*7?", "6*7 is 42.")
+        assert "6*7" not in caplog.text  # Tool arguments and results stay out of INFO logs
+
+    @patch('src.sam_ai.core.engine.get_provider')
+    @patch.object(MemoryManager, 'get_context')
+    @patch.object(MemoryManager, 'add_interaction')
+    def test_agent_mode_without_tool_support(self, mock_add, mock_get_context, mock_get_provider):
+        """Test agent mode falls back to a plain completion without tool support."""
+        mock_provider = MagicMock()
+        mock_provider.chat_with_tools.side_effect = ToolCallingNotSupported("no tools")
+        mock_provider.chat_completion.return_value = "Plain answer"
+        mock_get_provider.return_value = mock_provider
+        mock_get_context.return_value = []
+
+        orchestrator = Orchestrator()
+
+        assert orchestrator.process_message("Hi", "agent") == "Plain answer"
+
+    @patch('src.sam_ai.core.engine.get_provider')
+    @patch.object(MemoryManager, 'get_context')
+    @patch.object(MemoryManager, 'add_interaction')
+    def test_busy_provider_gets_quick_reply(self, mock_add, mock_get_context, mock_get_provider):
+        """Test a request turned away by the scheduler is answered as busy and not stored."""
+        mock_provider = MagicMock()
+        mock_provider.chat_completion.side_effect = ProviderBusy("queue full")
+        mock_provider.chat_completion_stream.side_effect = ProviderBusy("queue full")
+        mock_get_provider.return_value = mock_provider
+        mock_get_context.return_value = []
+
+        orchestrator = Orchestrator()
+
+        assert orchestrator.process_message("Hi") == BUSY_REPLY
+        assert list(orchestrator.process_message_stream("Hi")) == [BUSY_REPLY]
+        mock_add.assert_not_called()
+
+
+class TestAsyncOrchestrator:
+    """Test the asyncio orchestrator."""
+
+    @patch('src.sam_ai.core.engine.get_provider')
+    @patch.object(MemoryManager, 'get_context')
+    @patch.object(MemoryManager, 'add_interaction')
+    def test_concurrent_messages(self, mock_add, mock_get_context, mock_get_provider):
+        """Test several conversations can be in flight at once on one loop."""
+        in_flight = 0
+        max_in_flight = 0
+
+        async def fake_completion(messages, model, **kwargs):
+            nonlocal in_flight, max_in_flight
+            in_flight += 1
+            max_in_flight = max(max_in_flight, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+            return f"Echo: {messages[-1]['content']}"
+
+        mock_provider = MagicMock()
+        mock_provider.achat_completion = AsyncMock(side_effect=fake_completion)
+        mock_get_provider.return_value = mock_provider
+        mock_get_context.return_value = []
+
+        orchestrator = AsyncOrchestrator()
+
+        async def run():
+            return await asyncio.gather(
+                *(orchestrator.aprocess_message(f"Hi {i}") for i in range(5))
+            )
+
+        responses = asyncio.run(run())
+
+        assert responses == [f"Echo: Hi {i}" for i in range(5)]
+        assert max_in_flight == 5
+        assert mock_add.call_count == 5
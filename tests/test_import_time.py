@@ -0,0 +1,62 @@
+"""
+Import-time budget for Sam AI.
+
+CLI invocations and worker processes pay the package's import cost on every
+start, so heavy dependencies must stay deferred until they are used.
+"""
+
+import os
+import re
+import subprocess
+import sys
+
+import pytest
+
+# Cumulative microseconds allowed for importing the engine, best of three runs
+IMPORT_BUDGET_US = int(os.environ.get("SAM_AI_IMPORT_BUDGET_US", 600_000))
+
+# Modules that must not be loaded just by importing the engine
+DEFERRED_MODULES = ["openai", "requests", "httpx", "keyring", "numpy"]
+
+
+def _import_time_us(module: str) -> int:
+    """Cumulative import time of `module` in a fresh interpreter, per -X importtime."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    match = re.search(
+        rf"^import time:\s+\d+ \|\s+(\d+) \| {re.escape(module)}$",
+        result.stderr,
+        re.MULTILINE,
+    )
+    assert match, result.stderr[-2000:]
+    return int(match.group(1))
+
+
+class TestImportTime:
+    """Test importing the engine stays cheap."""
+
+    def test_heavy_dependencies_are_deferred(self):
+        """Test provider clients, keyring and NumPy load only when used."""
+        code = (
+            "import sys, src.sam_ai.core.engine; "
+            f"print([m for m in {DEFERRED_MODULES!r} if m in sys.modules])"
+        )
+        output = subprocess.run(
+            [sys.executable, "-c", code], capture_output=True, text=True, check=True
+        ).stdout
+
+        assert output.strip() == "[]"
+
+    @pytest.mark.skipif(sys.flags.dev_mode, reason="dev mode inflates import times")
+    def test_engine_import_within_budget(self):
+        """Test `import sam_ai.core.engine` stays within the import-time budget."""
+        elapsed = min(_import_time_us("src.sam_ai.core.engine") for _ in range(3))
+
+        assert elapsed <= IMPORT_BUDGET_US, (
+            f"Importing the engine took {elapsed / 1000:.0f} ms, "
+            f"over the {IMPORT_BUDGET_US / 1000:.0f} ms budget"
+        )
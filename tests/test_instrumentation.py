@@ -0,0 +1,210 @@
+"""
+Tests for instrumentation.
+"""
+
+import asyncio
+import json
+import logging
+import urllib.request
+
+import pytest
+from unittest.mock import patch, MagicMock, AsyncMock
+from src.sam_ai.core.engine import AsyncOrchestrator, Orchestrator
+from src.sam_ai.core.instrumentation import (
+    Exporter, Instrumentation, JSONLogExporter, PrometheusExporter,
+)
+from src.sam_ai.core.memory_manager import MemoryManager
+
+
+class RecordingExporter(Exporter):
+    def __init__(self):
+        self.spans = []
+        self.counters = []
+
+    def export_span(self, span):
+        self.spans.append(span)
+
+    def export_counter(self, name, value, labels):
+        self.counters.append((name, value, labels))
+
+
+class TestInstrumentation:
+    def test_disabled_spans_are_noops(self):
+        instrumentation = Instrumentation()
+
+        with instrumentation.span("work") as span:
+            span.set(size=1)
+
+        assert not instrumentation.enabled
+
+    def test_span_records_duration_and_attributes(self):
+        exporter = RecordingExporter()
+        instrumentation = Instrumentation([exporter])
+
+        with instrumentation.span("work", model="m") as span:
+            span.set(size=3)
+
+        [recorded] = exporter.spans
+        assert recorded.name == "work"
+        assert recorded.attributes == {"model": "m", "size": 3}
+        assert recorded.duration >= 0 and recorded.start_time > 0
+        assert recorded.error is None
+
+    def test_failed_span_counts_an_error(self):
+        exporter = RecordingExporter()
+        instrumentation = Instrumentation([exporter])
+
+        with pytest.raises(ValueError):
+            with instrumentation.span("work"):
+                raise ValueError("boom")
+
+        assert exporter.spans[0].error == "ValueError"
+        assert exporter.counters == [("errors", 1, {"span": "work", "error": "ValueError"})]
+
+    def test_abandoned_generator_is_not_an_error(self):
+        exporter = RecordingExporter()
+        instrumentation = Instrumentation([exporter])
+
+        def stream():
+            with instrumentation.span("stream"):
+                yield 1
+                yield 2
+
+        chunks = stream()
+        next(chunks)
+        chunks.close()
+
+        assert exporter.spans[0].error is None
+        assert exporter.spans[0].attributes["cancelled"] is True
+        assert exporter.counters == []
+
+    def test_failing_exporter_is_isolated(self):
+        broken = MagicMock(spec=Exporter)
+        broken.export_span.side_effect = RuntimeError("down")
+        exporter = RecordingExporter()
+        instrumentation = Instrumentation([broken, exporter])
+
+        with instrumentation.span("work"):
+            pass
+
+        assert len(exporter.spans) == 1
+
+
+class TestPrometheusExporter:
+    def test_render(self):
+        exporter = PrometheusExporter(buckets=(0.1, 1.0))
+        instrumentation = Instrumentation([exporter])
+        with instrumentation.span("memory.get_context"):
+            pass
+        instrumentation.count("completion_tokens", 5, model='say "hi"')
+        instrumentation.count("completion_tokens", 2, model='say "hi"')
+
+        text = exporter.render()
+
+        assert "# TYPE sam_ai_span_duration_seconds histogram" in text
+        assert 'sam_ai_span_duration_seconds_bucket{span="memory.get_context",status="ok",le="0.1"} 1' in text
+        assert 'sam_ai_span_duration_seconds_bucket{span="memory.get_context",status="ok",le="+Inf"} 1' in text
+        assert 'sam_ai_span_duration_seconds_count{span="memory.get_context",status="ok"} 1' in text
+        assert 'sam_ai_completion_tokens_total{model="say \\"hi\\""} 7' in text
+
+    def test_serve(self):
+        exporter = PrometheusExporter()
+        exporter.export_counter("errors", 1, {"span": "x"})
+        server = exporter.serve(port=0)
+        try:
+            port = server.server_address[1]
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics") as response:
+                body = response.read().decode()
+        finally:
+            exporter.shutdown()
+
+        assert 'sam_ai_errors_total{span="x"} 1' in body
+
+
+class TestJSONLogExporter:
+    def test_logs_spans_and_counters(self, caplog):
+        instrumentation = Instrumentation([JSONLogExporter()])
+
+        with caplog.at_level(logging.INFO, logger="sam_ai.metrics"):
+            with instrumentation.span("work", model="m"):
+                pass
+            instrumentation.count("prompt_tokens", 10)
+
+        span, counter = [json.loads(r.message) for r in caplog.records]
+        assert span["type"] == "span" and span["name"] == "work"
+        assert span["attributes"] == {"model": "m"}
+        assert counter == {"type": "counter", "name": "prompt_tokens", "value": 10, "labels": {}}
+
+
+class TestOrchestratorInstrumentation:
+    @patch('src.sam_ai.core.engine.get_provider')
+    @patch.object(MemoryManager, 'get_context', return_value=[])
+    @patch.object(MemoryManager, 'add_interaction')
+    def test_turn_stages_are_timed(self, mock_add, mock_get_context, mock_get_provider):
+        mock_provider = MagicMock()
+        mock_provider.chat_completion.return_value = "Test response"
+        mock_get_provider.return_value = mock_provider
+        exporter = RecordingExporter()
+
+        orchestrator = Orchestrator(instrumentation=Instrumentation([exporter]))
+        orchestrator.process_message("Hello", "chat")
+
+        assert [s.name for s in exporter.spans] == [
+            "memory.get_context",
+            "engine.prepare_messages",
+            "provider.chat_completion",
+            "memory.add_interaction",
+        ]
+        assert exporter.spans[2].attributes["mode"] == "chat"
+        assert {name for name, _, _ in exporter.counters} == {"prompt_tokens", "completion_tokens"}
+
+    @patch('src.sam_ai.core.engine.get_provider')
+    @patch.object(MemoryManager, 'get_context', return_value=[])
+    @patch.object(MemoryManager, 'add_interaction')
+    def test_provider_errors_are_counted(self, mock_add, mock_get_context, mock_get_provider):
+        mock_provider = MagicMock()
+        mock_provider.chat_completion.side_effect = ConnectionError("refused")
+        mock_get_provider.return_value = mock_provider
+        exporter = RecordingExporter()
+
+        orchestrator = Orchestrator(instrumentation=Instrumentation([exporter]))
+        orchestrator.process_message("Hello", "chat")
+
+        assert exporter.spans[-1].name == "provider.chat_completion"
+        assert exporter.spans[-1].error == "ConnectionError"
+        assert ("errors", 1, {"span": "provider.chat_completion", "error": "ConnectionError"}) in exporter.counters
+        mock_add.assert_not_called()
+
+    @patch('src.sam_ai.core.engine.get_provider')
+    @patch.object(MemoryManager, 'get_context', return_value=[])
+    @patch.object(MemoryManager, 'add_interaction')
+    def test_stream_records_time_to_first_token(self, mock_add, mock_get_context, mock_get_provider):
+        mock_provider = MagicMock()
+        mock_provider.chat_completion_stream.return_value = iter(["Test ", "response"])
+        mock_get_provider.return_value = mock_provider
+        exporter = RecordingExporter()
+
+        orchestrator = Orchestrator(instrumentation=Instrumentation([exporter]))
+        assert "".join(orchestrator.process_message_stream("Hello")) == "Test response"
+
+        stream_span = next(s for s in exporter.spans if s.name == "provider.chat_completion_stream")
+        assert 0 <= stream_span.attributes["time_to_first_token"] <= stream_span.duration
+
+    @patch('src.sam_ai.core.engine.get_provider')
+    @patch.object(MemoryManager, 'get_context', return_value=[])
+    @patch.object(MemoryManager, 'add_interaction')
+    def test_async_turn_stages_are_timed(self, mock_add, mock_get_context, mock_get_provider):
+        mock_provider = MagicMock()
+        mock_provider.achat_completion = AsyncMock(return_value="Test response")
+        mock_get_provider.return_value = mock_provider
+        exporter = RecordingExporter()
+
+        orchestrator = AsyncOrchestrator(instrumentation=Instrumentation([exporter]))
+        asyncio.run(orchestrator.aprocess_message("Hello"))
+
+        assert [s.name for s in exporter.spans] == [
+            "memory.get_context",
+            "engine.prepare_messages",
+            "provider.achat_completion",
+            "memory.add_interaction",
+        ]
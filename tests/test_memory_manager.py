@@ -0,0 +1,477 @@
+"""
+Tests for conversation memory management.
+"""
+
+import gc
+import json
+import threading
+from collections import deque
+from datetime import datetime
+from unittest.mock import MagicMock
+
+import pytest
+from src.sam_ai.config import settings
+from src.sam_ai.core.memory_manager import MemoryManager
+from src.sam_ai.storage import Interaction, get_store
+
+
+@pytest.fixture
+def memory_dir(tmp_path, monkeypatch):
+    """Point memory persistence at a temporary directory."""
+    monkeypatch.setattr(settings, "memory_persistence_path", tmp_path)
+    monkeypatch.setattr(settings, "max_chat_history", 5)
+    monkeypatch.setattr(settings, "memory_compaction_threshold", 3)
+    return tmp_path
+
+
+class TestMemoryManager:
+    """Test memory persistence and context retrieval."""
+
+    def test_interactions_are_appended(self, memory_dir):
+        """Test each turn appends one line and survives a reload."""
+        memory = MemoryManager()
+        memory.add_interaction("Hello", "Hi there")
+        memory.add_interaction("How are you?", "Doing well")
+
+        lines = (memory_dir / "conversation_memory.jsonl").read_text().splitlines()
+        assert [json.loads(line)["user"] for line in lines] == ["Hello", "How are you?"]
+
+        memory.close()
+        reloaded = MemoryManager()
+        assert [i["assistant"] for i in reloaded.conversation_history] == [
+            "Hi there",
+            "Doing well",
+        ]
+
+    def test_compaction_trims_log(self, memory_dir):
+        """Test the log is compacted down to the retained history."""
+        memory = MemoryManager()
+        for i in range(8):
+            memory.add_interaction(f"message {i}", f"reply {i}")
+
+        assert len(memory.conversation_history) == 5
+        lines = (memory_dir / "conversation_memory.jsonl").read_text().splitlines()
+        assert len(lines) < 8
+        assert json.loads(lines[-1])["user"] == "message 7"
+        assert not (memory_dir / "conversation_memory.jsonl.tmp").exists()
+
+    def test_torn_write_is_skipped(self, memory_dir):
+        """Test a partially written last line does not discard earlier turns."""
+        log = memory_dir / "conversation_memory.jsonl"
+        log.write_text(
+            json.dumps({"timestamp": "t", "user": "kept", "assistant": "ok"})
+            + '\n{"timestamp": "t", "user": "tor'
+        )
+
+        memory = MemoryManager()
+        assert [i["user"] for i in memory.conversation_history] == ["kept"]
+
+        memory.add_interaction("next", "fine")
+        memory.close()
+        assert [i["user"] for i in MemoryManager().conversation_history] == [
+            "kept",
+            "next",
+        ]
+
+    def test_legacy_json_is_migrated(self, memory_dir):
+        """Test an old pretty-printed memory file is converted to the log."""
+        legacy = memory_dir / "conversation_memory.json"
+        legacy.write_text(
+            json.dumps([{"timestamp": "t", "user": "old", "assistant": "turn"}], indent=2)
+        )
+
+        memory = MemoryManager()
+
+        assert [i["user"] for i in memory.conversation_history] == ["old"]
+        assert (memory_dir / "conversation_memory.jsonl").exists()
+        assert not legacy.exists()
+
+    def test_old_turns_move_to_cold_segments(self, memory_dir, tmp_path):
+        """Test turns compacted out of the log are archived and still readable."""
+        memory = MemoryManager()
+        for i in range(12):
+            memory.add_interaction(f"message {i}", f"reply {i}")
+        memory.close()
+
+        assert list((memory_dir / "conversation_memory.cold").glob("*.jsonl.gz"))
+        lines = (memory_dir / "conversation_memory.jsonl").read_text().splitlines()
+        assert len(lines) < 12
+
+        reloaded = MemoryManager()
+        assert reloaded.store.count() == 12
+        page = reloaded.get_history(offset=5, limit=3)
+        assert [i.user for i in page] == ["message 6", "message 5", "message 4"]
+
+        export_path = tmp_path / "export.json"
+        reloaded.export_memory(export_path, batch_size=4)
+        exported = json.loads(export_path.read_text())
+        assert [i["user"] for i in exported] == [f"message {i}" for i in range(12)]
+
+        reloaded.clear()
+        assert not (memory_dir / "conversation_memory.cold").exists()
+
+    def test_iso_timestamps_are_read(self, memory_dir):
+        """Test records written with ISO timestamps load as epoch milliseconds."""
+        log = memory_dir / "conversation_memory.jsonl"
+        log.write_text(json.dumps(
+            {"timestamp": "2024-05-01T12:00:00", "user": "old", "assistant": "turn"}
+        ) + "\n")
+
+        record = MemoryManager().conversation_history[0]
+
+        assert isinstance(record, Interaction)
+        assert record.timestamp == int(datetime(2024, 5, 1, 12).timestamp() * 1000)
+
+    def test_get_context_returns_recent_turns(self, memory_dir):
+        """Test context holds the last interactions as chat messages."""
+        memory = MemoryManager()
+        memory.add_interaction("Hello", "Hi there")
+
+        assert memory.get_context("Next") == [
+            {"role": "user", "content": "Hello"},
+            {"role": "assistant", "content": "Hi there"},
+        ]
+
+
+class TestSQLiteMemory:
+    """Test the SQLite backend with multiple sessions."""
+
+    @pytest.fixture(autouse=True)
+    def sqlite_backend(self, memory_dir, monkeypatch):
+        monkeypatch.setattr(settings, "memory_backend", "sqlite")
+
+    def test_sessions_are_isolated(self, memory_dir):
+        """Test each user/session pair has its own history."""
+        alice = MemoryManager(user_id="alice", session_id="s1")
+        bob = MemoryManager(user_id="bob", session_id="s1")
+        alice.add_interaction("I'm Alice", "Hi Alice")
+        bob.add_interaction("I'm Bob", "Hi Bob")
+
+        assert [i["user"] for i in MemoryManager("alice", "s1").conversation_history] == [
+            "I'm Alice"
+        ]
+        assert MemoryManager("alice", "s2").conversation_history == deque()
+        assert (memory_dir / "memory.db").exists()
+
+    def test_reload_sees_other_writers(self, memory_dir):
+        """Test reload picks up turns written through another store, e.g. another process."""
+        memory = MemoryManager("alice", "s1")
+        elsewhere = MemoryManager("alice", "s1", store=get_store(user_id="alice", session_id="s1"))
+        elsewhere.add_interaction("from another worker", "ok")
+
+        assert memory.conversation_history == deque()
+        memory.reload()
+        assert [i["user"] for i in memory.conversation_history] == ["from another worker"]
+
+    def test_full_history_is_paged_and_exported(self, memory_dir, tmp_path):
+        """Test history beyond the in-memory window stays reachable."""
+        memory = MemoryManager(user_id="alice", session_id="long")
+        for i in range(12):
+            memory.add_interaction(f"message {i}", f"reply {i}")
+
+        reloaded = MemoryManager(user_id="alice", session_id="long")
+        assert len(reloaded.conversation_history) == 5
+        assert reloaded.conversation_history[-1]["user"] == "message 11"
+
+        page = reloaded.get_history(offset=5, limit=3)
+        assert [i["user"] for i in page] == ["message 6", "message 5", "message 4"]
+
+        export_path = tmp_path / "export.json"
+        reloaded.export_memory(export_path, batch_size=4)
+        exported = json.loads(export_path.read_text())
+        assert [i["user"] for i in exported] == [f"message {i}" for i in range(12)]
+
+
+class KeywordEmbedder:
+    """Deterministic embedding stand-in: one dimension per known keyword."""
+
+    KEYWORDS = ["cat", "job", "sleep", "music"]
+
+    def embed(self, texts, model):
+        return [
+            [float(word in text.lower()) for word in self.KEYWORDS] + [0.1]
+            for text in texts
+        ]
+
+
+class TestLongTermMemory:
+    """Test semantic recall beyond the recent window."""
+
+    def test_relevant_old_turn_is_recalled(self, memory_dir, monkeypatch):
+        """Test an old, relevant turn is merged ahead of the recent window."""
+        monkeypatch.setattr(settings, "long_term_memory_enabled", True)
+        monkeypatch.setattr(settings, "embedding_batch_size", 2)
+        monkeypatch.setattr(settings, "long_term_memory_top_k", 1)
+        memory = MemoryManager(embedding_provider=KeywordEmbedder())
+
+        memory.add_interaction("My cat is called Sam", "What a lovely name")
+        for i in range(6):
+            memory.add_interaction(f"I have a job interview {i}", "Good luck")
+        memory.long_term.flush()
+
+        context = memory.get_context("Tell me about my cat")
+
+        assert len(context) == 11  # last 5 interactions + recalled note
+        assert context[-1]["role"] == "system"
+        assert "My cat is called Sam" in context[-1]["content"]
+        assert all("cat" not in m["content"] for m in context[:-1])
+        memory.long_term.close()
+
+    def _long_term(self, path, turns):
+        from src.sam_ai.core.long_term_memory import LongTermMemory
+
+        memory = LongTermMemory(path, KeywordEmbedder(), model="kw", batch_size=1)
+        for user in turns:
+            memory.add(Interaction(user, "ok"))
+        memory.close()
+        return path
+
+    def test_torn_record_line_is_skipped(self, tmp_path):
+        """Test a torn trailing record is dropped without losing the index."""
+        from src.sam_ai.core.long_term_memory import LongTermMemory
+
+        path = self._long_term(tmp_path / "ltm", ["my cat", "my job"])
+        with open(path / "records.jsonl", "a", encoding="utf-8") as f:
+            f.write('{"timestamp": 1, "user": "tor')
+
+        memory = LongTermMemory(path, KeywordEmbedder(), model="kw", batch_size=1)
+        assert [r.user for r in memory.records] == ["my cat", "my job"]
+        memory.add(Interaction("sleep badly", "ok"))
+        memory.close()
+
+        reloaded = LongTermMemory(path, KeywordEmbedder(), model="kw")
+        assert [r.user for r in reloaded.records] == ["my cat", "my job", "sleep badly"]
+        assert reloaded.search("sleep", k=1)[0].user == "sleep badly"
+        reloaded.close()
+
+    def test_crash_between_appends_keeps_records_aligned(self, tmp_path):
+        """Test a record written without its vector is cut before new batches."""
+        from src.sam_ai.core.long_term_memory import LongTermMemory
+
+        path = self._long_term(tmp_path / "ltm", ["my cat"])
+        with open(path / "records.jsonl", "a", encoding="utf-8") as f:
+            f.write(json.dumps({"timestamp": 2, "user": "orphan", "assistant": "ok"}) + "\n")
+
+        memory = LongTermMemory(path, KeywordEmbedder(), model="kw", batch_size=1)
+        memory.add(Interaction("my job", "ok"))
+        memory.close()
+
+        reloaded = LongTermMemory(path, KeywordEmbedder(), model="kw")
+        assert [r.user for r in reloaded.records] == ["my cat", "my job"]
+        assert reloaded.search("job", k=1)[0].user == "my job"
+        reloaded.close()
+
+    def test_ivf_index_matches_exact_search(self):
+        """Test the clustered index finds the same nearest neighbour as brute force."""
+        np = pytest.importorskip("numpy")
+        from src.sam_ai.core.long_term_memory import VectorIndex
+
+        rng = np.random.default_rng(0)
+        vectors = rng.standard_normal((3000, 16)).astype(np.float32)
+        index = VectorIndex(16, exact_search_limit=500, nprobe=4)
+        for start in range(0, len(vectors), 250):
+            index.add(vectors[start : start + 250])
+
+        assert index._centroids is not None
+        query = vectors[1234] + 0.01
+        assert index.search(query, 1)[0][0] == 1234
+
+
+class TestTokenBudget:
+    """Test history selection by token budget."""
+
+    def test_long_turns_are_dropped_first(self, memory_dir):
+        """Test only the newest turns that fit the budget are returned."""
+        memory = MemoryManager()
+        memory.add_interaction("long " * 400, "reply")
+        memory.add_interaction("short", "reply")
+
+        context = memory.get_context("Next", token_budget=100)
+
+        assert context == [
+            {"role": "user", "content": "short"},
+            {"role": "assistant", "content": "reply"},
+        ]
+        assert memory.conversation_history[0]["tokens"] > 100
+
+    def test_window_start_is_stable_until_it_overflows(self, memory_dir, monkeypatch):
+        """Test history keeps the same first turn across prompts while it fits."""
+        monkeypatch.setattr(settings, "max_chat_history", 20)
+        monkeypatch.setattr(settings, "context_refill_ratio", 0.5)
+        memory = MemoryManager()
+        for i in range(4):
+            memory.add_interaction(f"message {i}", "reply")
+        turn_tokens = memory.conversation_history[0]["tokens"]
+        budget = turn_tokens * 6
+
+        first = memory.get_context("Next", token_budget=budget)
+        memory.add_interaction("message 4", "reply")
+        second = memory.get_context("Next", token_budget=budget)
+        assert second[: len(first)] == first  # prefix unchanged
+
+        memory.add_interaction("message 5", "reply")
+        memory.add_interaction("message 6", "reply")
+        third = memory.get_context("Next", token_budget=budget)
+        assert third[0]["content"] == "message 4"  # re-anchored to half the budget
+        assert len(third) == 6
+
+
+class TestSummarization:
+    """Test rolling summaries of turns leaving the recent window."""
+
+    @pytest.fixture(autouse=True)
+    def summarization(self, memory_dir, monkeypatch):
+        monkeypatch.setattr(settings, "summarization_enabled", True)
+        monkeypatch.setattr(settings, "summarize_every", 2)
+
+    def _summarizer(self):
+        provider = MagicMock()
+        provider.chat_completion.side_effect = lambda messages, model: (
+            "Summary of: " + messages[-1]["content"].split("New turns:\n")[1]
+        )
+        return provider
+
+    def test_evicted_turns_are_summarized(self, memory_dir):
+        """Test turns pushed out of the window end up in the summary."""
+        provider = self._summarizer()
+        memory = MemoryManager(summary_provider=provider)
+        for i in range(7):
+            memory.add_interaction(f"message {i}", f"reply {i}")
+        memory.flush_summary()
+
+        assert "message 0" in memory.summary
+        assert "message 1" in memory.summary
+        assert "message 2" not in memory.summary  # still in the recent window
+        assert memory._session.pending == []
+
+        memory.close()
+        assert MemoryManager(summary_provider=provider).summary == memory.summary
+
+    def test_failed_summary_keeps_turns_pending(self, memory_dir):
+        """Test a provider error leaves turns queued for the next attempt."""
+        provider = MagicMock()
+        provider.chat_completion.side_effect = ConnectionError("Ollama is down")
+        memory = MemoryManager(summary_provider=provider)
+        for i in range(7):
+            memory.add_interaction(f"message {i}", f"reply {i}")
+        memory.flush_summary()
+
+        assert memory.summary == ""
+        assert [i["user"] for i in memory._session.pending] == ["message 0", "message 1"]
+
+    def test_managers_of_one_session_share_the_summary(self, memory_dir):
+        """Test turns written through two managers are each summarized once."""
+        provider = self._summarizer()
+        first = MemoryManager(summary_provider=provider)
+        second = MemoryManager(summary_provider=provider)
+        for i in range(9):
+            (first if i % 2 else second).add_interaction(f"message {i}", f"reply {i}")
+        first.flush_summary()
+
+        sent = [
+            call.args[0][-1]["content"].split("New turns:\n")[1]
+            for call in provider.chat_completion.call_args_list
+        ]
+        assert first.conversation_history is second.conversation_history
+        assert first.summary == second.summary
+        assert [f"User: message {i}\n" in "".join(sent) for i in range(5)] == [True] * 4 + [False]
+        assert sum(t.count("User: ") for t in sent) == 4  # Each evicted turn once
+
+    @pytest.mark.parametrize("budget_turns", [None, 4])
+    def test_no_turn_is_missing_from_both_prompt_and_summary(
+        self, memory_dir, monkeypatch, budget_turns
+    ):
+        """Test every turn is in the prompt window or the summary, at every turn."""
+        monkeypatch.setattr(settings, "max_chat_history", 20)
+        monkeypatch.setattr(settings, "context_refill_ratio", 0.5)
+        provider = MagicMock()
+        provider.chat_completion.side_effect = lambda messages, model: messages[-1]["content"]
+        memory = MemoryManager(summary_provider=provider)
+
+        for i in range(30):
+            memory.add_interaction(f"message {i}", f"reply {i}")
+            budget = budget_turns and memory.conversation_history[0]["tokens"] * budget_turns
+            prompt = {m["content"] for m in memory.get_context("Next", token_budget=budget)}
+            summary = memory.prompt_summary
+            missing = [
+                j for j in range(i + 1)
+                if f"message {j}" not in prompt and f"User: message {j}\n" not in summary
+            ]
+            assert missing == []
+            memory.flush_summary()
+
+        assert "User: message 0\n" in memory.summary
+
+
+class TestConcurrency:
+    """Stress memory with many writer and reader threads."""
+
+    WRITERS = 16
+    TURNS = 25
+
+    @pytest.fixture(params=["jsonl", "sqlite"])
+    def backend(self, request, memory_dir, monkeypatch):
+        monkeypatch.setattr(settings, "memory_backend", request.param)
+        monkeypatch.setattr(settings, "max_chat_history", self.WRITERS * self.TURNS)
+        return request.param
+
+    def _run(self, targets):
+        """Start every target at once and re-raise the first failure."""
+        barrier = threading.Barrier(len(targets))
+        errors = []
+
+        def run(target):
+            barrier.wait()
+            try:
+                target()
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=run, args=(t,)) for t in targets]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if errors:
+            raise errors[0]
+
+    def test_concurrent_writes_lose_no_turns(self, backend):
+        """Test turns written through several managers of one session all persist, in order."""
+        managers = [MemoryManager("alice", "shared") for _ in range(4)]
+
+        def writer(w):
+            memory = managers[w % len(managers)]
+            return lambda: [
+                memory.add_interaction(f"w{w} turn {i}", f"reply {i}") for i in range(self.TURNS)
+            ]
+
+        def reader():
+            for _ in range(50):
+                for memory in managers:
+                    context = memory.get_context("hello", token_budget=2000)
+                    assert [m["role"] for m in context] == ["user", "assistant"] * (len(context) // 2)
+
+        self._run([writer(w) for w in range(self.WRITERS)] + [reader] * 4)
+        for memory in managers:
+            memory.close()
+        del managers, memory
+        gc.collect()  # Release the shared session so the next manager reloads from disk
+
+        stored = [i["user"] for i in MemoryManager("alice", "shared").conversation_history]
+        assert len(stored) == self.WRITERS * self.TURNS
+        for w in range(self.WRITERS):
+            assert [u for u in stored if u.startswith(f"w{w} ")] == [
+                f"w{w} turn {i}" for i in range(self.TURNS)
+            ]
+
+    def test_readers_keep_a_consistent_snapshot(self, memory_dir):
+        """Test a window read before a write is never changed by it."""
+        memory = MemoryManager()
+        for i in range(5):
+            memory.add_interaction(f"message {i}", f"reply {i}")
+
+        snapshot = memory.conversation_history
+        self._run([lambda: memory.add_interaction("new", "reply")] * 8)
+
+        assert [i["user"] for i in snapshot] == [f"message {i}" for i in range(5)]
+        assert [i["user"] for i in memory.conversation_history] == ["new"] * 5
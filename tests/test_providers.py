@@ -2,15 +2,29 @@
 Tests for AI providers.
 """
 
+import asyncio
+import json
+import threading
+import time
+
+import httpx
 import pytest
-from unittest.mock import patch, MagicMock
-from src.sam_ai.providers.ollama_provider import OllamaProvider
+from unittest.mock import patch, MagicMock, AsyncMock
+from src.sam_ai.config import settings
+from src.sam_ai.providers.ollama_provider import OllamaProvider, close_sessions
 from src.sam_ai.providers.openai_provider import OpenAIProvider
+from src.sam_ai.providers.cached_provider import CachedProvider, ResponseCache
+from src.sam_ai.providers.router_provider import Backend, RouterProvider
+from src.sam_ai.providers.catalog import ModelCatalog
+from src.sam_ai.providers import ProviderBusy
+from src.sam_ai.providers.scheduler import (
+    BATCH, INTERACTIVE, Scheduler, SchedulingProvider, request_scope
+)
 
 class TestOllamaProvider:
     """Test Ollama provider functionality."""
     
-    @patch('requests.post')
+    @patch('requests.Session.post')
     def test_chat_completion_success(self, mock_post):
         """Test successful chat completion."""
         mock_response = MagicMock()
@@ -28,7 +42,7 @@ class TestOllamaProvider:
         assert response == "Hello, I'm an AI assistant."
         mock_post.assert_called_once()
     
-    @patch('requests.post')
+    @patch('requests.Session.post')
     def test_chat_completion_failure(self, mock_post):
         """Test chat completion failure."""
         mock_post.side_effect = ConnectionError("Connection failed")
@@ -39,6 +53,135 @@ class TestOllamaProvider:
         with pytest.raises(ConnectionError):
             provider.chat_completion(messages, "phi3")
 
+    @patch('requests.Session.post')
+    def test_chat_completion_stream(self, mock_post):
+        """Test that streamed NDJSON chunks are yielded as text deltas."""
+        mock_response = MagicMock()
+        mock_response.iter_lines.return_value = [
+            b'{"message": {"role": "assistant", "content": "Hel"}, "done": false}',
+            b'',
+            b'{"message": {"role": "assistant", "content": "lo"}, "done": false}',
+            b'{"message": {"role": "assistant", "content": ""}, "done": true}',
+        ]
+        mock_post.return_value.__enter__.return_value = mock_response
+
+        provider = OllamaProvider(base_url="http://localhost:11434")
+        messages = [{"role": "user", "content": "Hello"}]
+
+        chunks = list(provider.chat_completion_stream(messages, "phi3"))
+
+        assert chunks == ["Hel", "lo"]
+        assert mock_post.call_args.kwargs["json"]["stream"] is True
+
+    @patch('requests.Session.post')
+    def test_chat_with_tools_parses_tool_calls(self, mock_post):
+        """Test native tool calls are returned with ids and dict arguments."""
+        mock_response = MagicMock()
+        mock_response.status_code = 200
+        mock_response.json.return_value = {
+            "message": {
+                "role": "assistant",
+                "content": "",
+                "tool_calls": [
+                    {"function": {"name": "calculator", "arguments": {"expression": "2+2"}}}
+                ],
+            }
+        }
+        mock_post.return_value = mock_response
+
+        provider = OllamaProvider(base_url="http://localhost:11434")
+        tools = [{"type": "function", "function": {"name": "calculator"}}]
+        turn = provider.chat_with_tools([{"role": "user", "content": "2+2?"}], "llama3.1", tools)
+
+        assert mock_post.call_args.kwargs["json"]["tools"] == tools
+        assert turn["tool_calls"] == [
+            {"id": "call_0", "name": "calculator", "arguments": {"expression": "2+2"}}
+        ]
+        assert provider.tool_result_message(turn["tool_calls"][0], "4") == {
+            "role": "tool", "tool_name": "calculator", "content": "4"
+        }
+
+    @patch('requests.Session.post')
+    def test_options_and_keep_alive_from_settings(self, mock_post, monkeypatch):
+        """Test configured model options and keep_alive are sent with each chat."""
+        monkeypatch.setattr(settings, "ollama_options", {"temperature": 0.2})
+        monkeypatch.setattr(settings, "ollama_num_ctx", 8192)
+        monkeypatch.setattr(settings, "ollama_keep_alive", "-1")
+        mock_post.return_value.json.return_value = {"message": {"content": "Hi"}}
+
+        provider = OllamaProvider(base_url="http://localhost:11434")
+        provider.chat_completion([], "phi3", options={"temperature": 0.7})
+
+        payload = mock_post.call_args.kwargs["json"]
+        assert payload["options"] == {"temperature": 0.7, "num_ctx": 8192}
+        assert payload["keep_alive"] == -1
+
+    @patch('requests.Session.post')
+    def test_warm_up_loads_model_once(self, mock_post):
+        """Test warm-up sends one empty chat request per model."""
+        provider = OllamaProvider(base_url="http://warm-up-host:11434")
+
+        provider.warm_up("phi3")
+        provider.warm_up("phi3")
+
+        mock_post.assert_called_once()
+        assert mock_post.call_args.kwargs["json"]["messages"] == []
+
+    def test_session_shared_per_base_url(self):
+        """Test that providers for the same host reuse one pooled session."""
+        close_sessions()
+        first = OllamaProvider(base_url="http://localhost:11434")
+        second = OllamaProvider(base_url="http://localhost:11434/")
+        other = OllamaProvider(base_url="http://gpu-box:11434")
+
+        assert first.session is second.session
+        assert first.session is not other.session
+        assert first.timeout[0] < first.timeout[1]  # separate connect/read timeouts
+        close_sessions()
+
+    def test_achat_completion(self):
+        """Test the async chat path against a mocked Ollama endpoint."""
+        def handler(request):
+            assert request.url.path == "/api/chat"
+            assert json.loads(request.content)["stream"] is False
+            return httpx.Response(200, json={"message": {"content": "Async hello"}})
+
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        provider = OllamaProvider(base_url="http://localhost:11434")
+        messages = [{"role": "user", "content": "Hello"}]
+
+        with patch(
+            'src.sam_ai.providers.ollama_provider.get_async_client', return_value=client
+        ):
+            response = asyncio.run(provider.achat_completion(messages, "phi3"))
+
+        assert response == "Async hello"
+
+    def test_ais_available_connection_error(self):
+        """Test the async probe reports unavailable when Ollama is unreachable."""
+        def handler(request):
+            raise httpx.ConnectError("Connection refused")
+
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        provider = OllamaProvider(base_url="http://localhost:11434")
+
+        with patch(
+            'src.sam_ai.providers.ollama_provider.get_async_client', return_value=client
+        ):
+            assert asyncio.run(provider.ais_available()) is False
+
+    @patch('requests.Session.get')
+    def test_running_models(self, mock_get):
+        """Test loaded models are read from /api/ps."""
+        mock_get.return_value.json.return_value = {"models": [
+            {"name": "llama3:8b", "size_vram": 5137025024, "expires_at": "2026-01-01T00:05:00Z"},
+        ]}
+
+        models = OllamaProvider(base_url="http://localhost:11434").running_models()
+
+        assert models == [{"name": "llama3:8b", "size_vram": 5137025024, "expires_at": "2026-01-01T00:05:00Z"}]
+        assert mock_get.call_args.args[0] == "http://localhost:11434/api/ps"
+
 class TestOpenAIProvider:
     """Test OpenAI provider functionality."""
     
@@ -63,4 +206,443 @@ class TestOpenAIProvider:
         response = provider.chat_completion(messages, "gpt-4")
         
         assert response == "Hello from OpenAI"
-        mock_client.chat.completions.create.assert_called_once()
\ No newline at end of file
+        mock_client.chat.completions.create.assert_called_once()
+
+    @patch('openai.OpenAI')
+    def test_chat_completion_stream(self, mock_openai):
+        """Test that streamed deltas are yielded and Sam-only kwargs are dropped."""
+        mock_client = MagicMock()
+        chunks = []
+        for content in ["Hello", None, " there"]:
+            chunk = MagicMock()
+            chunk.choices = [MagicMock()]
+            chunk.choices[0].delta.content = content
+            chunks.append(chunk)
+        mock_client.chat.completions.create.return_value = iter(chunks)
+        mock_openai.return_value = mock_client
+
+        provider = OpenAIProvider(api_key="test-key")
+        messages = [{"role": "user", "content": "Hello"}]
+
+        result = list(provider.chat_completion_stream(messages, "gpt-4", mode="chat"))
+
+        assert result == ["Hello", " there"]
+        call_kwargs = mock_client.chat.completions.create.call_args.kwargs
+        assert call_kwargs["stream"] is True
+        assert "mode" not in call_kwargs
+
+
+    @patch('openai.OpenAI')
+    def test_list_models_keeps_chat_models(self, mock_openai):
+        """Test the live model list is filtered to chat models, with a static fallback."""
+        mock_client = MagicMock()
+        mock_client.models.list.return_value = [
+            MagicMock(id=name) for name in ["text-embedding-3-small", "gpt-4o", "whisper-1", "o3-mini", "gpt-4o-realtime"]
+        ]
+        mock_openai.return_value = mock_client
+
+        assert OpenAIProvider(api_key="test-key").list_models() == ["gpt-4o", "o3-mini"]
+        assert "gpt-4o" in OpenAIProvider(api_key=None).list_models()
+
+    @patch('openai.OpenAI')
+    def test_compatible_endpoints_list_models_as_served(self, mock_openai):
+        """Test a custom base_url's models aren't filtered or replaced by OpenAI's."""
+        mock_client = MagicMock()
+        mock_client.models.list.return_value = [
+            MagicMock(id=name) for name in ["meta-llama/Llama-3.1-8B-Instruct", "Qwen/Qwen2.5-7B"]
+        ]
+        mock_openai.return_value = mock_client
+        base_url = "http://vllm.internal:8000/v1"
+
+        assert OpenAIProvider(api_key="test-key", base_url=base_url).list_models() == [
+            "Qwen/Qwen2.5-7B", "meta-llama/Llama-3.1-8B-Instruct",
+        ]
+        assert OpenAIProvider(api_key=None, base_url=base_url).list_models() == []
+
+    @patch('openai.AsyncOpenAI')
+    @patch('openai.OpenAI')
+    def test_alist_models_uses_async_client(self, mock_openai, mock_async_openai):
+        """Test the async model list never calls the blocking client."""
+        async def models():
+            for name in ["gpt-4o", "whisper-1"]:
+                yield MagicMock(id=name)
+
+        mock_async_client = MagicMock()
+        mock_async_client.models.list.side_effect = models
+        mock_async_openai.return_value = mock_async_client
+
+        provider = OpenAIProvider(api_key="test-key")
+
+        assert asyncio.run(provider.alist_models()) == ["gpt-4o"]
+        mock_openai.return_value.models.list.assert_not_called()
+
+    @patch('openai.AsyncOpenAI')
+    @patch('openai.OpenAI')
+    def test_achat_completion(self, mock_openai, mock_async_openai):
+        """Test the async chat path uses the AsyncOpenAI client."""
+        mock_client = MagicMock()
+        mock_response = MagicMock()
+        mock_response.choices = [MagicMock()]
+        mock_response.choices[0].message.content = "Async hello"
+        mock_client.chat.completions.create = AsyncMock(return_value=mock_response)
+        mock_async_openai.return_value = mock_client
+
+        provider = OpenAIProvider(api_key="test-key")
+        messages = [{"role": "user", "content": "Hello"}]
+
+        response = asyncio.run(provider.achat_completion(messages, "gpt-4"))
+
+        assert response == "Async hello"
+        mock_client.chat.completions.create.assert_awaited_once()
+
+
+class TestCachedProvider:
+    """Test the response cache wrapper."""
+
+    def _provider(self):
+        inner = MagicMock()
+        inner.base_url = "http://localhost:11434"
+        inner.chat_completion.side_effect = lambda messages, model, **kw: f"Reply {model}"
+        inner.chat_completion_stream.side_effect = lambda messages, model, **kw: iter(
+            ["Re", "ply"]
+        )
+        return inner
+
+    def test_identical_requests_hit_cache(self):
+        """Test a repeated request is served from memory and counted."""
+        inner = self._provider()
+        provider = CachedProvider(inner, ResponseCache(max_entries=2))
+        messages = [{"role": "user", "content": "Hello"}]
+
+        assert provider.chat_completion(messages, "phi3") == "Reply phi3"
+        assert provider.chat_completion(messages, "phi3") == "Reply phi3"
+        provider.chat_completion(messages, "phi3", options={"temperature": 0.1})
+
+        assert inner.chat_completion.call_count == 2
+        assert provider.cache.stats()["hits"] == 1
+        assert provider.cache.stats()["misses"] == 2
+
+    def test_lru_and_ttl_eviction(self):
+        """Test the oldest entry is evicted and expired entries miss."""
+        cache = ResponseCache(max_entries=2, ttl=60)
+        for key in ("a", "b", "c"):
+            cache.put(key, key.upper())
+
+        assert cache.get("a") is None
+        assert cache.get("c") == "C"
+
+        with patch("time.time", return_value=10**12):
+            assert cache.get("c") is None
+
+    def test_disk_tier_survives_restart(self, tmp_path):
+        """Test a new cache instance finds responses written to disk."""
+        messages = [{"role": "user", "content": "Hello"}]
+        first = CachedProvider(self._provider(), ResponseCache(disk_path=tmp_path / "c.db"))
+        assert list(first.chat_completion_stream(messages, "phi3")) == ["Re", "ply"]
+
+        inner = self._provider()
+        second = CachedProvider(inner, ResponseCache(disk_path=tmp_path / "c.db"))
+
+        assert list(second.chat_completion_stream(messages, "phi3")) == ["Reply"]
+        inner.chat_completion_stream.assert_not_called()
+        assert second.cache.stats()["disk_hits"] == 1
+
+    def test_async_path_reads_disk_off_the_event_loop(self, tmp_path):
+        """Test the async methods touch SQLite only from worker threads."""
+        inner = self._provider()
+        inner.achat_completion = AsyncMock(return_value="Reply")
+        cache = ResponseCache(disk_path=tmp_path / "c.db")
+        provider = CachedProvider(inner, cache)
+        threads = []
+        for name in ("_get_disk", "_put_disk"):
+            method = getattr(cache, name)
+
+            def record(*args, _method=method):
+                threads.append(threading.get_ident())
+                return _method(*args)
+
+            setattr(cache, name, record)
+
+        async def scenario():
+            loop_thread = threading.get_ident()
+            messages = [{"role": "user", "content": "Hello"}]
+            assert await provider.achat_completion(messages, "phi3") == "Reply"
+            cache._memory.clear()  # Force the next lookup to the disk tier
+            assert await provider.achat_completion(messages, "phi3") == "Reply"
+            return loop_thread
+
+        loop_thread = asyncio.run(scenario())
+        assert len(threads) == 3 and loop_thread not in threads
+        assert inner.achat_completion.await_count == 1
+        assert cache.stats()["disk_hits"] == 1
+
+
+class TestRouterProvider:
+    """Test routing, failover and hedging across backends."""
+
+    @pytest.fixture(autouse=True)
+    def no_retry_delay(self, monkeypatch):
+        monkeypatch.setattr(settings, "router_retry_base_delay", 0.0)
+
+    def _backend(self, name, reply=None, error=None, delay=0.0):
+        provider = MagicMock()
+
+        def chat(messages, model, **kwargs):
+            time.sleep(delay)
+            if error:
+                raise error
+            return reply
+
+        provider.chat_completion.side_effect = chat
+        return Backend(provider, name=name)
+
+    def test_failover_and_backoff(self):
+        """Test a failing backend is retried elsewhere and then skipped."""
+        down = self._backend("down", error=ConnectionError("refused"))
+        up = self._backend("up", reply="Hi")
+        router = RouterProvider([down, up])
+        messages = [{"role": "user", "content": "Hello"}]
+
+        assert router.chat_completion(messages, "phi3") == "Hi"
+        assert router.chat_completion(messages, "phi3") == "Hi"
+
+        assert down.provider.chat_completion.call_count == 1
+        assert [s["available"] for s in router.stats()] == [False, True]
+
+    def test_all_backends_failing(self):
+        """Test the router raises once every attempt has failed."""
+        router = RouterProvider([self._backend("a", error=ConnectionError("refused"))])
+
+        with pytest.raises(ConnectionError):
+            router.chat_completion([{"role": "user", "content": "Hello"}], "phi3")
+
+    def test_prefers_fast_idle_backend(self):
+        """Test selection weighs latency by requests in flight."""
+        slow, fast = self._backend("slow", reply="slow"), self._backend("fast", reply="fast")
+        slow.latency, fast.latency = 2.0, 0.5
+        router = RouterProvider([slow, fast])
+
+        assert router.chat_completion([], "phi3") == "fast"
+        fast.in_flight = 4  # 0.5s * 5 queued > 2.0s * 1
+        assert router.chat_completion([], "phi3") == "slow"
+
+    def test_hedges_past_p95(self, monkeypatch):
+        """Test a request running past the p95 latency is duplicated elsewhere."""
+        monkeypatch.setattr(settings, "router_hedge_min_samples", 5)
+        stuck = self._backend("stuck", reply="late", delay=0.5)
+        spare = self._backend("spare", reply="hedged")
+        stuck.samples.extend([0.01] * 10)
+        spare.latency = 1.0  # Never preferred on its own
+        router = RouterProvider([stuck, spare], hedge=True)
+
+        start = time.monotonic()
+        assert router.chat_completion([], "phi3") == "hedged"
+        assert time.monotonic() - start < 0.4
+
+    def test_stream_retries_before_first_chunk(self):
+        """Test a stream that fails to start is retried on another backend."""
+        down, up = MagicMock(), MagicMock()
+        down.chat_completion_stream.side_effect = ConnectionError("refused")
+        up.chat_completion_stream.return_value = iter(["Hi", "!"])
+        router = RouterProvider([down, up])
+
+        assert list(router.chat_completion_stream([], "phi3")) == ["Hi", "!"]
+
+    def test_router_is_shared_by_the_process(self, monkeypatch):
+        """Test every get_provider('router') sees the same backend health."""
+        from src.sam_ai.providers import get_provider, router_provider
+
+        monkeypatch.setattr(router_provider, "_router", None)
+        monkeypatch.setattr(settings, "response_cache_enabled", False)
+
+        assert get_provider("router") is get_provider("router")
+
+
+class TestModelCatalog:
+    """Test the cached, background-refreshed model catalog."""
+
+    def _provider(self):
+        provider = MagicMock()
+        provider.is_available.return_value = True
+        provider.list_models.return_value = ["phi3", "llama3"]
+        provider.running_models.return_value = [{"name": "phi3"}]
+        return provider
+
+    def test_reads_are_served_from_memory(self):
+        provider = self._provider()
+        catalog = ModelCatalog(provider, ttl=60)
+
+        assert catalog.models() == ["phi3", "llama3"]
+        assert catalog.loaded_models() == [{"name": "phi3"}]
+        assert catalog.is_available()
+        assert provider.list_models.call_count == 1
+
+    def test_stale_reads_refresh_in_background(self):
+        provider = self._provider()
+        catalog = ModelCatalog(provider, ttl=0)
+        catalog.refresh()
+        provider.list_models.return_value = ["mistral"]
+
+        assert catalog.models() == ["phi3", "llama3"]  # Stale answer, returned at once
+        deadline = time.monotonic() + 2
+        while catalog.models() != ["mistral"] and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert catalog.models() == ["mistral"]
+
+    def test_outage_keeps_last_known_models(self):
+        provider = self._provider()
+        catalog = ModelCatalog(provider, ttl=60)
+        catalog.refresh()
+        provider.is_available.side_effect = ConnectionError("refused")
+
+        state = catalog.refresh()
+
+        assert state.available is False and "refused" in state.error
+        assert state.models == ("phi3", "llama3")
+        assert state.loaded == ()
+
+    def test_poller_keeps_catalog_current(self):
+        provider = self._provider()
+        catalog = ModelCatalog(provider, ttl=60, poll_interval=0.01).start()
+        try:
+            deadline = time.monotonic() + 2
+            while provider.list_models.call_count < 2 and time.monotonic() < deadline:
+                time.sleep(0.01)
+        finally:
+            catalog.stop()
+        assert provider.list_models.call_count >= 2
+
+
+class TestScheduler:
+    """Test per-backend limits, priorities, fairness and busy rejection."""
+
+    def _scheduler(self, limit=1, max_queue=8):
+        scheduler = Scheduler(max_queue=max_queue, instrumentation=MagicMock())
+        scheduler.add_backend("gpu", limit)
+        return scheduler
+
+    def test_limits_concurrent_generations(self):
+        """Test no more than `limit` requests reach the backend at once."""
+        in_flight = max_in_flight = 0
+        lock = threading.Lock()
+
+        def chat(messages, model, **kwargs):
+            nonlocal in_flight, max_in_flight
+            with lock:
+                in_flight += 1
+                max_in_flight = max(max_in_flight, in_flight)
+            time.sleep(0.02)
+            with lock:
+                in_flight -= 1
+            return "Hi"
+
+        inner = MagicMock()
+        inner.chat_completion.side_effect = chat
+        provider = SchedulingProvider(inner, 2, name="gpu", scheduler=self._scheduler(2))
+        threads = [
+            threading.Thread(target=provider.chat_completion, args=([], "phi3")) for _ in range(6)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert max_in_flight == 2
+        assert provider.scheduler.stats()[0]["admitted"] == 6
+
+    def test_priority_then_users_take_turns(self):
+        """Test interactive requests go first, and users alternate within a priority."""
+        scheduler = self._scheduler()
+        order = []
+
+        async def request(user, priority):
+            with request_scope(user=user, priority=priority):
+                async with scheduler.aslot("gpu"):
+                    order.append(user)
+
+        async def run():
+            async with scheduler.aslot("gpu"):  # Occupy the only slot
+                tasks = [asyncio.ensure_future(request(u, BATCH)) for u in ["job"] * 2]
+                tasks += [asyncio.ensure_future(request(u, INTERACTIVE)) for u in "aaab"]
+                await asyncio.sleep(0.01)
+                assert scheduler.stats()[0]["queued_by_priority"] == {
+                    "interactive": 4, "agent": 0, "batch": 2
+                }
+            await asyncio.gather(*tasks)
+
+        asyncio.run(run())
+
+        assert order == ["a", "b", "a", "a", "job", "job"]
+
+    def test_wait_past_timeout_is_turned_away(self):
+        """Test a request that can't get a slot in time fails fast as busy."""
+        scheduler = self._scheduler()
+
+        with scheduler.slot("gpu"):
+            with request_scope(timeout=0.05):
+                start = time.monotonic()
+                with pytest.raises(ProviderBusy):
+                    with scheduler.slot("gpu"):
+                        pass
+        assert time.monotonic() - start < 1
+        stats = scheduler.stats()[0]
+        assert (stats["active"], stats["queued"], stats["timed_out"]) == (0, 0, 1)
+
+    def test_full_queue_sheds_lower_priority(self):
+        """Test a full queue rejects new work, unless it outranks queued work."""
+        scheduler = self._scheduler(max_queue=1)
+        outcome = {}
+
+        def wait(name, priority):
+            with request_scope(user=name, priority=priority, timeout=5):
+                try:
+                    with scheduler.slot("gpu"):
+                        outcome[name] = "served"
+                except ProviderBusy:
+                    outcome[name] = "busy"
+
+        with scheduler.slot("gpu"):
+            batch = threading.Thread(target=wait, args=("batch", BATCH))
+            batch.start()
+            while scheduler.stats()[0]["queued"] < 1:
+                time.sleep(0.001)
+            wait("late", BATCH)  # Queue full, nothing to outrank
+            chat = threading.Thread(target=wait, args=("chat", INTERACTIVE))
+            chat.start()
+            batch.join(timeout=5)
+        chat.join(timeout=5)
+
+        assert outcome == {"late": "busy", "batch": "busy", "chat": "served"}
+
+    def test_router_does_not_fail_busy_backend(self):
+        """Test a backend turning requests away stays healthy in the router."""
+        busy = MagicMock()
+        busy.chat_completion.side_effect = ProviderBusy("full")
+        router = RouterProvider([Backend(busy, name="busy")])
+
+        with pytest.raises(ProviderBusy):
+            router.chat_completion([], "phi3")
+        assert router.stats()[0]["available"] is True
+
+    def test_router_tries_other_backends_when_one_is_busy(self, monkeypatch):
+        """Test a full queue moves the request on at once, without a retry delay."""
+        monkeypatch.setattr(settings, "router_retry_base_delay", 10.0)
+        busy = MagicMock()
+        busy.chat_completion.side_effect = ProviderBusy("full")
+        busy.achat_completion = AsyncMock(side_effect=ProviderBusy("full"))
+        idle = MagicMock()
+        idle.chat_completion.return_value = "Hi"
+        idle.achat_completion = AsyncMock(return_value="Hi")
+        router = RouterProvider(
+            [Backend(busy, name="busy"), Backend(idle, name="idle")], max_retries=0, hedge=False
+        )
+
+        start = time.monotonic()
+        assert router.chat_completion([], "phi3") == "Hi"
+        assert asyncio.run(router.achat_completion([], "phi3")) == "Hi"
+        assert time.monotonic() - start < 1
+        assert [b["available"] for b in router.stats()] == [True, True]
+
+        idle.chat_completion.side_effect = ProviderBusy("full too")
+        with pytest.raises(ProviderBusy):
+            router.chat_completion([], "phi3")
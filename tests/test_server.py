@@ -0,0 +1,158 @@
+"""
+Tests for the HTTP API.
+"""
+
+import asyncio
+import json
+
+import pytest
+from unittest.mock import patch, MagicMock, AsyncMock
+from starlette.testclient import TestClient
+from src.sam_ai.config import settings
+from src.sam_ai.providers import ProviderBusy
+from src.sam_ai.server import SessionPool, create_app, main
+
+
+async def _stream(messages, model, **kwargs):
+    for chunk in ["Hello ", "there"]:
+        yield chunk
+
+
+@pytest.fixture
+def provider():
+    provider = MagicMock()
+    provider.achat_completion = AsyncMock(return_value="Hi!")
+    provider.achat_completion_stream = _stream
+    provider.list_models.return_value = ["llama3", "mistral"]
+    provider.running_models.return_value = [{"name": "llama3"}]
+    provider.is_available.return_value = True
+    return provider
+
+
+@pytest.fixture
+def client(provider, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "memory_persistence_path", tmp_path)
+    monkeypatch.setattr(settings, "ollama_warm_up", False)
+    with patch("src.sam_ai.server.get_provider", return_value=provider), \
+            patch("src.sam_ai.core.engine.get_provider", return_value=provider):
+        with TestClient(create_app(max_sessions=2)) as client:
+            yield client
+
+
+def _events(text):
+    """Parse a Server-Sent Events body into (event, data) pairs."""
+    events = []
+    for block in text.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((fields.get("event", "message"), json.loads(fields["data"])))
+    return events
+
+
+class TestServer:
+    def test_health_and_models(self, client):
+        assert client.get("/health").json()["provider_available"] is True
+        models = client.get("/models").json()
+        assert models["models"] == ["llama3", "mistral"]
+        assert models["loaded"] == [{"name": "llama3"}]
+
+    def test_chat_uses_per_session_memory(self, client, provider):
+        assert client.post("/chat", json={"message": "I'm Alice", "session_id": "a"}).json() == {
+            "response": "Hi!", "session_id": "a",
+        }
+        client.post("/chat", json={"message": "I'm Bob", "session_id": "b"})
+        client.post("/chat", json={"message": "Who am I?", "session_id": "a"})
+
+        messages = provider.achat_completion.call_args.kwargs["messages"]
+        contents = [m["content"] for m in messages]
+        assert "I'm Alice" in contents and "I'm Bob" not in contents
+
+    def test_chat_stream(self, client):
+        response = client.post("/chat/stream", json={"message": "Hi", "session_id": "s"})
+
+        assert response.headers["content-type"].startswith("text/event-stream")
+        assert _events(response.text) == [
+            ("message", {"content": "Hello "}),
+            ("message", {"content": "there"}),
+            ("done", {}),
+        ]
+        exported = client.get("/sessions/s/memory").json()
+        assert [(r["user"], r["assistant"]) for r in exported] == [("Hi", "Hello there")]
+
+    def test_export_and_clear_memory(self, client):
+        for i in range(3):
+            client.post("/chat", json={"message": f"message {i}", "session_id": "s", "user_id": "u"})
+
+        lines = client.get("/sessions/s/memory?user_id=u&format=jsonl").text.splitlines()
+        assert [json.loads(line)["user"] for line in lines] == ["message 0", "message 1", "message 2"]
+
+        assert client.delete("/sessions/s/memory?user_id=u").status_code == 204
+        assert client.get("/sessions/s/memory?user_id=u").json() == []
+
+    def test_evicted_sessions_reload_from_disk(self, client):
+        client.post("/chat", json={"message": "remember me", "session_id": "first"})
+        for session_id in ("second", "third"):  # Pushes "first" out of the pool of 2
+            client.post("/chat", json={"message": "hi", "session_id": session_id})
+
+        assert client.get("/sessions/first/memory").json()[0]["user"] == "remember me"
+
+    def test_sessions_share_the_app_provider(self, provider, tmp_path, monkeypatch):
+        monkeypatch.setattr(settings, "memory_persistence_path", tmp_path)
+        monkeypatch.setattr(settings, "ollama_warm_up", False)
+        with patch("src.sam_ai.server.get_provider", return_value=provider), \
+                patch("src.sam_ai.core.engine.get_provider", side_effect=AssertionError):
+            with TestClient(create_app()) as client:
+                for session_id in ("a", "b"):
+                    assert client.post("/chat", json={"message": "hi", "session_id": session_id}).json()["response"] == "Hi!"
+
+    def test_sessions_in_use_are_not_evicted(self, provider, tmp_path, monkeypatch):
+        monkeypatch.setattr(settings, "memory_persistence_path", tmp_path)
+        monkeypatch.setattr(settings, "ollama_warm_up", False)
+        pool = SessionPool(max_sessions=1, provider=provider)
+
+        async def scenario():
+            async with pool.use("u", "busy") as busy:
+                with patch.object(busy.memory, "close") as close:
+                    async with pool.use("u", "other"):
+                        pass
+                    async with pool.use("u", "third"):
+                        assert len(pool._sessions) == 2  # Over the limit while "busy" runs
+                    close.assert_not_called()
+            assert list(pool._sessions) == [("u", "busy")]
+            await pool.close()
+
+        asyncio.run(scenario())
+
+    def test_provider_errors_are_not_replies(self, client, provider):
+        provider.achat_completion.side_effect = ProviderBusy("queue full")
+        busy = client.post("/chat", json={"message": "Hi", "session_id": "e"})
+        assert busy.status_code == 503
+        assert busy.headers["Retry-After"] == str(settings.server_retry_after)
+
+        provider.achat_completion.side_effect = ConnectionError("Ollama is down")
+        failed = client.post("/chat", json={"message": "Hi", "session_id": "e"})
+        assert (failed.status_code, failed.json()) == (502, {"error": "Ollama is down"})
+
+        async def broken(messages, model, **kwargs):
+            yield "Hel"
+            raise ConnectionError("Ollama is down")
+
+        provider.achat_completion_stream = broken
+        response = client.post("/chat/stream", json={"message": "Hi", "session_id": "e"})
+        assert _events(response.text) == [
+            ("message", {"content": "Hel"}),
+            ("error", {"error": "Ollama is down", "status": 502}),
+        ]
+        assert client.get("/sessions/e/memory").json() == []  # Nothing saved
+
+    def test_invalid_requests(self, client):
+        assert client.post("/chat", content=b"not json").status_code == 400
+        assert client.post("/chat", json={"session_id": "s"}).status_code == 400
+        assert client.post("/chat/stream", json={"message": "hi", "mode": "nope"}).status_code == 400
+        assert client.post("/chat", json={"message": "hi", "user_id": ".."}).status_code == 400
+        assert client.delete("/sessions/s/memory", params={"user_id": "."}).status_code == 400
+        assert client.get("/sessions/s/memory", params={"user_id": ".."}).status_code == 400
+
+    def test_multiple_workers_need_sqlite(self, monkeypatch):
+        monkeypatch.setattr(settings, "memory_backend", "jsonl")
+        with pytest.raises(SystemExit):
+            main(["--workers", "2"])
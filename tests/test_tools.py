@@ -0,0 +1,312 @@
+"""
+Tests for the agent tool executor.
+"""
+
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import List, Optional
+from unittest.mock import MagicMock, patch
+
+import pytest
+from src.sam_ai.config import settings
+from src.sam_ai.tools import TOOL_REGISTRY, ToolExecutor, ToolRegistry, calculator, read_file
+from src.sam_ai.tools.expression import compile_expression
+
+
+def _slow(seconds: float):
+    time.sleep(seconds)
+    return seconds
+
+
+class TestToolExecutor:
+    """Test tool schemas and concurrent execution."""
+
+    def test_tool_schemas(self):
+        """Test every registered tool is exposed in function-calling format."""
+        schemas = ToolExecutor().tool_schemas()
+
+        assert {s["function"]["name"] for s in schemas} == set(TOOL_REGISTRY)
+        assert all(s["type"] == "function" for s in schemas)
+
+    def test_calls_run_concurrently_in_order(self):
+        """Test independent calls overlap and results keep the call order."""
+        executor = ToolExecutor({
+            "slow": {"function": _slow, "description": "Sleep."},
+        })
+        calls = [{"name": "slow", "arguments": {"seconds": 0.2}} for _ in range(3)]
+
+        start = time.monotonic()
+        results = executor.execute(calls)
+
+        assert results == [0.2, 0.2, 0.2]
+        assert time.monotonic() - start < 0.5
+
+    def test_errors_and_timeouts_are_reported(self):
+        """Test failures come back as error results instead of raising."""
+        executor = ToolExecutor({
+            "slow": {"function": _slow, "description": "Sleep.", "timeout": 0.05},
+        })
+
+        timed_out, bad_args, unknown = executor.execute([
+            {"name": "slow", "arguments": {"seconds": 0.3}},
+            {"name": "slow", "arguments": {"nope": 1}},
+            {"name": "missing", "arguments": {}},
+        ])
+
+        assert "timed out" in timed_out["error"]
+        assert "Invalid arguments" in bad_args["error"]
+        assert "Unknown tool" in unknown["error"]
+
+
+class TestCalculator:
+    """Test the AST-based calculator."""
+
+    def test_arithmetic_and_functions(self):
+        """Test operators, constants and whitelisted functions."""
+        assert calculator("(2 + 3) * 4")["result"] == 20
+        assert calculator("2 ** 10 // 3 % 7")["result"] == 341 % 7
+        assert calculator("sqrt(16) + abs(-2)")["result"] == 6.0
+        assert calculator("round(pi, 2)")["result"] == 3.14
+
+    def test_rejects_code_and_huge_powers(self):
+        """Test non-arithmetic syntax and runaway exponents fail fast."""
+        start = time.monotonic()
+        for expression in ["9**9**9", "2 ** 100000", "(10**1000) * (10**1000)", "3 ** 3000"]:
+            assert "exceeds" in calculator(expression)["error"]
+        for expression in ["round(1, -10**7)", "round(x, 10**7)"]:
+            assert "exceed" in calculator(expression, variables={"x": [1.5]})["error"]
+        assert time.monotonic() - start < 0.5
+        assert calculator("2 ** 2049")["result"] == 2 ** 2049
+        assert calculator("-2 ** 4095")["result"] == -(2 ** 4095)
+
+        for expression in ["__import__('os')", "(1).__class__", "[1, 2]", "x if 1 else 2"]:
+            assert "Invalid expression" in calculator(expression)["error"]
+        assert "Calculation error" in calculator("1 / 0")["error"]
+
+    def test_compiled_expressions_are_cached(self):
+        """Test repeated expressions skip parsing."""
+        compile_expression.cache_clear()
+        calculator("1 + 2")
+        calculator("1 + 2")
+
+        assert compile_expression.cache_info().hits == 1
+
+    def test_batch_and_vectorized(self):
+        """Test many expressions and list-valued variables in one call."""
+        batch = calculator(expressions=["1 + 1", "nope(1)"])["results"]
+        assert batch[0]["result"] == 2
+        assert "error" in batch[1]
+
+        result = calculator("x ** 2 + y", variables={"x": [1, 2, 3], "y": 1})
+        assert result["result"] == [2.0, 5.0, 10.0]
+
+        result = calculator("max(x, y, z) - min(x, y, z)", variables={"x": [1, 5], "y": 3, "z": [4, 0]})
+        assert result["result"] == [3.0, 5.0]
+        assert calculator("max(1, 7, 3)")["result"] == 7
+
+    def test_variables_are_size_checked(self):
+        """Test an oversized integer variable is rejected like an oversized literal."""
+        start = time.monotonic()
+        assert "exceeds" in calculator("-x", variables={"x": 10**2000})["error"]
+        assert "exceeds" in calculator("x ** k", variables={"x": 2**5000, "k": 3})["error"]
+        assert "error" in calculator("x", variables={"x": [10**400]})
+        assert time.monotonic() - start < 0.5
+
+
+class TestReadFile:
+    """Test ranged and capped file reads."""
+
+    @pytest.fixture
+    def log_file(self, tmp_path):
+        path = tmp_path / "app.log"
+        path.write_text("".join(f"line {i} {'ERROR' if i % 100 == 0 else 'ok'}\n" for i in range(1, 1001)))
+        return path
+
+    def test_head_tail_and_line_range(self, log_file):
+        """Test line-based selections."""
+        assert read_file(str(log_file), head=2)["content"] == "line 1 ok\nline 2 ok\n"
+        assert read_file(str(log_file), tail=2)["content"] == "line 999 ok\nline 1000 ERROR\n"
+
+        result = read_file(str(log_file), start_line=10, end_line=11)
+        assert result["content"] == "line 10 ok\nline 11 ok\n"
+        assert result["end_line"] == 11
+
+    def test_byte_range_and_size_cap(self, log_file, monkeypatch):
+        """Test offset/length reads and that results are capped."""
+        assert read_file(str(log_file), offset=5, length=4)["content"] == "1 ok"
+
+        monkeypatch.setattr(settings, "tool_read_max_bytes", 100)
+        result = read_file(str(log_file))
+        assert len(result["content"]) == 100
+        assert result["truncated"] is True
+        assert result["size"] == log_file.stat().st_size
+
+    def test_grep(self, log_file):
+        """Test pattern search reports matching lines with line numbers."""
+        result = read_file(str(log_file), pattern=r"ERROR", max_matches=3)
+
+        assert result["matches"] == [
+            {"line": 100, "text": "line 100 ERROR"},
+            {"line": 200, "text": "line 200 ERROR"},
+            {"line": 300, "text": "line 300 ERROR"},
+        ]
+        assert result["truncated"] is True
+
+    def test_encoding_sniff(self, tmp_path):
+        """Test UTF-16 text is decoded and binary files are refused."""
+        text_file = tmp_path / "notes.txt"
+        text_file.write_text("café\nthé\n", encoding="utf-16")
+        binary_file = tmp_path / "blob.bin"
+        binary_file.write_bytes(b"\x00\x01\x02")
+
+        result = read_file(str(text_file), tail=1)
+        assert result["encoding"] == "utf-16"
+        assert result["content"] == "thé\n"
+        assert read_file(str(text_file), pattern="caf")["matches"][0]["line"] == 1
+        assert "Not a text file" in read_file(str(binary_file))["error"]
+
+    def test_grep_utf8_with_bom(self, tmp_path):
+        """Test the byte-order mark doesn't stop patterns matching."""
+        path = tmp_path / "notes.txt"
+        path.write_text("first match\nnothing\nlast match\n", encoding="utf-8-sig")
+
+        result = read_file(str(path), pattern="match")
+
+        assert result["encoding"] == "utf-8-sig"
+        assert result["matches"] == [
+            {"line": 1, "text": "first match"},
+            {"line": 3, "text": "last match"},
+        ]
+
+    def test_grep_counts_lines_in_bounded_memory(self, tmp_path):
+        """Test numbering a match deep in a large file doesn't copy the file."""
+        path = tmp_path / "big.log"
+        with open(path, "w") as f:
+            f.write("ok\n" * 2_000_000 + "ERROR at the end\n")
+
+        tracemalloc.start()
+        try:
+            result = read_file(str(path), pattern="ERROR")
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+        assert result["matches"] == [{"line": 2_000_001, "text": "ERROR at the end"}]
+        assert peak < 1_000_000
+
+    def test_stream(self, log_file):
+        """Test the executor can stream a file in chunks."""
+        chunks = list(ToolExecutor().stream(
+            "read_file", {"file_path": str(log_file), "chunk_size": 1000}
+        ))
+
+        assert len(chunks) > 1
+        assert "".join(chunks) == log_file.read_text()
+
+    def test_stream_falls_back_and_reports_errors(self, log_file, tmp_path):
+        """Test selections the stream can't serve and failures come back as results."""
+        executor = ToolExecutor()
+
+        tail = list(executor.stream("read_file", {"file_path": str(log_file), "tail": 1}))
+        assert tail[0]["content"] == "line 1000 ERROR\n"
+
+        missing = list(executor.stream("read_file", {"file_path": str(tmp_path / "nope")}))
+        assert len(missing) == 1 and "failed" in missing[0]["error"]
+
+    def test_long_lines_are_read_in_bounded_pieces(self, tmp_path, monkeypatch):
+        """Test a single huge line never enters memory whole, by line or by stream."""
+        monkeypatch.setattr(settings, "tool_read_max_bytes", 100)
+        path = tmp_path / "minified.js"
+        path.write_text("short\n" + "x" * 5_000_000 + "\nlast\n")
+
+        tracemalloc.start()
+        try:
+            head = read_file(str(path), head=2)
+            after = read_file(str(path), start_line=3)
+            largest_chunk = max(len(c) for c in ToolExecutor().stream(
+                "read_file", {"file_path": str(path), "chunk_size": 10**9}
+            ))
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+        assert (head["content"], head["truncated"]) == ("short\n", True)
+        assert (after["content"], after["end_line"]) == ("last\n", 3)
+        assert largest_chunk <= 100
+        assert peak < 1_000_000
+
+
+class TestToolRegistry:
+    """Test tool registration, lazy loading and schema generation."""
+
+    def test_decorator_generates_schema(self):
+        """Test the schema comes from the signature, type hints and docstring."""
+        registry = ToolRegistry(entry_point_group=None)
+
+        @registry.register(timeout=5)
+        def search(query: str, limit: Optional[int] = 10, tags: List[str] = None):
+            """
+            Search the notes.
+
+            Args:
+                query: Text to look for
+                limit: Maximum results
+            """
+
+        schema = registry.schemas()[0]["function"]
+        assert schema["name"] == "search"
+        assert schema["description"] == "Search the notes."
+        assert schema["parameters"] == {
+            "type": "object",
+            "properties": {
+                "query": {"type": "string", "description": "Text to look for"},
+                "limit": {"type": "integer", "description": "Maximum results"},
+                "tags": {"type": "array", "items": {"type": "string"}},
+            },
+            "required": ["query"],
+        }
+        assert registry.schemas() is registry.schemas()  # cached
+        assert registry.timeout("search") == 5
+
+    def test_lazy_tools_import_on_first_use(self, tmp_path, monkeypatch):
+        """Test a lazily registered module is only imported when the tool is used."""
+        (tmp_path / "lazy_tool_module.py").write_text(
+            "def shout(text: str) -> str:\n    return text.upper()\n"
+        )
+        monkeypatch.syspath_prepend(str(tmp_path))
+        registry = ToolRegistry(entry_point_group=None)
+        registry.register_lazy(
+            "shout",
+            "lazy_tool_module:shout",
+            description="Shout.",
+            parameters={"type": "object", "properties": {"text": {"type": "string"}}},
+        )
+
+        registry.schemas()
+        assert "lazy_tool_module" not in sys.modules
+
+        assert ToolExecutor(registry).execute([{"name": "shout", "arguments": {"text": "hi"}}]) == ["HI"]
+        assert "lazy_tool_module" in sys.modules
+
+    def test_entry_point_plugins(self):
+        """Test tools advertised by installed packages are discovered."""
+        entry_point = MagicMock(value="math:sqrt")
+        entry_point.name = "square_root"
+        registry = ToolRegistry()
+
+        with patch("importlib.metadata.entry_points", return_value=[entry_point]):
+            assert "square_root" in registry
+        assert registry["square_root"]["function"](9.0) == 3.0
+
+    def test_builtin_tools_load_lazily(self):
+        """Test importing the tools package doesn't import the tool modules."""
+        code = (
+            "import sys, src.sam_ai.tools as t; "
+            "print(any(m.endswith(('example_tools', 'file_tools')) for m in sys.modules))"
+        )
+        output = subprocess.run(
+            [sys.executable, "-c", code], capture_output=True, text=True, check=True
+        ).stdout
+        assert output.strip() == "False"